@@ -1,17 +1,214 @@
-from flask import Flask, request, jsonify
+from flask import (Flask, Response, abort, current_app, g, has_app_context, request, jsonify, make_response,
+                   stream_with_context)
+from flask.cli import with_appcontext
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy import delete, event, func, insert, type_coerce, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+from sqlalchemy.orm import Session, configure_mappers, load_only
+from sqlalchemy.schema import CreateTable
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+from collections import Counter, OrderedDict, deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from functools import lru_cache, wraps
+import base64
+import bisect
+import click
+import codecs
+import contextlib
+import contextvars
+import csv
 import enum
+import hashlib
+import io
+import json
+import math
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
 
-# Criar a aplicação Flask
-app = Flask(__name__)
+try:
+    import orjson
+except ImportError:  # opcional: sem ele a codificação usa só o json da biblioteca padrão
+    orjson = None
 
-# Configurar o banco de dados SQLite
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///gerenciador_tarefas.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+try:
+    import brotli
+except ImportError:  # opcional: sem ele não há Content-Encoding br
+    brotli = None
 
-# Inicializar SQLAlchemy
-db = SQLAlchemy(app)
+try:
+    import zstandard
+except ImportError:  # opcional: sem ele não há Content-Encoding zstd
+    zstandard = None
+
+try:
+    from flask_cors import CORS
+except ImportError:  # opcional: sem ele a API não libera CORS para o frontend
+    CORS = None
+
+# Carregar variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# PRAGMAs aplicados em cada nova conexão SQLite
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 268435456))
+
+# Paginação da listagem de tarefas
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+# Listagem em fluxo: tarefas lidas do banco por lote
+TAMANHO_LOTE_FLUXO = 1000
+
+# Limite de operações aceitas por requisição em /tarefas/lote
+LOTE_MAXIMO = 5000
+
+# Sincronização incremental (?desde=): segundos que o próximo desde recua para não pular
+# escritas com data anterior ainda não confirmadas, e dias que as remoções ficam guardadas
+SINCRONIZACAO_MARGEM = int(os.getenv('SINCRONIZACAO_MARGEM', 10))
+RETENCAO_REMOCOES_DIAS = int(os.getenv('RETENCAO_REMOCOES_DIAS', 30))
+
+# Idempotency-Key em POST /tarefas e /categorias: horas que a resposta fica guardada para
+# ser repetida às retentativas com a mesma chave
+IDEMPOTENCIA_TTL_HORAS = int(os.getenv('IDEMPOTENCIA_TTL_HORAS', 24))
+IDEMPOTENCIA_CHAVE_MAXIMA = 255
+
+# Arquivamento: tarefas concluídas/canceladas sem alteração há ARQUIVAMENTO_DIAS dias saem
+# da tabela tarefa em lotes, com uma pausa (segundos) entre eles para outras escritas
+ARQUIVAMENTO_DIAS = int(os.getenv('ARQUIVAMENTO_DIAS', 90))
+ARQUIVAMENTO_LOTE = int(os.getenv('ARQUIVAMENTO_LOTE', 500))
+ARQUIVAMENTO_PAUSA = 0.05
+
+# Importação em massa (flask importar): linhas gravadas por transação
+IMPORTACAO_LOTE = int(os.getenv('IMPORTACAO_LOTE', 5000))
+
+# Eventos em /eventos (SSE): tamanho do log no banco, intervalo (segundos) entre leituras
+# do log, assinantes por processo e eventos pendentes antes de desconectar um assinante lento
+EVENTOS_MAXIMO = int(os.getenv('EVENTOS_MAXIMO', 10000))
+EVENTOS_INTERVALO = float(os.getenv('EVENTOS_INTERVALO', 1.0))
+EVENTOS_MAX_ASSINANTES = int(os.getenv('EVENTOS_MAX_ASSINANTES', 100))
+EVENTOS_FILA_MAXIMA = 1000
+# Comentário enviado a cada N segundos sem eventos (mantém proxies e detecta quem saiu)
+EVENTOS_HEARTBEAT = 15
+
+# Cache de leitura de tarefas e categorias (por processo)
+CACHE_HABILITADO = os.getenv('CACHE_HABILITADO', 'True').lower() == 'true'
+CACHE_TAMANHO_MAXIMO = int(os.getenv('CACHE_TAMANHO_MAXIMO', 1024))
+CACHE_TTL = int(os.getenv('CACHE_TTL', 30))
+
+# Tempo (segundos) que a contagem de tarefas vencidas fica em cache
+ESTATISTICAS_CACHE_TTL = 5
+
+# Métricas por rota em /metrics; limites do histograma de latência em segundos
+METRICAS_HABILITADAS = os.getenv('METRICAS_HABILITADAS', 'True').lower() == 'true'
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Compressão das respostas negociada pelo Accept-Encoding: respostas menores que o mínimo
+# (bytes) cabem num pacote e saem sem comprimir; níveis rápidos, pensados para respostas
+# dinâmicas (gzip 1 é o padrão do nginx)
+COMPRESSAO_HABILITADA = os.getenv('COMPRESSAO_HABILITADA', 'True').lower() == 'true'
+COMPRESSAO_MINIMO = int(os.getenv('COMPRESSAO_MINIMO', 1400))
+COMPRESSAO_NIVEIS = {'zstd': 3, 'br': 4, 'gzip': 1}
+
+# Pool de conexões: conexões mantidas abertas e extras permitidas em picos
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+
+# Controle de admissão: limite por cliente (token bucket), com orçamentos separados para
+# leituras e escritas (requisições por segundo e rajada), e teto de requisições trabalhando
+# no banco ao mesmo tempo. O padrão do teto é pool_size + max_overflow: acima disso a
+# requisição ficaria na fila do pool por até DB_POOL_TIMEOUT segundos.
+# O limite vem desligado: atrás de um proxy todos os clientes teriam o IP dele (e um balde
+# só); ligue-o com LIMITE_CABECALHO_CLIENTE apontando para o cabeçalho com o IP do cliente
+LIMITE_HABILITADO = os.getenv('LIMITE_HABILITADO', 'False').lower() == 'true'
+LIMITE_LEITURAS_POR_SEGUNDO = float(os.getenv('LIMITE_LEITURAS_POR_SEGUNDO', 50))
+LIMITE_LEITURAS_RAJADA = int(os.getenv('LIMITE_LEITURAS_RAJADA', 100))
+LIMITE_ESCRITAS_POR_SEGUNDO = float(os.getenv('LIMITE_ESCRITAS_POR_SEGUNDO', 10))
+LIMITE_ESCRITAS_RAJADA = int(os.getenv('LIMITE_ESCRITAS_RAJADA', 20))
+LIMITE_CABECALHO_CLIENTE = os.getenv('LIMITE_CABECALHO_CLIENTE', '')  # ex.: X-Forwarded-For atrás de um proxy
+LIMITE_MAXIMO_CLIENTES = 10000
+CONCORRENCIA_MAXIMA = int(os.getenv('CONCORRENCIA_MAXIMA', DB_POOL_SIZE + DB_MAX_OVERFLOW))  # 0 = sem teto
+CONCORRENCIA_ESPERA_MS = int(os.getenv('CONCORRENCIA_ESPERA_MS', 100))
+
+# Diagnóstico de SQL (opcional): comandos lentos com plano, N+1 e orçamento de consultas
+DIAGNOSTICO_SQL = os.getenv('DIAGNOSTICO_SQL', 'False').lower() == 'true'
+SQL_LENTO_MS = float(os.getenv('SQL_LENTO_MS', 100))
+N_MAIS_UM_REPETICOES = int(os.getenv('N_MAIS_UM_REPETICOES', 5))
+ORCAMENTO_CONSULTAS = int(os.getenv('ORCAMENTO_CONSULTAS', 0))  # 0 = sem limite
+
+# Configuração padrão, lida do ambiente; create_app(config) sobrescreve o que precisar
+def configuracao_do_ambiente():
+    return {
+        # SQLite por padrão; qualquer URL do SQLAlchemy funciona
+        'SQLALCHEMY_DATABASE_URI': os.getenv('DATABASE_URL', 'sqlite:///gerenciador_tarefas.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SECRET_KEY': os.getenv('SECRET_KEY', 'dev-secret-key'),
+        # Origens do frontend liberadas para CORS, separadas por vírgula
+        'CORS_ORIGINS': os.getenv('CORS_ORIGINS', 'http://localhost:3000'),
+        'CACHE_HABILITADO': CACHE_HABILITADO,
+        'CACHE_TAMANHO_MAXIMO': CACHE_TAMANHO_MAXIMO,
+        'CACHE_TTL': CACHE_TTL,
+        'METRICAS_HABILITADAS': METRICAS_HABILITADAS,
+        'COMPRESSAO_HABILITADA': COMPRESSAO_HABILITADA,
+        'COMPRESSAO_MINIMO': COMPRESSAO_MINIMO,
+        'LIMITE_HABILITADO': LIMITE_HABILITADO,
+        'LIMITE_LEITURAS_POR_SEGUNDO': LIMITE_LEITURAS_POR_SEGUNDO,
+        'LIMITE_LEITURAS_RAJADA': LIMITE_LEITURAS_RAJADA,
+        'LIMITE_ESCRITAS_POR_SEGUNDO': LIMITE_ESCRITAS_POR_SEGUNDO,
+        'LIMITE_ESCRITAS_RAJADA': LIMITE_ESCRITAS_RAJADA,
+        'LIMITE_CABECALHO_CLIENTE': LIMITE_CABECALHO_CLIENTE,
+        'CONCORRENCIA_MAXIMA': CONCORRENCIA_MAXIMA,
+        'CONCORRENCIA_ESPERA_MS': CONCORRENCIA_ESPERA_MS,
+        'EVENTOS_INTERVALO': EVENTOS_INTERVALO,
+        'EVENTOS_MAX_ASSINANTES': EVENTOS_MAX_ASSINANTES,
+        'DIAGNOSTICO_SQL': DIAGNOSTICO_SQL,
+        'SQL_LENTO_MS': SQL_LENTO_MS,
+        'N_MAIS_UM_REPETICOES': N_MAIS_UM_REPETICOES,
+        'ORCAMENTO_CONSULTAS': ORCAMENTO_CONSULTAS,
+    }
+
+def opcoes_do_pool(url):
+    """Pool de conexões (não se aplica ao SQLite em memória, que usa uma conexão só)"""
+    if ':memory:' in url or url == 'sqlite://':
+        return {}
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        # Um arquivo SQLite não tem conexão de rede que possa cair: o ping só custaria uma ida ao banco
+        'pool_pre_ping': not url.startswith('sqlite')
+    }
+
+# SQLAlchemy sem app: cada app criado por create_app() se registra com db.init_app()
+db = SQLAlchemy()
+
+@event.listens_for(Engine, 'connect')
+def configurar_sqlite(conexao_dbapi, registro):
+    """WAL e PRAGMAs de desempenho; bancos servidor não passam por aqui"""
+    if isinstance(conexao_dbapi, sqlite3.Connection):
+        aplicar_pragmas_sqlite(conexao_dbapi)
+
+def aplicar_pragmas_sqlite(conexao_dbapi):
+    """Aplica os PRAGMAs numa conexão DBAPI (sqlite3 ou o adaptador do aiosqlite)"""
+    cursor = conexao_dbapi.cursor()
+    # WAL: leitores não bloqueiam o escritor (e vice-versa)
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # Com WAL, NORMAL só sincroniza no checkpoint e continua seguro contra corrupção
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
 
 # Enum para status da tarefa
 class StatusTarefa(enum.Enum):
@@ -27,8 +224,36 @@ class PrioridadeTarefa(enum.Enum):
     ALTA = "alta"
     URGENTE = "urgente"
 
+def formatar_valor(valor):
+    """Converte enums e datas para o formato usado nas respostas JSON"""
+    if isinstance(valor, enum.Enum):
+        return valor.value
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+# Condição do índice parcial de tarefas vencidas
+CONDICAO_TAREFA_ABERTA = "status != 'CONCLUIDA'"
+
 # Modelo de Tarefa
 class Tarefa(db.Model):
+    __table_args__ = (
+        # Ordenação estável da paginação por cursor
+        db.Index('ix_tarefa_data_criacao_id', 'data_criacao', 'id'),
+        # Filtros de listagem já na ordem da paginação (sem ordenação em memória)
+        db.Index('ix_tarefa_status_data_criacao', 'status', 'data_criacao', 'id'),
+        db.Index('ix_tarefa_categoria_id', 'categoria_id', 'data_criacao', 'id'),
+        # Filtro combinado e recontagem por status/prioridade
+        db.Index('ix_tarefa_status_prioridade', 'status', 'prioridade'),
+        # Tarefas vencidas: só as não concluídas entram no índice
+        db.Index('ix_tarefa_vencimento_aberta', 'data_vencimento', sqlite_where=db.text(CONDICAO_TAREFA_ABERTA),
+                 postgresql_where=db.text(CONDICAO_TAREFA_ABERTA)),
+        # Sincronização incremental (?desde=), na ordem do próximo desde
+        db.Index('ix_tarefa_data_atualizacao_id', 'data_atualizacao', 'id'),
+        # AUTOINCREMENT: o id de uma tarefa arquivada nunca volta para uma tarefa nova
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(200), nullable=False)
     descricao = db.Column(db.Text)
@@ -37,12 +262,24 @@ class Tarefa(db.Model):
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     data_vencimento = db.Column(db.DateTime)
     data_conclusao = db.Column(db.DateTime)
+    # Toda escrita atualiza: o ORM pelo onupdate, as escritas em massa explicitamente
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     responsavel = db.Column(db.String(100))
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categoria.id'))
+    # Incrementada a cada escrita; é o ETag da tarefa no If-Match (concorrência otimista)
+    versao = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    
+    # Campos expostos pela API (os que podem ser pedidos em ?campos=)
+    CAMPOS = ('id', 'titulo', 'descricao', 'status', 'prioridade', 'data_criacao',
+              'data_vencimento', 'data_conclusao', 'data_atualizacao', 'responsavel', 'versao')
     
     def __repr__(self):
         return f'<Tarefa {self.titulo}>'
     
-    def to_dict(self):
+    def to_dict(self, campos=None):
+        # Só acessa os campos pedidos: os demais podem nem ter sido carregados (load_only)
+        if campos is not None:
+            return {campo: formatar_valor(getattr(self, campo)) for campo in campos}
         return {
             'id': self.id,
             'titulo': self.titulo,
@@ -52,9 +289,91 @@ class Tarefa(db.Model):
             'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
             'data_vencimento': self.data_vencimento.isoformat() if self.data_vencimento else None,
             'data_conclusao': self.data_conclusao.isoformat() if self.data_conclusao else None,
-            'responsavel': self.responsavel
+            'data_atualizacao': self.data_atualizacao.isoformat() if self.data_atualizacao else None,
+            'responsavel': self.responsavel,
+            'versao': self.versao
         }
 
+# Tarefas concluídas e canceladas antigas, fora da tabela quente (mesmas colunas e ids)
+class TarefaArquivada(db.Model):
+    __tablename__ = 'tarefa_arquivada'
+    __table_args__ = (
+        # Os mesmos acessos da listagem, para ?incluir_arquivadas=true
+        db.Index('ix_tarefa_arquivada_data_criacao_id', 'data_criacao', 'id'),
+        db.Index('ix_tarefa_arquivada_status_data_criacao', 'status', 'data_criacao', 'id'),
+        db.Index('ix_tarefa_arquivada_categoria_id', 'categoria_id', 'data_criacao', 'id'),
+        # Canceladas com vencimento entram na contagem de vencidas
+        db.Index('ix_tarefa_arquivada_vencimento_aberta', 'data_vencimento',
+                 sqlite_where=db.text(CONDICAO_TAREFA_ABERTA), postgresql_where=db.text(CONDICAO_TAREFA_ABERTA)),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    titulo = db.Column(db.String(200), nullable=False)
+    descricao = db.Column(db.Text)
+    status = db.Column(db.Enum(StatusTarefa), nullable=False)
+    prioridade = db.Column(db.Enum(PrioridadeTarefa), nullable=False)
+    data_criacao = db.Column(db.DateTime, nullable=False)
+    data_vencimento = db.Column(db.DateTime)
+    data_conclusao = db.Column(db.DateTime)
+    data_atualizacao = db.Column(db.DateTime, nullable=False)
+    responsavel = db.Column(db.String(100))
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categoria.id'))
+    versao = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+    data_arquivamento = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    CAMPOS = Tarefa.CAMPOS
+    # Mesma representação de uma tarefa ativa
+    to_dict = Tarefa.to_dict
+
+    def __repr__(self):
+        return f'<TarefaArquivada {self.titulo}>'
+
+# Registro (tombstone) de tarefa removida, para a sincronização incremental
+class TarefaRemovida(db.Model):
+    __tablename__ = 'tarefa_removida'
+    __table_args__ = (
+        db.Index('ix_tarefa_removida_data_remocao_id', 'data_remocao', 'id'),
+    )
+
+    # Id da tarefa removida (o SQLite pode reaproveitá-lo numa tarefa nova)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    data_remocao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<TarefaRemovida {self.id}>'
+
+# Log de alterações que alimenta /eventos (limitado a EVENTOS_MAXIMO linhas)
+class Evento(db.Model):
+    __tablename__ = 'evento'
+    # AUTOINCREMENT: ids nunca reaproveitados, mesmo depois de cortar o log (Last-Event-ID)
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # 'tarefa' ou 'categoria'
+    acao = db.Column(db.String(20), nullable=False)  # 'criada', 'atualizada', 'removida' ou 'arquivada'
+    objeto_id = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<Evento {self.id} {self.tipo} {self.acao} {self.objeto_id}>'
+
+# Respostas dos POST com Idempotency-Key, repetidas às retentativas até IDEMPOTENCIA_TTL_HORAS
+class ChaveIdempotencia(db.Model):
+    __tablename__ = 'chave_idempotencia'
+    __table_args__ = (
+        db.Index('ix_chave_idempotencia_data_criacao', 'data_criacao'),
+    )
+
+    rota = db.Column(db.String(50), primary_key=True)  # endpoint: 'criar_tarefa' ou 'criar_categoria'
+    chave = db.Column(db.String(IDEMPOTENCIA_CHAVE_MAXIMA), primary_key=True)
+    impressao = db.Column(db.String(64), nullable=False)  # SHA-256 do corpo da requisição
+    status = db.Column(db.Integer, nullable=False)
+    resposta = db.Column(db.Text, nullable=False)  # corpo JSON já codificado
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<ChaveIdempotencia {self.rota} {self.chave}>'
+
 # Modelo de Categoria
 class Categoria(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -62,311 +381,3080 @@ class Categoria(db.Model):
     descricao = db.Column(db.Text)
     cor = db.Column(db.String(7))  # Código hex da cor #FFFFFF
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    # Incrementada a cada escrita; é o ETag da categoria no If-Match (concorrência otimista)
+    versao = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     
     # Relacionamento com tarefas
-    tarefas = db.relationship('Tarefa', backref='categoria', lazy=True)
+    # passive_deletes: a rota de remoção já garante que não há tarefas associadas
+    tarefas = db.relationship('Tarefa', backref='categoria', lazy=True, passive_deletes=True)
+    
+    # Campos expostos pela API (os que podem ser pedidos em ?campos=)
+    CAMPOS = ('id', 'nome', 'descricao', 'cor', 'data_criacao', 'versao', 'total_tarefas')
     
     def __repr__(self):
         return f'<Categoria {self.nome}>'
     
-    def to_dict(self):
+    def to_dict(self, total_tarefas=None, campos=None):
+        # Quem lista várias categorias deve informar o total já agregado (evita N+1)
+        if total_tarefas is None and (campos is None or 'total_tarefas' in campos):
+            total_tarefas = db.session.scalar(db.select(total_de_tarefas(self.id)))
+        if campos is not None:
+            return {
+                campo: total_tarefas if campo == 'total_tarefas' else formatar_valor(getattr(self, campo))
+                for campo in campos
+            }
         return {
             'id': self.id,
             'nome': self.nome,
             'descricao': self.descricao,
             'cor': self.cor,
             'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
-            'total_tarefas': len(self.tarefas)
+            'versao': self.versao,
+            'total_tarefas': total_tarefas
         }
 
-# Adicionar coluna categoria_id na tabela Tarefa
-Tarefa.categoria_id = db.Column(db.Integer, db.ForeignKey('categoria.id'))
+# Modelo de contadores por status e prioridade (alimenta /estatisticas)
+class ContadorTarefa(db.Model):
+    __tablename__ = 'contador_tarefa'
 
-# ===== ROTAS DA API =====
+    status = db.Column(db.Enum(StatusTarefa), primary_key=True)
+    prioridade = db.Column(db.Enum(PrioridadeTarefa), primary_key=True)
+    total = db.Column(db.Integer, default=0, nullable=False)
 
-@app.route('/')
-def index():
-    return jsonify({
-        'message': 'API Gerenciador de Tarefas',
-        'version': '1.0',
-        'endpoints': {
-            'tarefas': '/tarefas',
-            'categorias': '/categorias',
-            'estatisticas': '/estatisticas'
-        }
-    })
+    def __repr__(self):
+        return f'<ContadorTarefa {self.status.value}/{self.prioridade.value}: {self.total}>'
 
-# ===== ROTAS DE TAREFAS =====
+# Modelo que registra as migrações de esquema já aplicadas
+class VersaoEsquema(db.Model):
+    __tablename__ = 'versao_esquema'
 
-@app.route('/tarefas', methods=['GET'])
-def listar_tarefas():
-    # Filtros opcionais
-    status = request.args.get('status')
-    prioridade = request.args.get('prioridade')
-    categoria_id = request.args.get('categoria_id')
-    
-    query = Tarefa.query
-    
-    if status:
-        try:
-            status_enum = StatusTarefa(status)
-            query = query.filter(Tarefa.status == status_enum)
-        except ValueError:
-            return jsonify({'erro': f'Status inválido: {status}'}), 400
-    
-    if prioridade:
-        try:
-            prioridade_enum = PrioridadeTarefa(prioridade)
-            query = query.filter(Tarefa.prioridade == prioridade_enum)
-        except ValueError:
-            return jsonify({'erro': f'Prioridade inválida: {prioridade}'}), 400
-    
-    if categoria_id:
-        query = query.filter(Tarefa.categoria_id == categoria_id)
-    
-    tarefas = query.all()
-    return jsonify([tarefa.to_dict() for tarefa in tarefas])
+    versao = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    descricao = db.Column(db.String(200), nullable=False)
+    data_aplicacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
-@app.route('/tarefas', methods=['POST'])
-def criar_tarefa():
-    dados = request.get_json()
-    
-    if not dados or 'titulo' not in dados:
-        return jsonify({'erro': 'Título é obrigatório'}), 400
-    
-    # Validar status se fornecido
-    status = StatusTarefa.PENDENTE
-    if 'status' in dados:
-        try:
-            status = StatusTarefa(dados['status'])
-        except ValueError:
-            return jsonify({'erro': f'Status inválido: {dados["status"]}'}), 400
-    
-    # Validar prioridade se fornecida
-    prioridade = PrioridadeTarefa.MEDIA
-    if 'prioridade' in dados:
-        try:
-            prioridade = PrioridadeTarefa(dados['prioridade'])
-        except ValueError:
-            return jsonify({'erro': f'Prioridade inválida: {dados["prioridade"]}'}), 400
-    
-    # Validar data de vencimento se fornecida
-    data_vencimento = None
-    if 'data_vencimento' in dados:
-        try:
-            data_vencimento = datetime.fromisoformat(dados['data_vencimento'])
-        except ValueError:
-            return jsonify({'erro': 'Formato de data inválido. Use ISO format: YYYY-MM-DDTHH:MM:SS'}), 400
-    
-    tarefa = Tarefa(
-        titulo=dados['titulo'],
-        descricao=dados.get('descricao'),
-        status=status,
-        prioridade=prioridade,
-        data_vencimento=data_vencimento,
-        responsavel=dados.get('responsavel'),
-        categoria_id=dados.get('categoria_id')
-    )
-    
-    try:
-        db.session.add(tarefa)
+    def __repr__(self):
+        return f'<VersaoEsquema {self.versao}>'
+
+# Modelo com a versão global dos dados, incrementada a cada escrita (ETag das leituras)
+class VersaoDados(db.Model):
+    __tablename__ = 'versao_dados'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    versao = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<VersaoDados {self.versao}>'
+
+# ===== ESCRITA EM MASSA =====
+
+def processador_data_sqlite(processador):
+    """Texto de data do SQLite via isoformat(), várias vezes mais rápido que o processador do tipo
+
+    O texto é o mesmo ('2025-06-06 12:00:00.000000'); datas com fuso ou antes do ano 1000
+    ficam com o processador original.
+    """
+    def processar(valor):
+        if valor.tzinfo is None and valor.year >= 1000:
+            return valor.isoformat(' ', 'microseconds')
+        return processador(valor)
+    return processar
+
+@lru_cache(maxsize=64)
+def insercao_compilada(tabela, colunas, dialeto):
+    """(SQL, chaves na ordem dos parâmetros, processadores dos tipos) de um INSERT com as colunas"""
+    compilado = tabela.insert().compile(dialect=dialeto, column_keys=list(colunas))
+    chaves = compilado.positiontup
+    processadores = []
+    for chave in chaves:
+        processador = tabela.c[chave].type.dialect_impl(dialeto).bind_processor(dialeto)
+        if processador is not None and isinstance(tabela.c[chave].type, db.DateTime):
+            processador = processador_data_sqlite(processador)
+        processadores.append(processador)
+    return str(compilado), chaves, processadores
+
+def inserir_em_massa(conexao, tabela, linhas):
+    """INSERT de várias linhas (dicts com as mesmas chaves) num único executemany
+
+    No SQLite as tuplas vão direto ao driver, convertidas pelos processadores dos próprios
+    tipos das colunas (o mesmo texto que o Core gravaria): montar os parâmetros pelo Core
+    custa, por linha, mais que o INSERT. Nos demais bancos é o insert() do Core.
+    """
+    if conexao.dialect.name != 'sqlite':
+        conexao.execute(tabela.insert(), linhas)
+        return
+    sql, chaves, processadores = insercao_compilada(tabela, tuple(linhas[0]), conexao.dialect)
+    pares = list(zip(chaves, processadores))
+    conexao.exec_driver_sql(sql, [
+        tuple(linha[chave] if processador is None or linha[chave] is None else processador(linha[chave])
+              for chave, processador in pares)
+        for linha in linhas
+    ])
+
+# ===== CONTADORES =====
+
+def ajustar_contadores(conexao, deltas):
+    """Aplica deltas {(status, prioridade): n} na mesma transação da conexão"""
+    tabela = ContadorTarefa.__table__
+    for (status, prioridade), delta in deltas.items():
+        if delta:
+            conexao.execute(
+                tabela.update()
+                .where(tabela.c.status == status, tabela.c.prioridade == prioridade)
+                .values(total=tabela.c.total + delta)
+            )
+
+def recalcular_contadores():
+    """Reconstrói os contadores com uma passada GROUP BY nas tarefas ativas e nas arquivadas
+
+    Os contadores cobrem as duas tabelas: arquivar uma tarefa não muda as estatísticas.
+    """
+    totais = Counter()
+    for modelo in (Tarefa, TarefaArquivada):
+        for status, prioridade, total in db.session.query(
+            modelo.status, modelo.prioridade, func.count(modelo.id)
+        ).group_by(modelo.status, modelo.prioridade):
+            totais[(status, prioridade)] += total
+    ContadorTarefa.query.delete()
+    for status in StatusTarefa:
+        for prioridade in PrioridadeTarefa:
+            db.session.add(ContadorTarefa(
+                status=status,
+                prioridade=prioridade,
+                total=totais.get((status, prioridade), 0)
+            ))
+    db.session.commit()
+
+def contar_tarefas_vencidas(sessao, versao=None):
+    """Conta tarefas vencidas e não concluídas (ativas e arquivadas), com cache de curta duração
+
+    versao vem de versao_no_cache(): o valor guardado só serve à mesma versão dos dados, então
+    qualquer escrita (status, vencimento, lote, importação) o invalida já no commit, em todos os
+    workers. O prazo cobre o que muda sem escrita: tarefas que vencem com o passar do tempo.
+    """
+    cache = servico('cache_vencidas')
+    agora = time.monotonic()
+    if versao is None or cache['versao'] != versao or agora >= cache['expira_em']:
+        # Uma consulta só, com uma contagem por índice parcial de cada tabela
+        limite = datetime.utcnow()
+        ativas, arquivadas = [
+            sessao.query(func.count(modelo.id)).filter(
+                modelo.data_vencimento < limite,
+                modelo.status != StatusTarefa.CONCLUIDA
+            ).scalar_subquery()
+            for modelo in (Tarefa, TarefaArquivada)
+        ]
+        cache['valor'] = sessao.query(ativas + arquivadas).scalar()
+        cache['versao'], cache['expira_em'] = versao, agora + ESTATISTICAS_CACHE_TTL
+    return cache['valor']
+
+@event.listens_for(Tarefa, 'after_insert')
+def contar_insercao(mapper, conexao, tarefa):
+    ajustar_contadores(conexao, {(tarefa.status, tarefa.prioridade): 1})
+
+@event.listens_for(Tarefa, 'after_update')
+def contar_atualizacao(mapper, conexao, tarefa):
+    estado = db.inspect(tarefa)
+    historico_status = estado.attrs.status.history
+    historico_prioridade = estado.attrs.prioridade.history
+    if not historico_status.has_changes() and not historico_prioridade.has_changes():
+        return
+    status_antigo = historico_status.deleted[0] if historico_status.deleted else tarefa.status
+    prioridade_antiga = historico_prioridade.deleted[0] if historico_prioridade.deleted else tarefa.prioridade
+    deltas = Counter()
+    deltas[(status_antigo, prioridade_antiga)] -= 1
+    deltas[(tarefa.status, tarefa.prioridade)] += 1
+    ajustar_contadores(conexao, deltas)
+
+@event.listens_for(Tarefa, 'after_delete')
+def contar_remocao(mapper, conexao, tarefa):
+    ajustar_contadores(conexao, {(tarefa.status, tarefa.prioridade): -1})
+    registrar_remocoes(conexao, [tarefa.id])
+
+# ===== REMOÇÕES (TOMBSTONES) =====
+
+def registrar_remocoes(conexao, ids, data_remocao=None):
+    """Registra as tarefas removidas na mesma transação da remoção
+
+    Um id reaproveitado e removido de novo só tem o registro mais recente.
+    """
+    tabela = TarefaRemovida.__table__
+    data_remocao = data_remocao or datetime.utcnow()
+    conexao.execute(tabela.delete().where(tabela.c.id.in_(ids)))
+    conexao.execute(tabela.insert(), [{'id': id, 'data_remocao': data_remocao} for id in ids])
+
+def limpar_remocoes(retencao_dias=RETENCAO_REMOCOES_DIAS):
+    """Apaga os registros de remoção mais antigos que a retenção; retorna quantos"""
+    limite = datetime.utcnow() - timedelta(days=retencao_dias)
+    resultado = db.session.execute(db.delete(TarefaRemovida).where(TarefaRemovida.data_remocao < limite))
+    db.session.commit()
+    return resultado.rowcount
+
+# ===== ARQUIVAMENTO =====
+
+STATUS_ARQUIVAVEIS = (StatusTarefa.CONCLUIDA, StatusTarefa.CANCELADA)
+
+def arquivar_tarefas(idade_dias=ARQUIVAMENTO_DIAS, tamanho_lote=ARQUIVAMENTO_LOTE, pausa=ARQUIVAMENTO_PAUSA):
+    """Move para tarefa_arquivada as tarefas fechadas sem alteração há idade_dias; retorna quantas
+
+    Percorre o índice (data_atualizacao, id) em lotes, cada um numa transação curta seguida
+    de uma pausa: o lock de escrita (no SQLite, do banco inteiro) nunca fica preso por muito
+    tempo. O DELETE repete as condições, então uma tarefa reaberta entre a leitura e o lote
+    fica onde está. Para a sincronização e o /eventos as arquivadas saem como removidas; os
+    contadores não mudam, pois cobrem as duas tabelas.
+    """
+    limite = datetime.utcnow() - timedelta(days=idade_dias)
+    tabela, arquivo = Tarefa.__table__, TarefaArquivada.__table__
+    condicoes = (tabela.c.status.in_(STATUS_ARQUIVAVEIS), tabela.c.data_atualizacao < limite)
+    chave, total = (datetime.min, 0), 0
+    while True:
+        candidatas = db.session.execute(
+            db.select(tabela.c.data_atualizacao, tabela.c.id)
+            .where(*condicoes, db.tuple_(tabela.c.data_atualizacao, tabela.c.id) > db.tuple_(*chave))
+            .order_by(tabela.c.data_atualizacao, tabela.c.id)
+            .limit(tamanho_lote)
+        ).all()
+        if not candidatas:
+            break
+        chave = tuple(candidatas[-1])
+        
+        agora = datetime.utcnow()
+        conexao = db.session.connection()
+        linhas = conexao.execute(
+            tabela.delete().where(tabela.c.id.in_([linha.id for linha in candidatas]), *condicoes)
+            .returning(*tabela.c)
+        ).mappings().all()
+        if linhas:
+            ids = [linha['id'] for linha in linhas]
+            conexao.execute(arquivo.insert(), [dict(linha, data_arquivamento=agora) for linha in linhas])
+            registrar_remocoes(conexao, ids, agora)
+            registrar_eventos(conexao, [('tarefa', 'arquivada', id) for id in ids])
+            incrementar_versao_dados(conexao)
         db.session.commit()
-        return jsonify(tarefa.to_dict()), 201
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'erro': 'Erro ao criar tarefa', 'detalhes': str(e)}), 500
+        if linhas:
+            invalidar_cache_tarefas(*ids)
+            total += len(ids)
+        time.sleep(pausa)
+    return total
 
-@app.route('/tarefas/<int:id>', methods=['GET'])
-def obter_tarefa(id):
-    tarefa = Tarefa.query.get_or_404(id)
-    return jsonify(tarefa.to_dict())
+# ===== VERSÃO DOS DADOS (ETag) =====
 
-@app.route('/tarefas/<int:id>', methods=['PUT'])
-def atualizar_tarefa(id):
-    tarefa = Tarefa.query.get_or_404(id)
-    dados = request.get_json()
-    
-    if not dados:
-        return jsonify({'erro': 'Dados não fornecidos'}), 400
-    
-    # Atualizar campos
-    if 'titulo' in dados:
-        tarefa.titulo = dados['titulo']
-    
-    if 'descricao' in dados:
-        tarefa.descricao = dados['descricao']
-    
-    if 'status' in dados:
-        try:
-            tarefa.status = StatusTarefa(dados['status'])
-            # Se marcou como concluída, adicionar data de conclusão
-            if tarefa.status == StatusTarefa.CONCLUIDA and not tarefa.data_conclusao:
-                tarefa.data_conclusao = datetime.utcnow()
-        except ValueError:
-            return jsonify({'erro': f'Status inválido: {dados["status"]}'}), 400
-    
-    if 'prioridade' in dados:
-        try:
-            tarefa.prioridade = PrioridadeTarefa(dados['prioridade'])
-        except ValueError:
-            return jsonify({'erro': f'Prioridade inválida: {dados["prioridade"]}'}), 400
-    
-    if 'data_vencimento' in dados:
-        if dados['data_vencimento']:
+def incrementar_versao_dados(conexao):
+    """Incrementa a versão global na mesma transação da escrita"""
+    tabela = VersaoDados.__table__
+    conexao.execute(tabela.update().where(tabela.c.id == 1).values(versao=tabela.c.versao + 1))
+
+# Vale para todas as sessões: a do Flask e a síncrona por trás da AsyncSession (asgi.py)
+@event.listens_for(Session, 'after_flush')
+def versionar_escrita(sessao, contexto):
+    alterados = list(sessao.new) + list(sessao.dirty) + list(sessao.deleted)
+    if any(isinstance(objeto, (Tarefa, Categoria)) for objeto in alterados):
+        incrementar_versao_dados(sessao.connection())
+
+def calcular_etag(versao, caminho_completo, accept, validade=None, versao_recurso=None):
+    """ETag de uma leitura: versão dos dados + representação (+ janela de tempo)
+
+    Na leitura de um item, a versão do recurso vem na frente, separada por ponto
+    ("3.17-a1b2c3"): o mesmo ETag serve ao If-None-Match e ao If-Match da escrita seguinte.
+    """
+    # A mesma URL pode ter representações diferentes (JSON, NDJSON...)
+    representacao = zlib.crc32(f'{caminho_completo}|{accept}'.encode())
+    etag = f'{versao}-{representacao:x}'
+    if validade:
+        etag += f'-{int(time.time() // validade)}'
+    if versao_recurso is not None:
+        etag = f'{versao_recurso}.{etag}'
+    return etag
+
+def consulta_versoes(modelo=None, id=None):
+    """SELECT da versão global dos dados e, com modelo, da versão do item (uma consulta só)"""
+    consulta = db.select(VersaoDados.versao).where(VersaoDados.id == 1)
+    if modelo is not None:
+        consulta = consulta.add_columns(db.select(modelo.versao).where(modelo.id == id).scalar_subquery())
+    return consulta
+
+def condicional(validade=None, modelo=None):
+    """Responde 304 quando o If-None-Match bate com a versão atual dos dados
+
+    A versão vem de uma leitura por chave primária, então a consulta da rota nem roda.
+    Com validade (segundos), o ETag também muda a cada janela de tempo, para respostas
+    que dependem do relógio. Com modelo, a rota é de um item (<id>) e o ETag leva também
+    a versão dele. As versões lidas ficam em g.versoes, para a rota buscar no cache um
+    corpo dessa mesma versão (ver versao_no_cache()).
+    """
+    def decorador(view):
+        @wraps(view)
+        def envolver(*args, **kwargs):
+            versoes = g.versoes = db.session.execute(consulta_versoes(modelo, kwargs.get('id'))).first()
+            if versoes is None:
+                return view(*args, **kwargs)
+            
+            etag = calcular_etag(versoes[0], request.full_path, request.headers.get('Accept', ''), validade,
+                                 *versoes[1:])
+            if request.if_none_match.contains_weak(etag):
+                resposta = Response(status=304)
+                resposta.set_etag(etag)
+                return resposta
+            
+            resposta = make_response(view(*args, **kwargs))
+            if resposta.status_code == 200:
+                resposta.set_etag(etag)
+            return resposta
+        return envolver
+    return decorador
+
+# ===== CONCORRÊNCIA OTIMISTA (If-Match) =====
+
+# Cada tarefa e categoria tem uma versão, incrementada a cada escrita. Com If-Match, a
+# escrita é um único UPDATE (ou DELETE) condicional, WHERE id = ? AND versao IN (...),
+# sem SELECT antes: quem perdeu a corrida recebe 412 em vez de sobrescrever a outra edição.
+
+def ler_if_match(valor):
+    """Versões aceitas pelo If-Match; None sem o cabeçalho (ou com *), senão um conjunto
+
+    Valem os ETags das escritas ("3") e os das leituras de um item ("3.17-a1b2c3"): a
+    versão é o que vem antes do ponto. ETags fracos (W/, da compressão) também valem.
+    Um If-Match sem nenhuma versão reconhecível dá um conjunto vazio: nunca bate (412).
+    """
+    if not valor:
+        return None
+    etags = parse_etags(valor)
+    if etags.star_tag:
+        return None
+    versoes = (etag.split('.')[0] for etag in etags.as_set(include_weak=True))
+    return frozenset(int(versao) for versao in versoes if versao.isdecimal())
+
+def condicoes_de_escrita(tabela, id, versoes):
+    """WHERE da escrita condicional: a linha pelo id e, com If-Match, numa das versões"""
+    condicoes = [tabela.c.id == id]
+    if versoes is not None:
+        condicoes.append(tabela.c.versao.in_(versoes))
+    return condicoes
+
+def recusar_escrita(sessao, modelo, id):
+    """A escrita condicional não achou a linha: 404 se ela não existe, senão 412 (versão mudou)
+
+    Só o caminho de erro consulta a versão atual.
+    """
+    atual = sessao.scalar(db.select(modelo.versao).where(modelo.id == id))
+    if atual is None:
+        abort(404)
+    return {'erro': 'O recurso foi alterado por outra requisição (If-Match)', 'versao_atual': atual}, 412
+
+def exigir_existencia(sessao, modelo, id):
+    """404 antes de um erro de validação, como quando a rota lia a linha primeiro"""
+    if sessao.scalar(db.select(modelo.id).where(modelo.id == id)) is None:
+        abort(404)
+
+def cabecalho_etag(corpo):
+    """ETag forte com a versão do recurso escrito, para o If-Match da próxima escrita"""
+    versao = corpo.get('versao') if isinstance(corpo, dict) else None
+    return {'ETag': f'"{versao}"'} if versao is not None else {}
+
+# ===== EVENTOS (SSE) =====
+
+# Toda escrita grava os seus eventos no log, na mesma transação: o que foi confirmado
+# aparece no log, e nada mais. Cada app tem um único leitor do log (app.extensions),
+# compartilhado pelos assinantes de /eventos daquele app.
+
+class CorteEventos:
+    """Conta os eventos gravados pelo app e diz quando cortar o log (a cada maximo // 10)"""
+
+    def __init__(self):
+        self._gravados = 0
+        self._trava = threading.Lock()  # escritas de várias threads (gunicorn gthread, ASGI)
+
+    def registrar(self, quantidade, maximo):
+        with self._trava:
+            self._gravados += quantidade
+            if self._gravados < max(maximo // 10, 1):
+                return False
+            self._gravados = 0
+            return True
+
+def registrar_eventos(conexao, eventos):
+    """Grava eventos [(tipo, acao, objeto_id)]; a cada EVENTOS_MAXIMO // 10 corta o log"""
+    agora = datetime.utcnow()
+    tabela = Evento.__table__
+    inserir_em_massa(conexao, tabela, [
+        {'tipo': tipo, 'acao': acao, 'objeto_id': objeto_id, 'data': agora} for tipo, acao, objeto_id in eventos
+    ])
+    if servico('corte_eventos').registrar(len(eventos), EVENTOS_MAXIMO):
+        conexao.execute(tabela.delete().where(
+            tabela.c.id <= db.select(func.max(tabela.c.id)).scalar_subquery() - EVENTOS_MAXIMO
+        ))
+
+TIPOS_EVENTO = {Tarefa: 'tarefa', Categoria: 'categoria'}
+
+@event.listens_for(Session, 'after_flush')
+def registrar_eventos_da_sessao(sessao, contexto):
+    # Em after_flush new/dirty/deleted ainda mostram o estado de antes do flush (ids já gerados)
+    eventos = [(objeto, 'criada') for objeto in sessao.new] + \
+        [(objeto, 'atualizada') for objeto in sessao.dirty if sessao.is_modified(objeto)] + \
+        [(objeto, 'removida') for objeto in sessao.deleted]
+    eventos = [(TIPOS_EVENTO[type(objeto)], acao, objeto.id)
+               for objeto, acao in eventos if type(objeto) in TIPOS_EVENTO]
+    if eventos:
+        registrar_eventos(sessao.connection(), eventos)
+
+def consulta_eventos(ultimo_id, limite=EVENTOS_MAXIMO):
+    """Eventos depois de ultimo_id, em ordem (busca pela chave primária)"""
+    tabela = Evento.__table__
+    return db.select(tabela).where(tabela.c.id > ultimo_id).order_by(tabela.c.id).limit(limite)
+
+def consulta_limites_eventos():
+    """(menor id, maior id) do log; o menor diz se um Last-Event-ID ainda pode ser retomado"""
+    tabela = Evento.__table__
+    return db.select(func.min(tabela.c.id), func.max(tabela.c.id))
+
+def formatar_evento(evento):
+    """Um evento no formato SSE: id (para o Last-Event-ID), tipo e os dados em JSON"""
+    dados = codificar_json({'acao': evento.acao, 'id': evento.objeto_id, 'data': evento.data.isoformat()})
+    return f'id: {evento.id}\nevent: {evento.tipo}\ndata: '.encode() + dados + b'\n\n'
+
+def inicio_do_fluxo(ultimo_id, limites, pendentes):
+    """Primeiros pedaços de um fluxo de eventos; retorna (pedaços, último id enviado)
+
+    Sem Last-Event-ID o fluxo começa no fim do log. Com ele, os eventos perdidos saem do
+    log; se o log já foi cortado além desse ponto, o evento reset avisa o cliente para
+    recarregar (ou sincronizar com GET /tarefas?desde=).
+    """
+    menor, maior = limites
+    pedacos = [b'retry: 3000\n\n']
+    if ultimo_id is None:
+        return pedacos, maior or 0
+    if menor is not None and ultimo_id < menor - 1:
+        pedacos.append(b'event: reset\ndata: {}\n\n')
+        return pedacos, maior
+    for evento in pendentes:
+        pedacos.append(formatar_evento(evento))
+        ultimo_id = evento.id
+    return pedacos, ultimo_id
+
+def ler_ultimo_evento(cabecalhos, parametros):
+    """Last-Event-ID (reconexão do EventSource) ou ?ultimo_evento=; None se ausente, ValueError se inválido"""
+    bruto = cabecalhos.get('Last-Event-ID') or parametros.get('ultimo_evento')
+    return int(bruto) if bruto else None
+
+class DistribuidorEventos:
+    """Leitor do log de eventos compartilhado pelos assinantes de /eventos do app
+
+    Uma única thread lê o log (WHERE id > último, pela chave primária) a cada intervalo,
+    só enquanto houver assinantes, numa conexão emprestada do pool e devolvida logo em
+    seguida: assinantes ociosos não seguram conexão e o custo no banco não cresce com o
+    número deles. Como o log está no banco, eventos gravados em qualquer worker (ou no modo
+    ASGI) chegam a todos. No SQLite as escritas são serializadas, então os ids ficam visíveis
+    em ordem e o leitor não pula nenhum.
+    """
+
+    def __init__(self, intervalo, max_assinantes):
+        self.intervalo = intervalo
+        self.max_assinantes = max_assinantes
+        self._assinantes = set()
+        self._trava = threading.Lock()
+        self._thread = None
+        self._motor = None
+
+    def assinar(self, motor, avisar):
+        """Registra avisar(eventos), chamado na thread do leitor; False se lotado"""
+        with self._trava:
+            if len(self._assinantes) >= self.max_assinantes:
+                return False
+            self._assinantes.add(avisar)
+            self._motor = motor
+            if self._thread is None:
+                # Começa no fim do log: quem assina lê o que perdeu por conta própria
+                with motor.connect() as conexao:
+                    ultimo = conexao.execute(consulta_limites_eventos()).one()[1] or 0
+                self._thread = threading.Thread(target=self._executar, args=(ultimo,),
+                                                name='distribuidor-eventos', daemon=True)
+                self._thread.start()
+        return True
+
+    def cancelar(self, avisar):
+        with self._trava:
+            self._assinantes.discard(avisar)
+
+    def assinantes(self):
+        with self._trava:
+            return len(self._assinantes)
+
+    def _executar(self, ultimo):
+        while True:
+            time.sleep(self.intervalo)
+            with self._trava:
+                if not self._assinantes:
+                    self._thread = None
+                    return
+                assinantes, motor = list(self._assinantes), self._motor
             try:
-                tarefa.data_vencimento = datetime.fromisoformat(dados['data_vencimento'])
-            except ValueError:
-                return jsonify({'erro': 'Formato de data inválido'}), 400
-        else:
-            tarefa.data_vencimento = None
-    
-    if 'responsavel' in dados:
-        tarefa.responsavel = dados['responsavel']
-    
-    if 'categoria_id' in dados:
-        tarefa.categoria_id = dados['categoria_id']
-    
-    try:
-        db.session.commit()
-        return jsonify(tarefa.to_dict())
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'erro': 'Erro ao atualizar tarefa', 'detalhes': str(e)}), 500
+                with motor.connect() as conexao:
+                    eventos = conexao.execute(consulta_eventos(ultimo)).all()
+            except SQLAlchemyError as e:
+                app.logger.warning('⚠️  Leitura do log de eventos falhou: %s', e)
+                continue
+            if eventos:
+                ultimo = eventos[-1].id
+                for avisar in assinantes:
+                    avisar(eventos)
 
-@app.route('/tarefas/<int:id>', methods=['DELETE'])
-def deletar_tarefa(id):
-    tarefa = Tarefa.query.get_or_404(id)
-    
-    try:
-        db.session.delete(tarefa)
-        db.session.commit()
-        return jsonify({'message': 'Tarefa deletada com sucesso'}), 200
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'erro': 'Erro ao deletar tarefa', 'detalhes': str(e)}), 500
+# ===== CACHE DE LEITURA =====
 
-# ===== ROTAS DE CATEGORIAS =====
+class CacheLRU:
+    """Cache LRU com expiração por tempo, seguro para uso entre threads
 
-@app.route('/categorias', methods=['GET'])
-def listar_categorias():
-    categorias = Categoria.query.all()
-    return jsonify([categoria.to_dict() for categoria in categorias])
+    Guarda as representações já serializadas (dicts), nunca objetos do ORM. As escritas
+    invalidam as chaves depois do commit; um contador de geração impede que uma leitura
+    iniciada antes da invalidação grave no cache um valor já desatualizado. Isso só vale no
+    processo que escreveu: entre workers, quem garante é a versão na chave (versao_no_cache).
+    """
 
-@app.route('/categorias', methods=['POST'])
-def criar_categoria():
-    dados = request.get_json()
-    
-    if not dados or 'nome' not in dados:
-        return jsonify({'erro': 'Nome é obrigatório'}), 400
-    
-    categoria = Categoria(
-        nome=dados['nome'],
-        descricao=dados.get('descricao'),
-        cor=dados.get('cor')
-    )
-    
-    try:
-        db.session.add(categoria)
-        db.session.commit()
-        return jsonify(categoria.to_dict()), 201
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'erro': 'Erro ao criar categoria (nome já existe?)', 'detalhes': str(e)}), 500
+    def __init__(self, tamanho_maximo, ttl, habilitado=True):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.habilitado = habilitado
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._geracao = 0
+        self._trava = threading.Lock()
 
-@app.route('/categorias/<int:id>', methods=['GET'])
-def obter_categoria(id):
-    categoria = Categoria.query.get_or_404(id)
-    return jsonify(categoria.to_dict())
+    def obter(self, chave, carregar):
+        """Retorna o valor em cache ou chama carregar() e guarda o resultado"""
+        if not self.habilitado:
+            return carregar()
+        
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None and item[1] > time.monotonic():
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return item[0]
+            self.falhas += 1
+            geracao = self._geracao
+        
+        valor = carregar()
+        
+        with self._trava:
+            if geracao == self._geracao:
+                self._itens[chave] = (valor, time.monotonic() + self.ttl)
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.tamanho_maximo:
+                    self._itens.popitem(last=False)
+        return valor
 
-@app.route('/categorias/<int:id>', methods=['PUT'])
-def atualizar_categoria(id):
-    categoria = Categoria.query.get_or_404(id)
-    dados = request.get_json()
-    
-    if not dados:
-        return jsonify({'erro': 'Dados não fornecidos'}), 400
-    
-    if 'nome' in dados:
-        categoria.nome = dados['nome']
-    
-    if 'descricao' in dados:
-        categoria.descricao = dados['descricao']
-    
-    if 'cor' in dados:
-        categoria.cor = dados['cor']
-    
-    try:
-        db.session.commit()
-        return jsonify(categoria.to_dict())
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'erro': 'Erro ao atualizar categoria', 'detalhes': str(e)}), 500
+    def invalidar(self, *prefixos):
+        """Remove as chaves que começam com algum dos prefixos (tuplas)
 
-@app.route('/categorias/<int:id>', methods=['DELETE'])
-def deletar_categoria(id):
-    categoria = Categoria.query.get_or_404(id)
-    
-    # Verificar se há tarefas associadas
-    if categoria.tarefas:
-        return jsonify({
-            'erro': 'Não é possível deletar categoria com tarefas associadas',
-            'tarefas_associadas': len(categoria.tarefas)
-        }), 400
-    
-    try:
-        db.session.delete(categoria)
-        db.session.commit()
-        return jsonify({'message': 'Categoria deletada com sucesso'}), 200
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'erro': 'Erro ao deletar categoria', 'detalhes': str(e)}), 500
+        ('tarefa', 5) remove ('tarefa', 5) e também variantes como ('tarefa', 5, campos).
+        """
+        with self._trava:
+            self._geracao += 1
+            for chave in [chave for chave in self._itens
+                          if any(chave[:len(prefixo)] == prefixo for prefixo in prefixos)]:
+                del self._itens[chave]
 
-# ===== ROTA DE ESTATÍSTICAS =====
+    def limpar(self):
+        with self._trava:
+            self._geracao += 1
+            self._itens.clear()
 
-@app.route('/estatisticas', methods=['GET'])
-def obter_estatisticas():
-    total_tarefas = Tarefa.query.count()
-    
-    # Estatísticas por status
-    stats_status = {}
-    for status in StatusTarefa:
-        count = Tarefa.query.filter(Tarefa.status == status).count()
-        stats_status[status.value] = count
-    
-    # Estatísticas por prioridade
-    stats_prioridade = {}
-    for prioridade in PrioridadeTarefa:
-        count = Tarefa.query.filter(Tarefa.prioridade == prioridade).count()
-        stats_prioridade[prioridade.value] = count
-    
-    # Tarefas vencidas
-    tarefas_vencidas = Tarefa.query.filter(
-        Tarefa.data_vencimento < datetime.utcnow(),
-        Tarefa.status != StatusTarefa.CONCLUIDA
-    ).count()
-    
-    # Total de categorias
-    total_categorias = Categoria.query.count()
-    
-    return jsonify({
-        'total_tarefas': total_tarefas,
-        'total_categorias': total_categorias,
-        'tarefas_vencidas': tarefas_vencidas,
-        'por_status': stats_status,
-        'por_prioridade': stats_prioridade
-    })
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                'habilitado': self.habilitado,
+                'itens': len(self._itens),
+                'tamanho_maximo': self.tamanho_maximo,
+                'ttl': self.ttl,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else 0.0
+            }
 
-# ===== INICIALIZAÇÃO =====
+def invalidar_cache_tarefas(*ids):
+    """Tarefas alteradas mudam também o total_tarefas das categorias"""
+    servico('cache_leitura').invalidar(*[('tarefa', id) for id in ids], ('categorias',), ('categoria',))
 
-# Criar as tabelas do banco de dados
-with app.app_context():
-    db.create_all()
-    print("🗄️  Banco de dados criado com sucesso!")
-    print("📋 Modelos criados: Tarefa, Categoria")
+def invalidar_cache_categoria(id):
+    servico('cache_leitura').invalidar(('categoria', id), ('categorias',))
 
-if __name__ == '__main__':
-    print("🚀 Iniciando API Gerenciador de Tarefas...")
-    print("📡 Servidor rodando em: http://127.0.0.1:5000")
-    print("📖 Documentação: GET /")
-    app.run(debug=True)
+# ===== MÉTRICAS =====
+
+class MedicaoRequisicao:
+    """Acumuladores de uma requisição em andamento
+
+    formas só existe com o diagnóstico de SQL ligado: conta quantas vezes cada comando
+    (o texto com os parâmetros ainda como ?) foi executado, para detectar N+1.
+    """
+    __slots__ = ('inicio', 'consultas', 'tempo_sql', 'formas')
+
+    def __init__(self, diagnostico=False):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.formas = Counter() if diagnostico else None
+
+class SerieRota:
+    """Totais de um par (método, endpoint)"""
+    __slots__ = ('por_status', 'buckets', 'soma_duracao', 'consultas', 'tempo_sql', 'bytes')
+
+    def __init__(self, total_buckets):
+        self.por_status = Counter()
+        self.buckets = [0] * total_buckets
+        self.soma_duracao = 0.0
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.bytes = 0
+
+class MetricasRotas:
+    """Latência, consultas SQL e bytes de resposta por rota, no formato do Prometheus
+
+    Cada requisição custa uma busca binária no histograma e algumas somas sob uma trava;
+    os rótulos são o método e o nome do endpoint (nunca a URL), então o número de séries
+    é fixo. Os valores são por processo: com vários workers, cada um expõe os seus.
+    """
+
+    def __init__(self, buckets, habilitado=True):
+        self.buckets = buckets
+        self.habilitado = habilitado
+        self._series = {}
+        self._trava = threading.Lock()
 
+    def registrar(self, metodo, endpoint, status, medicao, tamanho):
+        duracao = time.perf_counter() - medicao.inicio
+        posicao = bisect.bisect_left(self.buckets, duracao)
+        with self._trava:
+            serie = self._series.get((metodo, endpoint))
+            if serie is None:
+                serie = self._series[(metodo, endpoint)] = SerieRota(len(self.buckets) + 1)
+            serie.por_status[status] += 1
+            serie.buckets[posicao] += 1
+            serie.soma_duracao += duracao
+            serie.consultas += medicao.consultas
+            serie.tempo_sql += medicao.tempo_sql
+            serie.bytes += tamanho
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (0.0.4)"""
+        linhas = []
+        def cabecalho(nome, tipo, ajuda):
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+
+        # Poucas dezenas de séries: formatar sob a trava é mais simples que copiar tudo
+        with self._trava:
+            series = sorted(self._series.items())
+
+            cabecalho('tarefas_api_requisicoes_total', 'counter', 'Requisições atendidas por método, endpoint e status')
+            for (metodo, endpoint), serie in series:
+                for status, total in sorted(serie.por_status.items()):
+                    linhas.append(f'tarefas_api_requisicoes_total{{metodo="{metodo}",endpoint="{endpoint}",'
+                                  f'status="{status}"}} {total}')
+
+            cabecalho('tarefas_api_requisicao_duracao_segundos', 'histogram', 'Latência das requisições')
+            for (metodo, endpoint), serie in series:
+                rotulos = f'metodo="{metodo}",endpoint="{endpoint}"'
+                acumulado = 0
+                for limite, total in zip([*self.buckets, '+Inf'], serie.buckets):
+                    acumulado += total
+                    linhas.append(f'tarefas_api_requisicao_duracao_segundos_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+                linhas.append(f'tarefas_api_requisicao_duracao_segundos_sum{{{rotulos}}} {serie.soma_duracao:.6f}')
+                linhas.append(f'tarefas_api_requisicao_duracao_segundos_count{{{rotulos}}} {acumulado}')
+
+            for nome, atributo, ajuda in [
+                ('tarefas_api_consultas_sql_total', 'consultas', 'Comandos SQL executados pelas requisições'),
+                ('tarefas_api_sql_duracao_segundos_total', 'tempo_sql', 'Tempo gasto nos comandos SQL'),
+                ('tarefas_api_resposta_bytes_total', 'bytes', 'Bytes enviados no corpo das respostas'),
+            ]:
+                cabecalho(nome, 'counter', ajuda)
+                for (metodo, endpoint), serie in series:
+                    valor = getattr(serie, atributo)
+                    valor = f'{valor:.6f}' if isinstance(valor, float) else valor
+                    linhas.append(f'{nome}{{metodo="{metodo}",endpoint="{endpoint}"}} {valor}')
+        return '\n'.join(linhas) + '\n'
+
+# Medição da requisição atual: vale por thread (Flask) e por tarefa asyncio (asgi.py)
+medicao_atual = contextvars.ContextVar('medicao_atual', default=None)
+
+def iniciar_medicao_requisicao():
+    """Começa a medir a requisição atual, se métricas ou diagnóstico estiverem ligados"""
+    diagnostico = servico('diagnostico_sql')
+    if servico('metricas').habilitado or diagnostico.habilitado:
+        return medicao_atual.set(MedicaoRequisicao(diagnostico.habilitado))
+    return None
+
+def concluir_medicao_requisicao(metodo, endpoint, caminho, status, medicao, tamanho):
+    metricas = servico('metricas')
+    if metricas.habilitado:
+        metricas.registrar(metodo, endpoint, status, medicao, tamanho)
+    if medicao.formas is not None:
+        servico('diagnostico_sql').avaliar_requisicao(f'{metodo} {caminho}', medicao)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def iniciar_cronometro_sql(conexao, cursor, statement, parameters, contexto, executemany):
+    if medicao_atual.get() is not None or servico('diagnostico_sql').habilitado:
+        contexto._inicio_metricas = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def parar_cronometro_sql(conexao, cursor, statement, parameters, contexto, executemany):
+    inicio = getattr(contexto, '_inicio_metricas', None)
+    if inicio is None:
+        return
+    duracao = time.perf_counter() - inicio
+    medicao = medicao_atual.get()
+    if medicao is not None:
+        medicao.consultas += 1
+        medicao.tempo_sql += duracao
+        if medicao.formas is not None:
+            medicao.formas[statement] += 1
+    diagnostico = servico('diagnostico_sql')
+    if diagnostico.habilitado and duracao * 1000 >= diagnostico.limiar_lento_ms:
+        diagnostico.registrar_lento(conexao, statement, parameters, executemany, duracao)
+
+# ===== DIAGNÓSTICO DE SQL =====
+
+def plano_de_consulta(conexao_dbapi, statement, parameters, dialeto='sqlite'):
+    """Passos do plano do banco para o comando (EXPLAIN QUERY PLAN no SQLite)"""
+    prefixo = 'EXPLAIN QUERY PLAN ' if dialeto == 'sqlite' else 'EXPLAIN '
+    cursor = conexao_dbapi.cursor()
+    try:
+        cursor.execute(prefixo + statement, parameters)
+        # SQLite: (id, pai, -, detalhe); PostgreSQL/MySQL: o texto vem na última coluna
+        return [str(linha[-1]) for linha in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+COMANDOS_COM_PLANO = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+class OrcamentoConsultasExcedido(AssertionError):
+    """Requisição fora do orçamento de consultas dentro de DiagnosticoSQL.verificar()"""
+
+class DiagnosticoSQL:
+    """Log de SQL lento com plano, detector de N+1 e orçamento de consultas por requisição
+
+    Desligado por padrão (DIAGNOSTICO_SQL): guarda o texto de cada comando da requisição e
+    roda EXPLAIN nos lentos, o que é barato em desenvolvimento mas não precisa ir para
+    produção. Os avisos vão para app.logger.
+    """
+
+    def __init__(self, habilitado, limiar_lento_ms, repeticoes_n_mais_um, orcamento):
+        self.habilitado = habilitado
+        self.limiar_lento_ms = limiar_lento_ms
+        self.repeticoes_n_mais_um = repeticoes_n_mais_um
+        self.orcamento = orcamento
+        self._violacoes = None
+
+    def registrar_lento(self, conexao, statement, parameters, executemany, duracao):
+        plano = '-'
+        # EXPLAIN só para DML (DDL, PRAGMA e executemany não têm plano útil)
+        if not executemany and statement.lstrip()[:6].upper() in COMANDOS_COM_PLANO:
+            try:
+                plano = '; '.join(plano_de_consulta(conexao.connection, statement, parameters, conexao.dialect.name))
+            except Exception as e:  # o aviso não pode derrubar a requisição
+                plano = f'indisponível ({e})'
+        app.logger.warning('🐢 SQL lento (%.1f ms): %s | parâmetros: %r | plano: %s',
+                           duracao * 1000, ' '.join(statement.split()), parameters, plano)
+
+    def avaliar_requisicao(self, descricao, medicao, orcamento=None):
+        """Problemas da requisição (N+1, orçamento estourado), registrados no log"""
+        problemas = [
+            f"possível N+1: {vezes}x {' '.join(forma.split())}"
+            for forma, vezes in medicao.formas.most_common() if vezes >= self.repeticoes_n_mais_um
+        ]
+        orcamento = orcamento or self.orcamento
+        if orcamento and medicao.consultas > orcamento:
+            problemas.append(f'{medicao.consultas} consultas (orçamento: {orcamento})')
+        for problema in problemas:
+            app.logger.warning('⚠️  %s: %s', descricao, problema)
+        if problemas and self._violacoes is not None:
+            self._violacoes.append(f"{descricao}: {'; '.join(problemas)}")
+        return problemas
+
+    @contextlib.contextmanager
+    def verificar(self, orcamento=None):
+        """Liga o diagnóstico no bloco e falha se alguma requisição tiver N+1 ou passar do orçamento
+
+            with diagnostico_sql.verificar(orcamento=3):
+                cliente.get('/categorias')
+        """
+        estado = (self.habilitado, self.orcamento, self._violacoes)
+        self.habilitado, self._violacoes = True, []
+        if orcamento is not None:
+            self.orcamento = orcamento
+        try:
+            yield
+            violacoes = self._violacoes
+        finally:
+            self.habilitado, self.orcamento, self._violacoes = estado
+        if violacoes:
+            raise OrcamentoConsultasExcedido('; '.join(violacoes))
+
+# ===== COMPRESSÃO DAS RESPOSTAS =====
+
+class CompressorBrotli:
+    """brotli.Compressor com a interface dos compressores do zlib e do zstandard"""
+
+    def __init__(self, qualidade):
+        self._compressor = brotli.Compressor(quality=qualidade)
+
+    def compress(self, dados):
+        return self._compressor.process(dados)
+
+    def flush(self):
+        return self._compressor.finish()
+
+class CompressaoRespostas:
+    """Compressão negociada pelo Accept-Encoding: zstd, br e gzip, os que estiverem instalados
+
+    Serve ao app Flask (comprimir_resposta) e ao modo ASGI. Só tipos de texto (JSON, NDJSON,
+    CSV, texto) são comprimidos, e nunca o text/event-stream do /eventos. Respostas em fluxo
+    são comprimidas pedaço a pedaço, sem juntar o corpo na memória.
+    """
+
+    TIPOS = {'application/json', 'application/x-ndjson', 'text/csv', 'text/plain'}
+
+    def __init__(self, minimo, habilitada=True):
+        self.minimo = minimo
+        self.habilitada = habilitada
+        # Ordem de preferência quando o cliente aceita várias com a mesma qualidade
+        self.codificacoes = [nome for nome, modulo in (('zstd', zstandard), ('br', brotli), ('gzip', zlib))
+                             if modulo is not None]
+
+    def aplicavel(self, tipo, status):
+        """A resposta (mimetype, status) pode variar conforme o Accept-Encoding?"""
+        return self.habilitada and tipo in self.TIPOS and status not in (204, 304)
+
+    def escolher(self, accept_encoding):
+        """Codificação de maior qualidade aceita pelo cliente; None: sem compressão"""
+        aceitas = parse_accept_header(accept_encoding)
+        escolhida, melhor = None, 0
+        for nome in self.codificacoes:
+            if aceitas[nome] > melhor:
+                escolhida, melhor = nome, aceitas[nome]
+        # identity só vence quando o cliente a lista explicitamente com qualidade maior
+        if dict(aceitas).get('identity', 0) > melhor:
+            return None
+        return escolhida
+
+    def compressor(self, codificacao):
+        """Compressor incremental: compress(pedaço) e, no fim, flush()"""
+        nivel = COMPRESSAO_NIVEIS[codificacao]
+        if codificacao == 'zstd':
+            return zstandard.ZstdCompressor(level=nivel).compressobj()
+        if codificacao == 'br':
+            return CompressorBrotli(nivel)
+        return zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31: formato gzip
+
+    def comprimir(self, dados, codificacao):
+        compressor = self.compressor(codificacao)
+        return compressor.compress(dados) + compressor.flush()
+
+    def comprimir_fluxo(self, pedacos, codificacao):
+        # O compressor acumula pedaços pequenos (uma tarefa por pedaço) em blocos maiores
+        compressor = self.compressor(codificacao)
+        for pedaco in pedacos:
+            saida = compressor.compress(pedaco)
+            if saida:
+                yield saida
+        yield compressor.flush()
+
+def comprimir_resposta(resposta):
+    """after_request: comprime a resposta conforme o Accept-Encoding da requisição"""
+    compressao = servico('compressao')
+    if not compressao.aplicavel(resposta.mimetype, resposta.status_code) or resposta.direct_passthrough \
+            or 'Content-Encoding' in resposta.headers:
+        return resposta
+    resposta.vary.add('Accept-Encoding')
+    codificacao = compressao.escolher(request.headers.get('Accept-Encoding'))
+    if codificacao is None:
+        return resposta
+    if resposta.is_streamed:
+        resposta.response = compressao.comprimir_fluxo(resposta.response, codificacao)
+    else:
+        dados = resposta.get_data()
+        if len(dados) < compressao.minimo:
+            return resposta
+        resposta.set_data(compressao.comprimir(dados, codificacao))
+    resposta.headers['Content-Encoding'] = codificacao
+    # Outra sequência de bytes: o ETag vira fraco (If-None-Match compara de forma fraca)
+    etag, fraco = resposta.get_etag()
+    if etag and not fraco:
+        resposta.set_etag(etag, weak=True)
+    return resposta
+
+# ===== CONTROLE DE ADMISSÃO =====
+
+# Sob pico, recusar cedo (429/503 com Retry-After) custa microssegundos; enfileirar atrás do
+# único escritor do SQLite faz a latência de todos subir até os workers estourarem o tempo.
+# Os valores são por processo: com vários workers, cada um aplica os seus limites.
+
+class LimitadorClientes:
+    """Token bucket por cliente, com um balde para leituras e outro para escritas
+
+    Cada balde começa cheio (a rajada) e ganha `por_segundo` fichas por segundo; cada
+    requisição gasta uma. Os baldes ficam num LRU de até maximo_clientes: um cliente
+    esquecido volta com o balde cheio.
+    """
+
+    def __init__(self, orcamentos, cabecalho_cliente='', maximo_clientes=LIMITE_MAXIMO_CLIENTES, habilitado=True):
+        self.orcamentos = orcamentos  # tipo -> (por_segundo, rajada)
+        self.cabecalho_cliente = cabecalho_cliente
+        self.maximo_clientes = maximo_clientes
+        self.habilitado = habilitado
+        self.recusadas = Counter()
+        self._baldes = OrderedDict()  # (cliente, tipo) -> [fichas, instante]
+        self._trava = threading.Lock()
+
+    def identificar(self, cabecalhos, endereco):
+        """Cliente da requisição: o cabeçalho configurado (1º endereço da lista) ou o IP"""
+        valor = cabecalhos.get(self.cabecalho_cliente) if self.cabecalho_cliente else None
+        return valor.split(',')[0].strip() if valor else endereco or 'desconhecido'
+
+    def consumir(self, cliente, tipo):
+        """0 se a requisição pode seguir; senão, segundos até o balde ter uma ficha"""
+        por_segundo, rajada = self.orcamentos[tipo]
+        agora = time.monotonic()
+        with self._trava:
+            balde = self._baldes.get((cliente, tipo))
+            if balde is None:
+                balde = self._baldes[(cliente, tipo)] = [rajada, agora]
+                if len(self._baldes) > self.maximo_clientes:
+                    self._baldes.popitem(last=False)
+            else:
+                self._baldes.move_to_end((cliente, tipo))
+                balde[0] = min(rajada, balde[0] + (agora - balde[1]) * por_segundo)
+                balde[1] = agora
+            if balde[0] >= 1:
+                balde[0] -= 1
+                return 0
+            self.recusadas[tipo] += 1
+            return (1 - balde[0]) / por_segundo
+
+    def estatisticas(self):
+        with self._trava:
+            return {'clientes': len({cliente for cliente, _ in self._baldes}), 'recusadas': dict(self.recusadas)}
+
+class TetoConcorrencia:
+    """Máximo de requisições trabalhando no banco ao mesmo tempo
+
+    Quem chega com o teto cheio espera uma vaga por até `espera` segundos e depois é
+    recusado: a fila fica curta e limitada, em vez de crescer até o DB_POOL_TIMEOUT.
+    Threads esperam em entrar(); o modo ASGI entra na fila com entrar_ou_aguardar() e
+    recebe a vaga por um aviso, sem bloquear o event loop.
+    """
+
+    def __init__(self, maximo, espera):
+        self.maximo = maximo
+        self.espera = espera
+        self.em_andamento = 0
+        self.esperas = 0
+        self.recusadas = 0
+        self._condicao = threading.Condition()
+        self._aguardando = deque()  # avisos do modo ASGI, em ordem de chegada
+
+    def _cheio(self):
+        return self.maximo and self.em_andamento >= self.maximo
+
+    def entrar_ou_aguardar(self, avisar):
+        """Ocupa uma vaga (True) ou põe avisar() na fila: ele é chamado ao receber uma vaga"""
+        with self._condicao:
+            if not self._cheio():
+                self.em_andamento += 1
+                return True
+            self.esperas += 1
+            self._aguardando.append(avisar)
+            return False
+
+    def desistir(self, avisar):
+        """Tira avisar() da fila (True); False se a vaga já foi repassada a ele"""
+        with self._condicao:
+            try:
+                self._aguardando.remove(avisar)
+            except ValueError:
+                return False
+            self.recusadas += 1
+            return True
+
+    def entrar(self):
+        """Ocupa uma vaga, esperando até `espera` segundos (bloqueia a thread); False: recusada"""
+        with self._condicao:
+            if self._cheio():
+                self.esperas += 1
+                if not self._condicao.wait_for(lambda: not self._cheio(), self.espera):
+                    self.recusadas += 1
+                    return False
+            self.em_andamento += 1
+            return True
+
+    def sair(self):
+        with self._condicao:
+            if not self._aguardando:
+                self.em_andamento -= 1
+                self._condicao.notify()
+                return
+            # A vaga passa direto para o primeiro da fila, sem voltar a ficar livre
+            avisar = self._aguardando.popleft()
+        avisar()
+
+# Monitoramento (e a raiz) responde mesmo sob carga; /eventos não ocupa o banco enquanto
+# está aberto, então passa pelo limite por cliente mas não pelo teto
+ROTAS_SEM_LIMITE = {'index', 'health_check', 'exportar_metricas', 'obter_estatisticas_cache'}
+ROTAS_SEM_TETO = {'transmitir_eventos'}
+METODOS_LEITURA = {'GET', 'HEAD'}
+
+def verificar_limite(endpoint, metodo, cabecalhos, endereco):
+    """None se o cliente ainda tem orçamento; senão (corpo, status, cabeçalhos) do 429"""
+    limitador = servico('limitador')
+    if not limitador.habilitado or endpoint is None or endpoint in ROTAS_SEM_LIMITE or metodo == 'OPTIONS':
+        return None
+    tipo = 'leitura' if metodo in METODOS_LEITURA else 'escrita'
+    espera = limitador.consumir(limitador.identificar(cabecalhos, endereco), tipo)
+    if not espera:
+        return None
+    por_segundo, rajada = limitador.orcamentos[tipo]
+    return ({'erro': f'Limite de {tipo}s excedido ({por_segundo:g}/s, rajada de {rajada})'}, 429,
+            {'Retry-After': str(math.ceil(espera))})
+
+def precisa_de_vaga(endpoint, metodo):
+    return endpoint is not None and endpoint not in ROTAS_SEM_LIMITE | ROTAS_SEM_TETO and metodo != 'OPTIONS'
+
+RECUSA_OCUPADO = ({'erro': 'Servidor ocupado, tente novamente'}, 503, {'Retry-After': '1'})
+
+def exportar_admissao():
+    """Estado do limitador e do teto, no formato do Prometheus (anexado a /metrics)"""
+    limitador, teto_concorrencia = servico('limitador'), servico('teto_concorrencia')
+    limite = limitador.estatisticas()
+    linhas = [
+        '# HELP tarefas_api_limite_recusadas_total Requisições recusadas (429) pelo limite por cliente',
+        '# TYPE tarefas_api_limite_recusadas_total counter',
+        *(f'tarefas_api_limite_recusadas_total{{tipo="{tipo}"}} {limite["recusadas"].get(tipo, 0)}'
+          for tipo in sorted(limitador.orcamentos)),
+        '# HELP tarefas_api_limite_clientes Clientes com balde no limitador',
+        '# TYPE tarefas_api_limite_clientes gauge',
+        f'tarefas_api_limite_clientes {limite["clientes"]}',
+    ]
+    for nome, tipo, ajuda, valor in [
+        ('tarefas_api_concorrencia_em_andamento', 'gauge', 'Requisições trabalhando no banco agora',
+         teto_concorrencia.em_andamento),
+        ('tarefas_api_concorrencia_maxima', 'gauge', 'Teto de requisições no banco (0 = sem teto)',
+         teto_concorrencia.maximo),
+        ('tarefas_api_concorrencia_esperas_total', 'counter', 'Requisições que esperaram uma vaga',
+         teto_concorrencia.esperas),
+        ('tarefas_api_concorrencia_recusadas_total', 'counter', 'Requisições recusadas (503) pelo teto',
+         teto_concorrencia.recusadas),
+    ]:
+        linhas += [f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}', f'{nome} {valor}']
+    return '\n'.join(linhas) + '\n'
+
+def uma_vez(funcao):
+    """funcao() só na primeira chamada: o fim do fluxo e o close() da resposta liberam a mesma vaga"""
+    chamada = []
+    def envolver():
+        if not chamada:
+            chamada.append(True)
+            funcao()
+    return envolver
+
+def liberar_no_fim(pedacos, liberar):
+    """Repassa os pedaços de uma resposta em fluxo e libera a vaga quando ela termina
+
+    Um gerador que nunca começou não roda o finally: quem usa também registra liberar()
+    no close() da resposta.
+    """
+    try:
+        yield from pedacos
+    finally:
+        liberar()
+
+def admitir_requisicao():
+    """before_request: 429 pelo limite do cliente, 503 com o teto de concorrência cheio"""
+    recusa = verificar_limite(request.endpoint, request.method, request.headers, request.remote_addr)
+    if recusa is None and precisa_de_vaga(request.endpoint, request.method):
+        if not servico('teto_concorrencia').entrar():
+            recusa = RECUSA_OCUPADO
+        else:
+            g.vaga_banco = True
+    if recusa is not None:
+        corpo, status, cabecalhos = recusa
+        return jsonify(corpo), status, cabecalhos
+
+def liberar_vaga(resposta):
+    """after_request: a vaga é devolvida agora, ou no fim do corpo se ele for um fluxo"""
+    if g.pop('vaga_banco', False):
+        if resposta.is_streamed:
+            liberar = uma_vez(servico('teto_concorrencia').sair)
+            resposta.response = liberar_no_fim(resposta.response, liberar)
+            resposta.call_on_close(liberar)
+        else:
+            servico('teto_concorrencia').sair()
+    return resposta
+
+def liberar_vaga_em_erro(erro):
+    """teardown_request: exceção que não passou pelo after_request (ex.: PROPAGATE_EXCEPTIONS)"""
+    if g.pop('vaga_banco', False):
+        servico('teto_concorrencia').sair()
+
+# ===== CONSULTAS DE CATEGORIAS =====
+
+def total_de_tarefas(categoria_id):
+    """Total de tarefas da categoria, ativas e arquivadas (as mesmas que impedem removê-la)
+
+    categoria_id é um id ou a coluna Categoria.id (subconsulta correlacionada). Cada contagem
+    é uma busca no índice de categoria_id da sua tabela.
+    """
+    ativas, arquivadas = [
+        db.select(func.count(modelo.id)).where(modelo.categoria_id == categoria_id)
+        .correlate(Categoria).scalar_subquery()
+        for modelo in (Tarefa, TarefaArquivada)
+    ]
+    return ativas + arquivadas
+
+def consultar_categorias_com_total(sessao):
+    """Categorias junto com o total de tarefas, contado numa única consulta"""
+    return sessao.query(Categoria, total_de_tarefas(Categoria.id))
+
+# ===== PROJEÇÃO DE CAMPOS =====
+
+def ler_campos(modelo, parametros):
+    """Lê ?campos=a,b,c dos parâmetros da URL; retorna (campos ou None, erro)"""
+    bruto = parametros.get('campos')
+    if not bruto:
+        return None, None
+    campos = tuple(dict.fromkeys(campo.strip() for campo in bruto.split(',') if campo.strip()))
+    invalidos = [campo for campo in campos if campo not in modelo.CAMPOS]
+    if invalidos or not campos:
+        return None, f'Campos inválidos: {", ".join(invalidos) or bruto}'
+    return campos, None
+
+def projetar(query, modelo, campos):
+    """Restringe o SELECT às colunas pedidas (a chave primária sempre vem junto)"""
+    if campos is None:
+        return query
+    colunas = [getattr(modelo, campo) for campo in campos if campo in modelo.__table__.c]
+    return query.options(load_only(*(colunas or [modelo.id])))
+
+# ===== VALIDAÇÃO =====
+
+def validar_dados_tarefa(dados, parcial=False):
+    """Valida e converte os campos de uma tarefa; retorna (valores, erro)
+
+    Com parcial=True (atualização) só os campos presentes em dados são retornados;
+    caso contrário status e prioridade recebem os valores padrão.
+    """
+    valores = {}
+    
+    if not parcial and 'titulo' not in dados:
+        return None, 'Título é obrigatório'
+    
+    for campo in ('titulo', 'descricao', 'responsavel', 'categoria_id'):
+        if campo in dados:
+            valores[campo] = dados[campo]
+    
+    # Validar status se fornecido
+    if 'status' in dados:
+        try:
+            valores['status'] = StatusTarefa(dados['status'])
+        except ValueError:
+            return None, f'Status inválido: {dados["status"]}'
+    
+    # Validar prioridade se fornecida
+    if 'prioridade' in dados:
+        try:
+            valores['prioridade'] = PrioridadeTarefa(dados['prioridade'])
+        except ValueError:
+            return None, f'Prioridade inválida: {dados["prioridade"]}'
+    
+    # Validar data de vencimento se fornecida
+    if 'data_vencimento' in dados:
+        if dados['data_vencimento']:
+            try:
+                valores['data_vencimento'] = datetime.fromisoformat(dados['data_vencimento'])
+            except (TypeError, ValueError):
+                if parcial:
+                    return None, 'Formato de data inválido'
+                return None, 'Formato de data inválido. Use ISO format: YYYY-MM-DDTHH:MM:SS'
+        else:
+            valores['data_vencimento'] = None
+    
+    if not parcial:
+        valores.setdefault('status', StatusTarefa.PENDENTE)
+        valores.setdefault('prioridade', PrioridadeTarefa.MEDIA)
+    
+    return valores, None
+
+def validar_categoria(sessao, categoria_id):
+    """Erro se categoria_id aponta para uma categoria inexistente (a chave estrangeira recusaria a gravação)"""
+    if categoria_id is None:
+        return None
+    if sessao.query(Categoria.id).filter(Categoria.id == categoria_id).first() is None:
+        return f'Categoria {categoria_id} não encontrada'
+    return None
+
+# ===== PAGINAÇÃO =====
+
+def codificar_cursor(*chave):
+    """Gera o cursor opaco com a chave de ordenação da última tarefa da página"""
+    bruto = '|'.join(parte.isoformat() if isinstance(parte, datetime) else str(parte) for parte in chave)
+    return base64.urlsafe_b64encode(bruto.encode()).decode()
+
+def decodificar_cursor(cursor, *tipos):
+    """Converte o cursor de volta na chave, aplicando um tipo por parte; ValueError se inválido"""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor.encode()).decode()
+        partes = bruto.split('|')
+        if len(partes) != len(tipos):
+            raise ValueError(bruto)
+        return tuple(tipo(parte) for tipo, parte in zip(tipos, partes))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f'Cursor inválido: {cursor}') from e
+
+# ===== BUSCA TEXTUAL =====
+
+# Índice FTS5 sobre titulo e descricao. A tabela virtual lê o conteúdo da própria tabela
+# tarefa (external content) e é mantida por triggers, que valem também para as escritas
+# em massa. Bancos sem FTS5 (ou servidores) usam LIKE como alternativa.
+SQL_BUSCA_TEXTUAL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tarefa_fts USING fts5(
+        titulo, descricao, content='tarefa', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS tarefa_fts_insercao AFTER INSERT ON tarefa BEGIN
+        INSERT INTO tarefa_fts(rowid, titulo, descricao) VALUES (new.id, new.titulo, new.descricao);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tarefa_fts_remocao AFTER DELETE ON tarefa BEGIN
+        INSERT INTO tarefa_fts(tarefa_fts, rowid, titulo, descricao)
+        VALUES ('delete', old.id, old.titulo, old.descricao);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tarefa_fts_atualizacao AFTER UPDATE OF titulo, descricao ON tarefa BEGIN
+        INSERT INTO tarefa_fts(tarefa_fts, rowid, titulo, descricao)
+        VALUES ('delete', old.id, old.titulo, old.descricao);
+        INSERT INTO tarefa_fts(rowid, titulo, descricao) VALUES (new.id, new.titulo, new.descricao);
+    END""",
+]
+
+tarefa_fts = db.table('tarefa_fts', db.column('rowid'))
+
+def criar_busca_textual(conexao):
+    """Cria a tabela FTS5 e os triggers (só SQLite) e reindexa as tarefas existentes"""
+    if conexao.dialect.name != 'sqlite':
+        return
+    try:
+        for comando in SQL_BUSCA_TEXTUAL:
+            conexao.exec_driver_sql(comando)
+    except OperationalError as e:
+        print(f"⚠️  Busca textual indisponível (SQLite sem FTS5?): {e}")
+        return
+    reconstruir_busca_textual(conexao)
+
+def reconstruir_busca_textual(conexao):
+    conexao.exec_driver_sql("INSERT INTO tarefa_fts(tarefa_fts) VALUES ('rebuild')")
+    servico('busca_textual')['disponivel'] = None
+
+@contextlib.contextmanager
+def indexacao_em_massa(conexao):
+    """Bloco de inserção em massa de tarefas sem o trigger de inserção do FTS5
+
+    Pelo trigger o FTS5 indexa linha a linha, várias vezes mais devagar que indexar o lote
+    de uma vez; aqui o trigger sai, o bloco insere e põe na lista recebida as tarefas
+    inseridas [(id, titulo, descricao)], que entram no índice num único executemany. O DDL
+    do SQLite é transacional: as outras conexões nunca veem o banco sem o trigger.
+    """
+    ativo = conexao.dialect.name == 'sqlite' and conexao.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'tarefa_fts_insercao'"
+    ).first() is not None
+    if ativo:
+        # O pysqlite só abre a transação antes de INSERT/UPDATE/DELETE: sem ela o DROP seria
+        # confirmado na hora, e um erro no bloco deixaria o banco sem o trigger
+        if not conexao.connection.driver_connection.in_transaction:
+            conexao.exec_driver_sql('BEGIN')
+        conexao.exec_driver_sql('DROP TRIGGER tarefa_fts_insercao')
+    linhas = []
+    yield linhas
+    if ativo:
+        if linhas:
+            conexao.exec_driver_sql('INSERT INTO tarefa_fts(rowid, titulo, descricao) VALUES (?, ?, ?)', linhas)
+        conexao.exec_driver_sql(SQL_BUSCA_TEXTUAL[1])
+
+def busca_textual_disponivel():
+    busca = servico('busca_textual')
+    if busca['disponivel'] is None:
+        busca['disponivel'] = db.engine.dialect.name == 'sqlite' and db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tarefa_fts'")
+        ).first() is not None
+    return busca['disponivel']
+
+def filtrar_busca(query, texto, modelo=Tarefa):
+    """Restringe a query às tarefas com todas as palavras do texto
+
+    Retorna (query, relevancia); relevancia é a expressão bm25 para ordenar os
+    resultados, ou None quando a busca é feita com LIKE (sempre, nas arquivadas).
+    """
+    termos = texto.split()
+    if modelo is Tarefa and busca_textual_disponivel():
+        # Cada palavra vira uma frase entre aspas: a sintaxe do FTS5 nunca vem do usuário
+        consulta = ' '.join('"' + termo.replace('"', '""') + '"' for termo in termos)
+        query = query.join(tarefa_fts, tarefa_fts.c.rowid == Tarefa.id).filter(
+            db.text('tarefa_fts MATCH :consulta').bindparams(consulta=consulta)
+        )
+        return query, func.bm25(db.literal_column('tarefa_fts'))
+    for termo in termos:
+        padrao = f'%{termo}%'
+        query = query.filter(db.or_(modelo.titulo.ilike(padrao), modelo.descricao.ilike(padrao)))
+    return query, None
+
+# ===== SERIALIZAÇÃO RÁPIDA =====
+
+# A listagem de tarefas lê tuplas direto do Core (sem ORM, sem identity map) e converte
+# os valores com tabelas pré-calculadas. O resultado é igual ao de Tarefa.to_dict().
+STATUS_POR_NOME = {status.name: status.value for status in StatusTarefa}
+PRIORIDADE_POR_NOME = {prioridade.name: prioridade.value for prioridade in PrioridadeTarefa}
+
+def data_iso_sqlite(valor):
+    """Texto de data do SQLite ('2025-06-06 12:00:00.000000') no formato de isoformat()"""
+    if len(valor) == 26 and valor[10] == ' ':
+        return valor[:10] + 'T' + (valor[11:19] if valor.endswith('.000000') else valor[11:])
+    return datetime.fromisoformat(valor).isoformat()
+
+def colunas_rapidas(campos, modelo=Tarefa):
+    """Colunas do SELECT e a função de conversão de cada campo (None: valor já pronto)
+
+    Enums chegam como o nome gravado no banco e são traduzidos por dicionário; no SQLite
+    as datas também chegam como texto, evitando criar um datetime por valor.
+    """
+    texto_bruto = db.engine.dialect.name == 'sqlite'
+    colunas, conversores = [], []
+    for campo in campos:
+        coluna = getattr(modelo, campo)
+        if campo == 'status':
+            colunas.append(type_coerce(coluna, db.String))
+            conversores.append(STATUS_POR_NOME.__getitem__)
+        elif campo == 'prioridade':
+            colunas.append(type_coerce(coluna, db.String))
+            conversores.append(PRIORIDADE_POR_NOME.__getitem__)
+        elif isinstance(coluna.type, db.DateTime):
+            colunas.append(type_coerce(coluna, db.String) if texto_bruto else coluna)
+            conversores.append(data_iso_sqlite if texto_bruto else datetime.isoformat)
+        else:
+            colunas.append(coluna)
+            conversores.append(None)
+    return colunas, conversores
+
+def linhas_para_dicts(linhas, campos, conversores):
+    """Converte tuplas do banco em dicts no formato de Tarefa.to_dict()"""
+    pares = list(zip(campos, conversores))
+    for linha in linhas:
+        yield {
+            campo: valor if conversor is None or valor is None else conversor(valor)
+            for (campo, conversor), valor in zip(pares, linha)
+        }
+
+def escapar_como_json(erro):
+    """Tratador de erro de codificação: não ASCII como \\uXXXX (par de substitutos acima de U+FFFF)"""
+    partes = []
+    for caractere in erro.object[erro.start:erro.end]:
+        codigo = ord(caractere)
+        if codigo > 0xffff:
+            codigo -= 0x10000
+            partes.append('\\u%04x\\u%04x' % (0xd800 | (codigo >> 10), 0xdc00 | (codigo & 0x3ff)))
+        else:
+            partes.append('\\u%04x' % codigo)
+    return ''.join(partes), erro.end
+
+codecs.register_error('escapar_como_json', escapar_como_json)
+
+def tem_float_com_expoente(dados):
+    """Se algum float de dados (dict ou list) sai com expoente: o orjson escreve 1e-5, o json padrão 1e-05"""
+    for valor in (dados.values() if type(dados) is dict else dados):
+        tipo = type(valor)
+        if tipo is float:
+            if valor and not 1e-4 <= abs(valor) < 1e16:
+                return True
+        elif (tipo is dict or tipo is list) and tem_float_com_expoente(valor):
+            return True
+    return False
+
+def codificar_json(dados):
+    """Mesmo JSON de jsonify(), byte a byte (chaves ordenadas, compacto, não ASCII como \\uXXXX)
+
+    Usa o orjson se instalado: os caracteres não ASCII, que ele grava em UTF-8, são escapados
+    depois. O que ele escreveria diferente (floats com expoente, inteiros acima de 64 bits) fica
+    com o json da biblioteca padrão.
+    """
+    if orjson is not None and type(dados) in (dict, list) and not tem_float_com_expoente(dados):
+        try:
+            saida = orjson.dumps(dados, option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:
+            saida = None
+        if saida is not None:
+            if not saida.isascii():
+                # Só aparecem dentro de strings, onde o escape \uXXXX vale o mesmo caractere
+                saida = saida.decode().encode('ascii', 'escapar_como_json')
+            # O json padrão também escapa o DEL (0x7f)
+            return saida.replace(b'\x7f', b'\\u007f')
+    return json.dumps(dados, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode()
+
+def responder_json(dados):
+    return Response(codificar_json(dados) + b'\n', mimetype='application/json')
+
+# ===== LISTAGEM DE TAREFAS =====
+
+# Consulta de GET /tarefas já montada; modo: 'lista' (JSON completo), 'fluxo' (JSON em
+# pedaços), 'ndjson', 'pagina' (paginação por cursor, com limite) ou 'sincronizacao'
+# (?desde=; desde guarda a chave de partida e se a sincronização é completa)
+ListagemTarefas = namedtuple('ListagemTarefas', 'consulta campos conversores modo limite desde',
+                             defaults=(None,))
+
+def quer_ndjson(parametros, accept):
+    """NDJSON via ?formato=ndjson ou cabeçalho Accept: application/x-ndjson"""
+    if parametros.get('formato') == 'ndjson':
+        return True
+    aceitos = parse_accept_header(accept, MIMEAccept)
+    return aceitos['application/x-ndjson'] > aceitos['application/json']
+
+def montar_listagem_tarefas(parametros, accept=None):
+    """Monta o SELECT de GET /tarefas a partir dos parâmetros da URL; retorna (listagem, erro)
+
+    Só constrói a consulta: a rota Flask e o modo ASGI (asgi.py) a executam cada um
+    com a sua sessão.
+    """
+    # Filtros opcionais
+    status = parametros.get('status')
+    prioridade = parametros.get('prioridade')
+    categoria_id = parametros.get('categoria_id')
+    
+    # Projeção opcional: só as colunas pedidas saem do banco
+    campos, erro = ler_campos(Tarefa, parametros)
+    if erro:
+        return None, erro
+    campos = campos or Tarefa.CAMPOS
+    
+    # Leitura sem ORM: tuplas do Core convertidas por serialização rápida
+    colunas, conversores = colunas_rapidas(campos)
+    
+    # Tarefas arquivadas só entram quando pedidas: por padrão só a tabela quente é lida
+    incluir_arquivadas = parametros.get('incluir_arquivadas', '').lower() == 'true'
+    
+    # Sincronização incremental: só o que mudou desde o ponto informado
+    desde = parametros.get('desde')
+    if desde is not None:
+        if status or prioridade or categoria_id or parametros.get('q', '').strip() or incluir_arquivadas:
+            return None, 'desde não pode ser combinado com filtros, busca ou incluir_arquivadas'
+        return montar_sincronizacao(desde, parametros.get('limite'), campos, colunas, conversores)
+    
+    filtros = {}
+    if status:
+        try:
+            filtros['status'] = StatusTarefa(status)
+        except ValueError:
+            return None, f'Status inválido: {status}'
+    
+    if prioridade:
+        try:
+            filtros['prioridade'] = PrioridadeTarefa(prioridade)
+        except ValueError:
+            return None, f'Prioridade inválida: {prioridade}'
+    
+    if categoria_id:
+        filtros['categoria_id'] = categoria_id
+    
+    texto = parametros.get('q', '').strip()
+    consulta, ordem, relevancia = selecionar_tarefas(Tarefa, colunas, filtros, texto)
+    ramos = [(consulta, ordem)]
+    if incluir_arquivadas:
+        consulta, ordem, _ = selecionar_tarefas(TarefaArquivada, colunas_rapidas(campos, TarefaArquivada)[0],
+                                                filtros, texto)
+        if relevancia is not None:
+            # A busca nas arquivadas é por LIKE, sem relevância: elas vêm depois das ativas
+            ordem = (db.literal(0.0), TarefaArquivada.id)
+        ramos.append((consulta, ordem))
+    tipos_cursor = (float, int) if relevancia is not None else (datetime.fromisoformat, int)
+    
+    # Sem limite nem cursor: mantém a resposta antiga (lista completa)
+    limite = parametros.get('limite')
+    cursor = parametros.get('cursor')
+    if limite is None and cursor is None:
+        # Listagem completa em fluxo: memória constante não importa o tamanho do resultado
+        if quer_ndjson(parametros, accept):
+            modo = 'ndjson'
+        elif parametros.get('stream', '').lower() == 'true':
+            modo = 'fluxo'
+        else:
+            modo = 'lista'
+        return ListagemTarefas(juntar_ramos(ramos), campos, conversores, modo, None), None
+    
+    # Paginação por cursor (keyset): o custo de cada página não depende da profundidade
+    limite, erro = ler_limite(limite)
+    if erro:
+        return None, erro
+    
+    if cursor:
+        try:
+            chave = decodificar_cursor(cursor, *tipos_cursor)
+        except ValueError as e:
+            return None, str(e)
+        ramos = [(consulta.filter(db.tuple_(*ordem) > db.tuple_(*chave)), ordem) for consulta, ordem in ramos]
+    
+    # Busca um registro a mais para saber se existe próxima página; as duas últimas
+    # colunas de cada linha são a chave de ordenação usada no cursor
+    consulta = juntar_ramos(ramos, com_chave=True).limit(limite + 1)
+    return ListagemTarefas(consulta, campos, conversores, 'pagina', limite), None
+
+def selecionar_tarefas(modelo, colunas, filtros, texto):
+    """SELECT de GET /tarefas numa tabela (Tarefa ou TarefaArquivada); retorna (consulta, ordem, relevancia)
+
+    A ordem é estável, para que as páginas não se sobreponham (busca: mais relevantes antes).
+    """
+    consulta = db.select(*colunas).select_from(modelo)
+    consulta = consulta.filter(*[getattr(modelo, campo) == valor for campo, valor in filtros.items()])
+    
+    # Busca textual em titulo e descricao
+    relevancia = None
+    if texto:
+        consulta, relevancia = filtrar_busca(consulta, texto, modelo)
+    
+    if relevancia is not None:
+        return consulta, (relevancia, modelo.id), relevancia
+    return consulta, (modelo.data_criacao, modelo.id), None
+
+def juntar_ramos(ramos, com_chave=False):
+    """Consulta final a partir de [(consulta, ordem)]: ordenada e, com_chave, com a ordem no fim
+
+    Com as arquivadas, as duas tabelas são intercaladas num UNION ALL ordenado, lido pelos
+    índices de cada uma (sem ordenar em memória).
+    """
+    if len(ramos) == 1:
+        consulta, ordem = ramos[0]
+        consulta = consulta.order_by(*ordem)
+        return consulta.add_columns(*ordem) if com_chave else consulta
+    consulta = db.union_all(*[
+        consulta.add_columns(*[coluna.label(f'ordem_{indice}') for indice, coluna in enumerate(ordem)])
+        for consulta, ordem in ramos
+    ])
+    return consulta.order_by(db.literal_column('ordem_0'), db.literal_column('ordem_1'))
+
+def ler_limite(bruto):
+    """Lê ?limite= (padrão LIMITE_PADRAO); retorna (limite, erro)"""
+    try:
+        limite = int(bruto) if bruto is not None else LIMITE_PADRAO
+    except ValueError:
+        return None, f'Limite inválido: {bruto}'
+    if limite < 1 or limite > LIMITE_MAXIMO:
+        return None, f'Limite deve estar entre 1 e {LIMITE_MAXIMO}'
+    return limite, None
+
+def ler_desde(desde):
+    """?desde=: data ISO (UTC se sem fuso) ou o proximo_desde de uma resposta anterior
+
+    Retorna ((data, id), completo): a chave a partir da qual as alterações são devolvidas e
+    se é uma sincronização completa. O proximo_desde carrega essa marca entre as páginas;
+    uma data mais antiga que a retenção das remoções começa uma. ValueError se inválido.
+    """
+    try:
+        data = datetime.fromisoformat(desde)
+    except ValueError:
+        data, id, completo = decodificar_cursor(desde, datetime.fromisoformat, int, int)
+        return (data, id), bool(completo)
+    if data.tzinfo is not None:
+        data = data.astimezone(timezone.utc).replace(tzinfo=None)
+    return (data, 0), data < datetime.utcnow() - timedelta(days=RETENCAO_REMOCOES_DIAS)
+
+def montar_sincronizacao(desde, limite, campos, colunas, conversores):
+    """SELECT de ?desde=: tarefas alteradas e removidas depois da chave, em ordem de alteração
+
+    As duas tabelas são lidas pelos índices (data, id) e intercaladas num UNION ALL, então
+    o custo acompanha o número de alterações, não o tamanho da tabela. Um desde mais antigo
+    que a retenção das remoções vira sincronização completa: todas as tarefas, sem remoções,
+    e o cliente descarta o que não receber.
+    """
+    try:
+        chave, completo = ler_desde(desde)
+    except ValueError:
+        return None, f'desde inválido: {desde}'
+    limite, erro = ler_limite(limite)
+    if erro:
+        return None, erro
+    
+    # As três últimas colunas: data e id da alteração (o próximo desde) e se foi remoção
+    consulta = db.select(
+        *colunas, Tarefa.data_atualizacao.label('data_alteracao'), Tarefa.id.label('id_alteracao'),
+        db.literal(False).label('removida')
+    ).filter(db.tuple_(Tarefa.data_atualizacao, Tarefa.id) > db.tuple_(*chave))
+    if not completo:
+        consulta = db.union_all(consulta, db.select(
+            *[db.null() for _ in colunas], TarefaRemovida.data_remocao, TarefaRemovida.id, db.literal(True)
+        ).filter(db.tuple_(TarefaRemovida.data_remocao, TarefaRemovida.id) > db.tuple_(*chave)))
+    consulta = consulta.order_by(db.literal_column('data_alteracao'), db.literal_column('id_alteracao'))
+    consulta = consulta.limit(limite + 1)
+    return ListagemTarefas(consulta, campos, conversores, 'sincronizacao', limite, (chave, completo)), None
+
+def sincronizacao_de_tarefas(linhas, listagem):
+    """Corpo da resposta de ?desde= a partir das linhas da consulta (limite + 1)
+
+    Remoções e tarefas podem trazer o mesmo id (reaproveitado): o cliente aplica as
+    remoções antes das tarefas.
+    """
+    chave, completo = listagem.desde
+    mais = len(linhas) > listagem.limite
+    linhas = linhas[:listagem.limite]
+    
+    # Uma escrita com data anterior pode ainda não estar confirmada: o próximo desde não
+    # passa de agora - margem (as alterações recentes podem vir de novo), desde que avance
+    seguro = (datetime.utcnow() - timedelta(seconds=SINCRONIZACAO_MARGEM), 0)
+    proximo = tuple(linhas[-1][-3:-1]) if mais else seguro
+    if proximo > seguro and seguro > chave:
+        proximo = seguro
+    proximo = max(proximo, chave)
+    
+    total = len(listagem.campos)
+    return {
+        'tarefas': list(linhas_para_dicts(
+            (linha[:total] for linha in linhas if not linha[-1]), listagem.campos, listagem.conversores
+        )),
+        'removidas': [linha[-2] for linha in linhas if linha[-1]],
+        'completo': completo,
+        'limite': listagem.limite,
+        'mais': mais,
+        # A sincronização completa continua nas próximas páginas; depois vira incremental
+        'proximo_desde': codificar_cursor(*proximo, int(completo and mais))
+    }
+
+def pagina_de_tarefas(linhas, listagem):
+    """Corpo da resposta paginada a partir das linhas da consulta (limite + 1)"""
+    proximo_cursor = None
+    if len(linhas) > listagem.limite:
+        linhas = linhas[:listagem.limite]
+        proximo_cursor = codificar_cursor(*linhas[-1][-2:])
+    
+    return {
+        'tarefas': list(linhas_para_dicts(linhas, listagem.campos, listagem.conversores)),
+        'limite': listagem.limite,
+        'proximo_cursor': proximo_cursor
+    }
+
+def responder_em_fluxo(listagem):
+    """Codifica tarefa por tarefa numa resposta chunked, sem montar a lista em memória"""
+    def tarefas():
+        linhas = db.session.execute(listagem.consulta.execution_options(yield_per=TAMANHO_LOTE_FLUXO))
+        return linhas_para_dicts(linhas, listagem.campos, listagem.conversores)
+
+    def gerar_json():
+        yield b'['
+        primeira = True
+        for tarefa in tarefas():
+            yield (b'' if primeira else b',') + codificar_json(tarefa)
+            primeira = False
+        yield b']\n'
+
+    def gerar_ndjson():
+        for tarefa in tarefas():
+            yield codificar_json(tarefa) + b'\n'
+
+    if listagem.modo == 'ndjson':
+        return Response(stream_with_context(gerar_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(gerar_json()), mimetype='application/json')
+
+# ===== IDEMPOTÊNCIA =====
+
+# Um POST repetido com o mesmo Idempotency-Key (retentativa do cliente ou do gateway) recebe
+# a resposta guardada na primeira vez, sem gravar de novo. A chave é gravada na transação
+# da escrita: ou as duas existem, ou nenhuma. Duas requisições simultâneas com a mesma chave
+# disputam a chave primária; a que perde repete a resposta da que gravou.
+
+def impressao_da_requisicao(dados):
+    """SHA-256 do corpo JSON (chaves ordenadas): a mesma chave com outro corpo é recusada"""
+    return hashlib.sha256(json.dumps(dados, sort_keys=True, default=str).encode()).hexdigest()
+
+def buscar_resposta_guardada(sessao, rota, chave, impressao):
+    """(corpo, status, cabeçalhos) guardados para a chave, 422 se o corpo mudou, ou None"""
+    limite = datetime.utcnow() - timedelta(hours=IDEMPOTENCIA_TTL_HORAS)
+    guardada = sessao.execute(
+        db.select(ChaveIdempotencia.impressao, ChaveIdempotencia.status, ChaveIdempotencia.resposta).where(
+            ChaveIdempotencia.rota == rota, ChaveIdempotencia.chave == chave,
+            ChaveIdempotencia.data_criacao >= limite
+        )
+    ).first()
+    if guardada is None:
+        return None
+    if guardada.impressao != impressao:
+        return {'erro': 'Idempotency-Key já usada com outro corpo de requisição'}, 422, {}
+    return json.loads(guardada.resposta), guardada.status, {'Idempotent-Replayed': 'true'}
+
+def guardar_resposta(sessao, idempotencia, corpo, status):
+    """Grava a resposta antes do commit da escrita e apaga as chaves vencidas (pelo índice)"""
+    if idempotencia is None:
+        return
+    rota, chave, impressao = idempotencia
+    tabela = ChaveIdempotencia.__table__
+    agora = datetime.utcnow()
+    sessao.execute(tabela.delete().where(tabela.c.data_criacao < agora - timedelta(hours=IDEMPOTENCIA_TTL_HORAS)))
+    sessao.execute(tabela.insert().values(
+        rota=rota, chave=chave, impressao=impressao, status=status,
+        resposta=codificar_json(corpo).decode(), data_criacao=agora
+    ))
+
+def executar_idempotente(sessao, rota, chave, dados, operacao):
+    """Roda operacao(sessao, dados, idempotencia) uma vez por Idempotency-Key
+
+    Sem chave, roda sempre. Retorna (corpo, status, cabeçalhos); a resposta repetida leva
+    Idempotent-Replayed: true. Só respostas de sucesso são guardadas: um erro não gravou
+    nada, e a retentativa roda de novo.
+    """
+    if chave is None:
+        return (*operacao(sessao, dados), {})
+    if not 0 < len(chave) <= IDEMPOTENCIA_CHAVE_MAXIMA:
+        return {'erro': f'Idempotency-Key deve ter de 1 a {IDEMPOTENCIA_CHAVE_MAXIMA} caracteres'}, 400, {}
+    impressao = impressao_da_requisicao(dados)
+    guardada = buscar_resposta_guardada(sessao, rota, chave, impressao)
+    if guardada is not None:
+        return guardada
+    corpo, status = operacao(sessao, dados, (rota, chave, impressao))
+    # Conflito ou erro no commit: talvez outra requisição com a mesma chave tenha gravado antes
+    if status >= 409:
+        guardada = buscar_resposta_guardada(sessao, rota, chave, impressao)
+        if guardada is not None:
+            return guardada
+    return corpo, status, {}
+
+# ===== OPERAÇÕES =====
+
+# Regras de cada rota, sem depender do framework: recebem a sessão e os dados já lidos da
+# requisição e retornam o corpo (e o status, nas escritas); 404 sai como abort(). Servem às
+# rotas Flask abaixo e ao modo ASGI (asgi.py), que as roda sobre o engine assíncrono.
+
+def versao_no_cache(versoes, por_item=False):
+    """Parte da chave do cache com a versão que o @condicional leu; None se não há versão
+
+    O cache é do processo, mas o ETag vem da versão no banco: com a versão na chave, um
+    corpo guardado antes de uma escrita feita em outro worker nunca sai com o ETag novo.
+    Quem guarda leu a versão antes do corpo, então o corpo é no mínimo dessa versão (se
+    for mais novo, um If-Match com esse ETag dá 412, nunca sobrescreve o que não foi visto).
+    Com por_item, vale a versão do item quando ele existe: escritas em outras linhas não
+    tiram o corpo do cache. Senão (listas, totais, tarefa arquivada), a versão global.
+    """
+    if versoes is None:
+        return None
+    if por_item and len(versoes) > 1 and versoes[1] is not None:
+        return ('item', versoes[1])
+    return ('dados', versoes[0])
+
+def carregar_tarefa(sessao, id, campos=None, incluir_arquivadas=False, versoes=None):
+    """Representação de uma tarefa, via cache de leitura (com versoes); arquivadas só se pedidas"""
+    def carregar():
+        tarefa = projetar(sessao.query(Tarefa), Tarefa, campos).filter(Tarefa.id == id).first()
+        if tarefa is None and incluir_arquivadas:
+            tarefa = projetar(sessao.query(TarefaArquivada), TarefaArquivada, campos).filter(
+                TarefaArquivada.id == id
+            ).first()
+        if tarefa is None:
+            abort(404)
+        return tarefa.to_dict(campos)
+    versao = versao_no_cache(versoes, por_item=True)
+    if versao is None:
+        return carregar()
+    return servico('cache_leitura').obter(('tarefa', id, campos, incluir_arquivadas, versao), carregar)
+
+def inserir_tarefa(sessao, dados, idempotencia=None):
+    if not dados or 'titulo' not in dados:
+        return {'erro': 'Título é obrigatório'}, 400
+    
+    valores, erro = validar_dados_tarefa(dados)
+    if not erro:
+        erro = validar_categoria(sessao, valores.get('categoria_id'))
+    if erro:
+        return {'erro': erro}, 400
+    
+    tarefa = Tarefa(**valores)
+    
+    try:
+        sessao.add(tarefa)
+        sessao.flush()
+        corpo = tarefa.to_dict()
+        guardar_resposta(sessao, idempotencia, corpo, 201)
+        sessao.commit()
+        invalidar_cache_tarefas(tarefa.id)
+        return corpo, 201
+    except Exception:
+        sessao.rollback()
+        app.logger.exception('Erro ao criar tarefa')
+        return {'erro': 'Erro ao criar tarefa'}, 500
+
+def alterar_tarefa(sessao, id, dados, versoes=None):
+    """Altera só os campos enviados (PUT e PATCH) num UPDATE condicional, sem SELECT antes
+
+    versoes vem do If-Match (ler_if_match): a linha só muda se ainda estiver numa delas.
+    O RETURNING traz a tarefa já alterada. Quando status ou prioridade mudam, os contadores
+    precisam da combinação antiga: um primeiro UPDATE, que só incrementa a versão, faz a
+    condição, trava a linha e devolve essa combinação.
+    """
+    if not dados:
+        exigir_existencia(sessao, Tarefa, id)
+        return {'erro': 'Dados não fornecidos'}, 400
+    
+    valores, erro = validar_dados_tarefa(dados, parcial=True)
+    if not erro:
+        erro = validar_categoria(sessao, valores.get('categoria_id'))
+    if erro:
+        exigir_existencia(sessao, Tarefa, id)
+        return {'erro': erro}, 400
+    
+    tabela = Tarefa.__table__
+    agora = datetime.utcnow()
+    condicoes = condicoes_de_escrita(tabela, id, versoes)
+    valores.update(versao=tabela.c.versao + 1, data_atualizacao=agora)
+    # Se marcou como concluída, adicionar data de conclusão (a primeira fica)
+    if valores.get('status') == StatusTarefa.CONCLUIDA:
+        valores['data_conclusao'] = func.coalesce(tabela.c.data_conclusao, agora)
+    
+    try:
+        conexao = sessao.connection()
+        muda_contadores = 'status' in valores or 'prioridade' in valores
+        antiga = linha = None
+        if muda_contadores:
+            antiga = conexao.execute(
+                tabela.update().where(*condicoes).values(versao=tabela.c.versao + 1)
+                .returning(tabela.c.status, tabela.c.prioridade)
+            ).first()
+            # A linha já está travada e com a versão nova: o segundo UPDATE vai só pelo id
+            condicoes = [tabela.c.id == id]
+            del valores['versao']
+        if antiga is not None or not muda_contadores:
+            linha = conexao.execute(
+                tabela.update().where(*condicoes).values(valores).returning(*tabela.c)
+            ).mappings().first()
+        if linha is not None:
+            if antiga is not None:
+                deltas = Counter()
+                deltas[(antiga.status, antiga.prioridade)] -= 1
+                deltas[(linha['status'], linha['prioridade'])] += 1
+                ajustar_contadores(conexao, deltas)
+            registrar_eventos(conexao, [('tarefa', 'atualizada', id)])
+            incrementar_versao_dados(conexao)
+            sessao.commit()
+            invalidar_cache_tarefas(id)
+            return {campo: formatar_valor(linha[campo]) for campo in Tarefa.CAMPOS}, 200
+        sessao.rollback()
+    except Exception:
+        sessao.rollback()
+        app.logger.exception('Erro ao atualizar tarefa')
+        return {'erro': 'Erro ao atualizar tarefa'}, 500
+    return recusar_escrita(sessao, Tarefa, id)
+
+def excluir_tarefa(sessao, id, versoes=None):
+    """Remove a tarefa num DELETE condicional (If-Match); o RETURNING traz o que os contadores pedem"""
+    tabela = Tarefa.__table__
+    try:
+        conexao = sessao.connection()
+        removida = conexao.execute(
+            tabela.delete().where(*condicoes_de_escrita(tabela, id, versoes))
+            .returning(tabela.c.status, tabela.c.prioridade)
+        ).first()
+        if removida is not None:
+            ajustar_contadores(conexao, {(removida.status, removida.prioridade): -1})
+            registrar_remocoes(conexao, [id])
+            registrar_eventos(conexao, [('tarefa', 'removida', id)])
+            incrementar_versao_dados(conexao)
+            sessao.commit()
+            invalidar_cache_tarefas(id)
+            return {'message': 'Tarefa deletada com sucesso'}, 200
+        sessao.rollback()
+    except Exception:
+        sessao.rollback()
+        app.logger.exception('Erro ao deletar tarefa')
+        return {'erro': 'Erro ao deletar tarefa'}, 500
+    return recusar_escrita(sessao, Tarefa, id)
+
+def processar_lote(sessao, dados):
+    """Cria, atualiza e remove várias tarefas numa única transação; retorna (corpo, status)
+
+    Corpo: {"atomico": true, "operacoes": [
+        {"operacao": "criar", "dados": {...}},
+        {"operacao": "atualizar", "id": 1, "dados": {...}},
+        {"operacao": "deletar", "id": 2}
+    ]}
+    Com atomico=true (padrão) qualquer erro cancela o lote inteiro; com false as
+    operações válidas são gravadas e as inválidas aparecem com erro nos resultados.
+    """
+    if not isinstance(dados, dict) or not isinstance(dados.get('operacoes'), list):
+        return {'erro': 'Lista de operações é obrigatória'}, 400
+    
+    operacoes = dados['operacoes']
+    atomico = dados.get('atomico', True)
+    if not isinstance(atomico, bool):
+        return {'erro': 'atomico deve ser true ou false'}, 400
+    if len(operacoes) > LOTE_MAXIMO:
+        return {'erro': f'Máximo de {LOTE_MAXIMO} operações por lote'}, 400
+    
+    resultados = [{'indice': indice} for indice in range(len(operacoes))]
+    criacoes, atualizacoes, remocoes = [], [], []
+    ids_no_lote = set()
+    
+    # 1) Validação de cada operação, sem tocar no banco
+    for indice, operacao in enumerate(operacoes):
+        resultado = resultados[indice]
+        tipo = operacao.get('operacao') if isinstance(operacao, dict) else None
+        resultado['operacao'] = tipo
+        
+        if tipo not in ('criar', 'atualizar', 'deletar'):
+            resultado.update(status=400, erro=f'Operação inválida: {tipo}')
+            continue
+        
+        if tipo in ('atualizar', 'deletar'):
+            id = operacao.get('id')
+            # bool é subclasse de int: "id": true não pode virar a tarefa 1
+            if not isinstance(id, int) or isinstance(id, bool):
+                resultado.update(status=400, erro='ID da tarefa é obrigatório')
+                continue
+            if id in ids_no_lote:
+                resultado.update(status=400, erro=f'Tarefa {id} repetida no lote')
+                continue
+            ids_no_lote.add(id)
+            resultado['id'] = id
+        
+        if tipo == 'deletar':
+            remocoes.append((indice, id))
+            continue
+        
+        campos = operacao.get('dados')
+        if not campos or not isinstance(campos, dict):
+            resultado.update(status=400, erro='Dados não fornecidos')
+            continue
+        valores, erro = validar_dados_tarefa(campos, parcial=(tipo == 'atualizar'))
+        if erro:
+            resultado.update(status=400, erro=erro)
+            continue
+        
+        if tipo == 'criar':
+            criacoes.append((indice, valores))
+        else:
+            atualizacoes.append((indice, id, valores))
+    
+    # 2) Estado atual das tarefas afetadas, numa única consulta
+    existentes = {}
+    if ids_no_lote:
+        existentes = {
+            linha.id: linha for linha in sessao.query(
+                Tarefa.id, Tarefa.status, Tarefa.prioridade, Tarefa.data_conclusao
+            ).filter(Tarefa.id.in_(ids_no_lote))
+        }
+    for indice, id, *_ in atualizacoes + remocoes:
+        if id not in existentes:
+            resultados[indice].update(status=404, erro=f'Tarefa {id} não encontrada')
+    atualizacoes = [item for item in atualizacoes if item[1] in existentes]
+    remocoes = [item for item in remocoes if item[1] in existentes]
+    
+    # Categorias referenciadas precisam existir (chave estrangeira), também numa única consulta
+    gravacoes = [(indice, valores) for indice, valores in criacoes] + \
+        [(indice, valores) for indice, _, valores in atualizacoes]
+    ids_categorias = {valores['categoria_id'] for _, valores in gravacoes if valores.get('categoria_id') is not None}
+    if ids_categorias:
+        categorias_existentes = {id for (id,) in sessao.query(Categoria.id).filter(
+            Categoria.id.in_(ids_categorias)
+        )}
+        invalidos = set()
+        for indice, valores in gravacoes:
+            categoria_id = valores.get('categoria_id')
+            if categoria_id is not None and categoria_id not in categorias_existentes:
+                resultados[indice].update(status=400, erro=f'Categoria {categoria_id} não encontrada')
+                invalidos.add(indice)
+        criacoes = [item for item in criacoes if item[0] not in invalidos]
+        atualizacoes = [item for item in atualizacoes if item[0] not in invalidos]
+    
+    if atomico and any('erro' in resultado for resultado in resultados):
+        return {
+            'atomico': True,
+            'sucesso': 0,
+            'falhas': sum(1 for resultado in resultados if 'erro' in resultado),
+            'resultados': resultados
+        }, 400
+    
+    # 3) Gravação em massa numa única transação
+    agora = datetime.utcnow()
+    deltas = Counter()
+    colunas = ('titulo', 'descricao', 'status', 'prioridade', 'data_vencimento',
+               'responsavel', 'categoria_id')
+    
+    try:
+        if criacoes:
+            linhas = []
+            for _, valores in criacoes:
+                linha = {coluna: valores.get(coluna) for coluna in colunas}
+                linha['data_criacao'] = linha['data_atualizacao'] = agora
+                linhas.append(linha)
+                deltas[(linha['status'], linha['prioridade'])] += 1
+            ids_criados = sessao.scalars(
+                insert(Tarefa).returning(Tarefa.id, sort_by_parameter_order=True), linhas
+            ).all()
+            for (indice, _), id in zip(criacoes, ids_criados):
+                resultados[indice].update(id=id, status=201)
+        
+        if atualizacoes:
+            linhas = []
+            for indice, id, valores in atualizacoes:
+                atual = existentes[id]
+                linha = dict(valores, id=id, data_atualizacao=agora)
+                # Se marcou como concluída, adicionar data de conclusão
+                if linha.get('status') == StatusTarefa.CONCLUIDA and not atual.data_conclusao:
+                    linha['data_conclusao'] = agora
+                linhas.append(linha)
+                deltas[(atual.status, atual.prioridade)] -= 1
+                deltas[(linha.get('status', atual.status), linha.get('prioridade', atual.prioridade))] += 1
+                resultados[indice]['status'] = 200
+            sessao.execute(update(Tarefa), linhas)
+            # Cada linha do UPDATE em massa tem as suas colunas: as versões sobem num comando só
+            sessao.execute(
+                update(Tarefa).where(Tarefa.id.in_([id for _, id, _ in atualizacoes]))
+                .values(versao=Tarefa.versao + 1),
+                execution_options={'synchronize_session': False}
+            )
+        
+        if remocoes:
+            ids_removidos = [id for _, id in remocoes]
+            for indice, id in remocoes:
+                atual = existentes[id]
+                deltas[(atual.status, atual.prioridade)] -= 1
+                resultados[indice]['status'] = 200
+            sessao.execute(
+                delete(Tarefa).where(Tarefa.id.in_(ids_removidos)),
+                execution_options={'synchronize_session': False}
+            )
+            registrar_remocoes(sessao.connection(), ids_removidos, agora)
+        
+        # Inserções e alterações em massa não disparam os eventos do modelo
+        ajustar_contadores(sessao.connection(), deltas)
+        incrementar_versao_dados(sessao.connection())
+        eventos = [('tarefa', 'criada', resultados[indice]['id']) for indice, _ in criacoes] + \
+            [('tarefa', 'atualizada', id) for _, id, _ in atualizacoes] + \
+            [('tarefa', 'removida', id) for _, id in remocoes]
+        if eventos:
+            registrar_eventos(sessao.connection(), eventos)
+        sessao.commit()
+        invalidar_cache_tarefas(*ids_no_lote)
+    except Exception:
+        sessao.rollback()
+        app.logger.exception('Erro ao processar lote de tarefas')
+        return {'erro': 'Erro ao processar lote de tarefas'}, 500
+    
+    falhas = sum(1 for resultado in resultados if 'erro' in resultado)
+    return {
+        'atomico': atomico,
+        'sucesso': len(resultados) - falhas,
+        'falhas': falhas,
+        'resultados': resultados
+    }, 200
+
+def carregar_categorias(sessao, campos=None, versoes=None):
+    """Lista de categorias, via cache de leitura (com versoes)"""
+    def carregar():
+        # A contagem de tarefas só entra na consulta quando foi pedida
+        if campos is None or 'total_tarefas' in campos:
+            query = consultar_categorias_com_total(sessao)
+        else:
+            query = sessao.query(Categoria, db.null())
+        resultados = projetar(query, Categoria, campos).order_by(Categoria.id).all()
+        return [categoria.to_dict(total, campos) for categoria, total in resultados]
+    versao = versao_no_cache(versoes)
+    if versao is None:
+        return carregar()
+    return servico('cache_leitura').obter(('categorias', campos, versao), carregar)
+
+def carregar_categoria(sessao, id, versoes=None):
+    """Representação de uma categoria, via cache de leitura (com versoes)
+
+    O total_tarefas muda com escritas em tarefas: a chave leva a versão global dos dados.
+    """
+    def carregar():
+        resultado = consultar_categorias_com_total(sessao).filter(Categoria.id == id).first()
+        if resultado is None:
+            abort(404)
+        categoria, total = resultado
+        return categoria.to_dict(total)
+    versao = versao_no_cache(versoes)
+    if versao is None:
+        return carregar()
+    return servico('cache_leitura').obter(('categoria', id, versao), carregar)
+
+def inserir_categoria(sessao, dados, idempotencia=None):
+    if not dados or 'nome' not in dados:
+        return {'erro': 'Nome é obrigatório'}, 400
+    
+    categoria = Categoria(
+        nome=dados['nome'],
+        descricao=dados.get('descricao'),
+        cor=dados.get('cor')
+    )
+    
+    try:
+        sessao.add(categoria)
+        sessao.flush()
+        corpo = categoria.to_dict(total_tarefas=0)
+        guardar_resposta(sessao, idempotencia, corpo, 201)
+        sessao.commit()
+        invalidar_cache_categoria(categoria.id)
+        return corpo, 201
+    except IntegrityError:
+        # nome é único: a constraint responde sem uma consulta a mais antes de cada criação
+        sessao.rollback()
+        return {'erro': f"Já existe uma categoria com o nome '{dados['nome']}'"}, 409
+    except Exception:
+        sessao.rollback()
+        app.logger.exception('Erro ao criar categoria')
+        return {'erro': 'Erro ao criar categoria'}, 500
+
+def alterar_categoria(sessao, id, dados, versoes=None):
+    """Altera só os campos enviados (PUT e PATCH) num UPDATE condicional (If-Match), sem SELECT antes"""
+    if not dados:
+        exigir_existencia(sessao, Categoria, id)
+        return {'erro': 'Dados não fornecidos'}, 400
+    
+    tabela = Categoria.__table__
+    valores = {campo: dados[campo] for campo in ('nome', 'descricao', 'cor') if campo in dados}
+    valores['versao'] = tabela.c.versao + 1
+    
+    try:
+        conexao = sessao.connection()
+        linha = conexao.execute(
+            tabela.update().where(*condicoes_de_escrita(tabela, id, versoes)).values(valores)
+            .returning(*tabela.c)
+        ).mappings().first()
+        if linha is not None:
+            registrar_eventos(conexao, [('categoria', 'atualizada', id)])
+            incrementar_versao_dados(conexao)
+            sessao.commit()
+            invalidar_cache_categoria(id)
+            total = sessao.scalar(db.select(total_de_tarefas(id)))
+            corpo = {campo: formatar_valor(linha[campo]) for campo in Categoria.CAMPOS[:-1]}
+            return dict(corpo, total_tarefas=total), 200
+        sessao.rollback()
+    except IntegrityError:
+        sessao.rollback()
+        return {'erro': f"Já existe uma categoria com o nome '{dados['nome']}'"}, 409
+    except Exception:
+        sessao.rollback()
+        app.logger.exception('Erro ao atualizar categoria')
+        return {'erro': 'Erro ao atualizar categoria'}, 500
+    return recusar_escrita(sessao, Categoria, id)
+
+def excluir_categoria(sessao, id, versoes=None):
+    # Verificar se há tarefas associadas, ativas ou arquivadas (EXISTS para não carregar as tarefas);
+    # a chave estrangeira garante que uma categoria inexistente não tem nenhuma
+    tarefas_da_categoria = sessao.query(Tarefa).filter(Tarefa.categoria_id == id)
+    arquivadas_da_categoria = sessao.query(TarefaArquivada).filter(TarefaArquivada.categoria_id == id)
+    if sessao.query(db.or_(tarefas_da_categoria.exists(), arquivadas_da_categoria.exists())).scalar():
+        return {
+            'erro': 'Não é possível deletar categoria com tarefas associadas',
+            'tarefas_associadas': tarefas_da_categoria.count() + arquivadas_da_categoria.count()
+        }, 400
+    
+    tabela = Categoria.__table__
+    try:
+        conexao = sessao.connection()
+        removida = conexao.execute(
+            tabela.delete().where(*condicoes_de_escrita(tabela, id, versoes)).returning(tabela.c.id)
+        ).first()
+        if removida is not None:
+            registrar_eventos(conexao, [('categoria', 'removida', id)])
+            incrementar_versao_dados(conexao)
+            sessao.commit()
+            invalidar_cache_categoria(id)
+            return {'message': 'Categoria deletada com sucesso'}, 200
+        sessao.rollback()
+    except Exception:
+        sessao.rollback()
+        app.logger.exception('Erro ao deletar categoria')
+        return {'erro': 'Erro ao deletar categoria'}, 500
+    return recusar_escrita(sessao, Categoria, id)
+
+def montar_estatisticas(sessao, versoes=None):
+    # Os contadores são mantidos na mesma transação das escritas: 16 linhas, custo O(1)
+    stats_status = {status.value: 0 for status in StatusTarefa}
+    stats_prioridade = {prioridade.value: 0 for prioridade in PrioridadeTarefa}
+    for contador in sessao.query(ContadorTarefa):
+        stats_status[contador.status.value] += contador.total
+        stats_prioridade[contador.prioridade.value] += contador.total
+    total_tarefas = sum(stats_status.values())
+    
+    # Tarefas vencidas
+    tarefas_vencidas = contar_tarefas_vencidas(sessao, versao_no_cache(versoes))
+    
+    # Total de categorias
+    total_categorias = sessao.query(func.count(Categoria.id)).scalar()
+    
+    return {
+        'total_tarefas': total_tarefas,
+        'total_categorias': total_categorias,
+        'tarefas_vencidas': tarefas_vencidas,
+        'por_status': stats_status,
+        'por_prioridade': stats_prioridade
+    }
+
+def verificar_saude(sessao):
+    """Ida e volta ao banco (SELECT 1) com o tempo medido; 503 se o banco não responde"""
+    inicio = time.perf_counter()
+    try:
+        sessao.execute(db.text('SELECT 1'))
+    except SQLAlchemyError:
+        sessao.rollback()
+        app.logger.exception('Banco não respondeu à verificação de saúde')
+        return {
+            'status': 'unhealthy',
+            'timestamp': datetime.utcnow().isoformat(),
+            'banco': {'status': 'erro'}
+        }, 503
+    return {
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'banco': {'status': 'ok', 'latencia_ms': round((time.perf_counter() - inicio) * 1000, 3)}
+    }, 200
+
+# ===== ROTAS DA API =====
+
+INDICE_API = {
+    'message': 'API Gerenciador de Tarefas',
+    'version': '1.0',
+    'endpoints': {
+        'tarefas': '/tarefas',
+        'categorias': '/categorias',
+        'estatisticas': '/estatisticas',
+        'eventos': '/eventos',
+        'health': '/health',
+        'metrics': '/metrics'
+    }
+}
+
+# Content-Type do formato de exposição em texto do Prometheus
+TIPO_METRICAS = 'text/plain; version=0.0.4; charset=utf-8'
+
+def index():
+    return jsonify(INDICE_API)
+
+# ===== ROTAS DE TAREFAS =====
+
+@condicional()
+def listar_tarefas():
+    listagem, erro = montar_listagem_tarefas(request.args, request.headers.get('Accept'))
+    if erro:
+        return jsonify({'erro': erro}), 400
+    
+    if listagem.modo in ('fluxo', 'ndjson'):
+        return responder_em_fluxo(listagem)
+    linhas = db.session.execute(listagem.consulta).all()
+    if listagem.modo == 'lista':
+        return responder_json(list(linhas_para_dicts(linhas, listagem.campos, listagem.conversores)))
+    if listagem.modo == 'sincronizacao':
+        return responder_json(sincronizacao_de_tarefas(linhas, listagem))
+    return responder_json(pagina_de_tarefas(linhas, listagem))
+
+def criar_tarefa():
+    corpo, status, cabecalhos = executar_idempotente(
+        db.session, 'criar_tarefa', request.headers.get('Idempotency-Key'), request.get_json(), inserir_tarefa
+    )
+    return jsonify(corpo), status, dict(cabecalhos, **cabecalho_etag(corpo))
+
+@condicional(modelo=Tarefa)
+def obter_tarefa(id):
+    campos, erro = ler_campos(Tarefa, request.args)
+    if erro:
+        return jsonify({'erro': erro}), 400
+    incluir_arquivadas = request.args.get('incluir_arquivadas', '').lower() == 'true'
+    return jsonify(carregar_tarefa(db.session, id, campos, incluir_arquivadas, g.versoes))
+
+def atualizar_tarefa(id):
+    """PUT e PATCH: só os campos enviados mudam; com If-Match, 412 se a tarefa mudou antes"""
+    corpo, status = alterar_tarefa(db.session, id, request.get_json(), ler_if_match(request.headers.get('If-Match')))
+    return jsonify(corpo), status, cabecalho_etag(corpo)
+
+def deletar_tarefa(id):
+    corpo, status = excluir_tarefa(db.session, id, ler_if_match(request.headers.get('If-Match')))
+    return jsonify(corpo), status
+
+def processar_lote_tarefas():
+    """Cria, atualiza e remove várias tarefas numa única transação; retorna (corpo, status)
+
+    Corpo: {"atomico": true, "operacoes": [
+        {"operacao": "criar", "dados": {...}},
+        {"operacao": "atualizar", "id": 1, "dados": {...}},
+        {"operacao": "deletar", "id": 2}
+    ]}
+    Com atomico=true (padrão) qualquer erro cancela o lote inteiro; com false as
+    operações válidas são gravadas e as inválidas aparecem com erro nos resultados.
+    """
+    corpo, status = processar_lote(db.session, request.get_json())
+    return jsonify(corpo), status
+
+# ===== ROTAS DE CATEGORIAS =====
+
+@condicional()
+def listar_categorias():
+    campos, erro = ler_campos(Categoria, request.args)
+    if erro:
+        return jsonify({'erro': erro}), 400
+    return jsonify(carregar_categorias(db.session, campos, g.versoes))
+
+def criar_categoria():
+    corpo, status, cabecalhos = executar_idempotente(
+        db.session, 'criar_categoria', request.headers.get('Idempotency-Key'), request.get_json(), inserir_categoria
+    )
+    return jsonify(corpo), status, dict(cabecalhos, **cabecalho_etag(corpo))
+
+@condicional(modelo=Categoria)
+def obter_categoria(id):
+    return jsonify(carregar_categoria(db.session, id, g.versoes))
+
+def atualizar_categoria(id):
+    """PUT e PATCH: só os campos enviados mudam; com If-Match, 412 se a categoria mudou antes"""
+    corpo, status = alterar_categoria(db.session, id, request.get_json(),
+                                      ler_if_match(request.headers.get('If-Match')))
+    return jsonify(corpo), status, cabecalho_etag(corpo)
+
+def deletar_categoria(id):
+    corpo, status = excluir_categoria(db.session, id, ler_if_match(request.headers.get('If-Match')))
+    return jsonify(corpo), status
+
+# ===== ROTA DE ESTATÍSTICAS =====
+
+def obter_estatisticas_cache():
+    return jsonify(servico('cache_leitura').estatisticas())
+
+@condicional(validade=ESTATISTICAS_CACHE_TTL)
+def obter_estatisticas():
+    return jsonify(montar_estatisticas(db.session, g.versoes))
+
+# ===== ROTA DE EVENTOS =====
+
+def transmitir_eventos():
+    """Fluxo SSE de criações, alterações e remoções de tarefas e categorias"""
+    try:
+        ultimo_id = ler_ultimo_evento(request.headers, request.args)
+    except ValueError:
+        return jsonify({'erro': 'Last-Event-ID inválido'}), 400
+    
+    # O distribuidor é do app desta requisição; avisar() e o fim do fluxo rodam sem contexto
+    distribuidor = servico('eventos_sse')
+    fila = queue.SimpleQueue()
+    def avisar(eventos):
+        # Assinante lento: sai do distribuidor e o fluxo termina (o cliente reconecta e retoma)
+        if fila.qsize() > EVENTOS_FILA_MAXIMA:
+            distribuidor.cancelar(avisar)
+            eventos = None
+        fila.put(eventos)
+    
+    # O fluxo usa o engine direto: nenhuma sessão (nem conexão) fica presa à requisição
+    motor = db.engine
+    if not distribuidor.assinar(motor, avisar):
+        resposta = jsonify({'erro': 'Limite de assinantes de eventos atingido'})
+        resposta.headers['Retry-After'] = str(EVENTOS_HEARTBEAT)
+        return resposta, 503
+    
+    def gerar(ultimo_id):
+        try:
+            # Assinado antes de ler o log: o que chegar nesse meio tempo sai da fila sem repetir
+            with motor.connect() as conexao:
+                limites = conexao.execute(consulta_limites_eventos()).one()
+                pendentes = conexao.execute(consulta_eventos(ultimo_id)).all() if ultimo_id is not None else []
+            pedacos, ultimo_id = inicio_do_fluxo(ultimo_id, limites, pendentes)
+            yield b''.join(pedacos)
+            while True:
+                try:
+                    eventos = fila.get(timeout=EVENTOS_HEARTBEAT)
+                except queue.Empty:
+                    yield b': ping\n\n'
+                    continue
+                if eventos is None:
+                    return
+                novos = [evento for evento in eventos if evento.id > ultimo_id]
+                if novos:
+                    ultimo_id = novos[-1].id
+                    yield b''.join(formatar_evento(evento) for evento in novos)
+        finally:
+            distribuidor.cancelar(avisar)
+    
+    return Response(gerar(ultimo_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ===== MONITORAMENTO =====
+
+def contar_bytes(pedacos, finalizar):
+    """Repassa os pedaços de uma resposta em fluxo e informa o total enviado no fim"""
+    total = 0
+    try:
+        for pedaco in pedacos:
+            total += len(pedaco)
+            yield pedaco
+    finally:
+        finalizar(total)
+
+def iniciar_medicao():
+    iniciar_medicao_requisicao()
+
+def registrar_medicao(response):
+    medicao = medicao_atual.get()
+    if medicao is None:
+        return response
+    # Nome do endpoint, e não a URL: /tarefas/1 e /tarefas/2 são a mesma série
+    metodo, endpoint, status = request.method, request.endpoint or 'desconhecido', response.status_code
+    caminho = request.path
+
+    def finalizar(tamanho):
+        medicao_atual.set(None)
+        concluir_medicao_requisicao(metodo, endpoint, caminho, status, medicao, tamanho)
+
+    if response.content_length is None and response.is_streamed:
+        # Em fluxo, o corpo (e o SQL que o produz) só existe depois desta função
+        response.response = contar_bytes(response.response, finalizar)
+    else:
+        finalizar(response.content_length or 0)
+    return response
+
+def health_check():
+    corpo, status = verificar_saude(db.session)
+    return jsonify(corpo), status
+
+def exportar_metricas():
+    return Response(servico('metricas').exportar() + exportar_admissao(), content_type=TIPO_METRICAS)
+
+# ===== MIGRAÇÕES =====
+
+# db.create_all() só cria tabelas que não existem; mudanças em tabelas já existentes
+# (índices, colunas) entram aqui. Cada migração roda uma vez e deve ser idempotente,
+# pois em bancos novos o create_all já criou tudo.
+
+def criar_indices(conexao, tabela, *nomes):
+    """Cria os índices informados da tabela, se ainda não existirem"""
+    for indice in tabela.indexes:
+        if indice.name in nomes:
+            indice.create(conexao, checkfirst=True)
+
+def criar_versao_dados(conexao):
+    """Insere a linha única de versao_dados, se ainda não existir"""
+    if conexao.execute(db.select(VersaoDados.id)).first() is None:
+        conexao.execute(VersaoDados.__table__.insert().values(id=1, versao=0))
+
+def adicionar_data_atualizacao(conexao):
+    """Coluna data_atualizacao (preenchida com a última data conhecida) e seu índice"""
+    if 'data_atualizacao' not in {coluna['name'] for coluna in db.inspect(conexao).get_columns('tarefa')}:
+        tipo = Tarefa.__table__.c.data_atualizacao.type.compile(conexao.dialect)
+        # NOT NULL exige um padrão no ALTER TABLE; o UPDATE seguinte troca por datas reais
+        conexao.execute(db.text(
+            f"ALTER TABLE tarefa ADD COLUMN data_atualizacao {tipo} NOT NULL DEFAULT '1970-01-01 00:00:00'"
+        ))
+        tabela = Tarefa.__table__
+        conexao.execute(tabela.update().values(
+            data_atualizacao=func.coalesce(tabela.c.data_conclusao, tabela.c.data_criacao)
+        ))
+    criar_indices(conexao, Tarefa.__table__, 'ix_tarefa_data_atualizacao_id')
+
+def recriar_tarefa_com_autoincremento(conexao):
+    """Recria a tabela tarefa com AUTOINCREMENT (só SQLite), mantendo ids, índices e triggers
+
+    Sem AUTOINCREMENT o SQLite reaproveita o maior id quando a última tarefa sai da tabela,
+    e uma tarefa nova herdaria o id de uma arquivada. Servidores usam sequências, que não
+    reaproveitam ids.
+    """
+    if conexao.dialect.name != 'sqlite':
+        return
+    sql = conexao.execute(db.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'tarefa'")).scalar()
+    if 'AUTOINCREMENT' in sql.upper():
+        return
+    # Cópia da definição atual com outro nome (a categoria vai junto para resolver a chave estrangeira)
+    metadados = db.MetaData()
+    Categoria.__table__.to_metadata(metadados)
+    nova = Tarefa.__table__.to_metadata(metadados, name='tarefa_nova')
+    # Só as colunas que já existem: as de migrações seguintes ficam com o padrão
+    existentes = {coluna['name'] for coluna in db.inspect(conexao).get_columns('tarefa')}
+    colunas = ', '.join(coluna.name for coluna in Tarefa.__table__.c if coluna.name in existentes)
+    # Bancos de antes das chaves estrangeiras ligadas (PRAGMA foreign_keys) podem ter tarefas
+    # apontando para categorias que não existem; a cópia seria recusada, então ficam sem categoria
+    orfas = conexao.exec_driver_sql(
+        'UPDATE tarefa SET categoria_id = NULL WHERE categoria_id IS NOT NULL '
+        'AND categoria_id NOT IN (SELECT id FROM categoria)'
+    ).rowcount
+    if orfas:
+        print(f"⚠️  {orfas} tarefa(s) com categoria_id inexistente ficaram sem categoria")
+    conexao.execute(CreateTable(nova))
+    conexao.exec_driver_sql(f'INSERT INTO tarefa_nova ({colunas}) SELECT {colunas} FROM tarefa')
+    # DROP TABLE leva junto os índices e os triggers da busca textual, recriados em seguida
+    conexao.exec_driver_sql('DROP TABLE tarefa')
+    conexao.exec_driver_sql('ALTER TABLE tarefa_nova RENAME TO tarefa')
+    for indice in Tarefa.__table__.indexes:
+        indice.create(conexao)
+    if conexao.execute(db.text("SELECT 1 FROM sqlite_master WHERE name = 'tarefa_fts'")).first():
+        for comando in SQL_BUSCA_TEXTUAL[1:]:
+            conexao.exec_driver_sql(comando)
+
+def adicionar_versoes(conexao):
+    """Coluna versao (concorrência otimista) em tarefa, tarefa_arquivada e categoria, começando em 1"""
+    for modelo in (Tarefa, TarefaArquivada, Categoria):
+        tabela = modelo.__table__
+        if 'versao' not in {coluna['name'] for coluna in db.inspect(conexao).get_columns(tabela.name)}:
+            conexao.exec_driver_sql(f"ALTER TABLE {tabela.name} ADD COLUMN versao INTEGER NOT NULL DEFAULT 1")
+
+MIGRACOES = [
+    (1, 'Índices de listagem, estatísticas e vencimento da tabela tarefa',
+     lambda conexao: criar_indices(
+         conexao, Tarefa.__table__,
+         'ix_tarefa_data_criacao_id', 'ix_tarefa_status_data_criacao',
+         'ix_tarefa_categoria_id', 'ix_tarefa_status_prioridade',
+         'ix_tarefa_vencimento_aberta'
+     )),
+    (2, 'Linha única da versão global dos dados', criar_versao_dados),
+    (3, 'Busca textual (FTS5) em titulo e descricao', criar_busca_textual),
+    (4, 'Data de atualização das tarefas (sincronização incremental)', adicionar_data_atualizacao),
+    (5, 'Ids de tarefa nunca reaproveitados (arquivamento)', recriar_tarefa_com_autoincremento),
+    (6, 'Versão por tarefa e categoria (If-Match)', adicionar_versoes),
+]
+
+def aplicar_migracoes():
+    """Aplica, em ordem, as migrações ainda não registradas em versao_esquema"""
+    aplicadas = {versao for (versao,) in db.session.query(VersaoEsquema.versao)}
+    db.session.commit()
+    for versao, descricao, migracao in MIGRACOES:
+        if versao in aplicadas:
+            continue
+        with db.engine.begin() as conexao:
+            migracao(conexao)
+            conexao.execute(VersaoEsquema.__table__.insert().values(
+                versao=versao, descricao=descricao, data_aplicacao=datetime.utcnow()
+            ))
+        print(f"🧱 Migração {versao} aplicada: {descricao}")
+
+def inicializar_banco():
+    """Cria as tabelas, aplica as migrações e preenche os contadores (idempotente)
+
+    Roda no app context, uma vez por implantação (flask --app app migrar), e não mais na
+    importação do módulo: workers e testes sobem sem tocar no banco.
+    """
+    db.create_all()
+    aplicar_migracoes()
+    # Bancos antigos (ou recém-criados) ainda não têm os contadores preenchidos
+    if ContadorTarefa.query.count() == 0:
+        recalcular_contadores()
+
+# ===== EXPORTAÇÃO E IMPORTAÇÃO =====
+
+# Cópia lógica do banco, para backup e migração: em NDJSON, categorias e depois tarefas,
+# uma por linha, com o campo "tipo"; em CSV, um tipo por arquivo, com cabeçalho. As
+# tarefas levam categoria_id e as arquivadas também data_arquivamento (nula nas ativas).
+# A exportação lê em lotes de TAMANHO_LOTE_FLUXO dentro de uma única transação de leitura
+# (um instantâneo do banco); a importação lê o arquivo linha a linha e grava em transações
+# de IMPORTACAO_LOTE linhas, com as mesmas escritas em massa de processar_lote().
+FORMATOS_EXPORTACAO = ('ndjson', 'csv')
+CAMPOS_EXPORTACAO = {
+    'categoria': ('id', 'nome', 'descricao', 'cor', 'data_criacao', 'versao'),
+    'tarefa': Tarefa.CAMPOS + ('categoria_id', 'data_arquivamento'),
+}
+COLUNAS_IMPORTACAO = ('titulo', 'descricao', 'status', 'prioridade', 'data_vencimento',
+                      'responsavel', 'categoria_id')
+
+carregar_json = orjson.loads if orjson is not None else json.loads
+
+def consultas_exportacao(tipo):
+    """[(consulta, conversores)] que formam a exportação do tipo, cada uma em ordem de id"""
+    campos = CAMPOS_EXPORTACAO[tipo]
+    if tipo == 'categoria':
+        colunas, conversores = colunas_rapidas(campos, Categoria)
+        return [(db.select(*colunas).order_by(Categoria.id), conversores)]
+    # Ativas com data_arquivamento nula, depois as arquivadas
+    colunas, conversores = colunas_rapidas(campos[:-1], Tarefa)
+    ativas = (db.select(*colunas, db.null()).order_by(Tarefa.id), conversores + [None])
+    colunas, conversores = colunas_rapidas(campos, TarefaArquivada)
+    return [ativas, (db.select(*colunas).order_by(TarefaArquivada.id), conversores)]
+
+def exportar_dados(formato='ndjson', tipos=('categoria', 'tarefa'), contagem=None):
+    """Gera a exportação em pedaços de bytes, um por lote lido; contagem (Counter) soma as linhas por tipo
+
+    No CSV só cabe um tipo por chamada (a primeira linha é o cabeçalho).
+    """
+    with db.engine.connect() as conexao:
+        if conexao.dialect.name == 'sqlite':
+            # O pysqlite só abre transação antes de escritas: sem o BEGIN cada SELECT
+            # veria um instante diferente (uma tarefa arquivada no meio sairia duas vezes)
+            conexao.exec_driver_sql('BEGIN')
+        else:
+            conexao = conexao.execution_options(isolation_level='REPEATABLE READ')
+        for tipo in tipos:
+            campos = CAMPOS_EXPORTACAO[tipo]
+            if formato == 'csv':
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer, lineterminator='\n')
+                escritor.writerow(campos)
+            for consulta, conversores in consultas_exportacao(tipo):
+                resultado = conexao.execute(consulta.execution_options(yield_per=TAMANHO_LOTE_FLUXO))
+                for lote in resultado.partitions():
+                    registros = linhas_para_dicts(lote, campos, conversores)
+                    if formato == 'csv':
+                        # Nulos saem como células vazias
+                        escritor.writerows(registro.values() for registro in registros)
+                        yield buffer.getvalue().encode()
+                        buffer.seek(0)
+                        buffer.truncate()
+                    else:
+                        yield b''.join(codificar_json(dict(registro, tipo=tipo)) + b'\n' for registro in registros)
+                    if contagem is not None:
+                        contagem[tipo] += len(lote)
+            if formato == 'csv' and buffer.tell():
+                yield buffer.getvalue().encode()  # só o cabeçalho, se o tipo estava vazio
+
+def ler_registros(arquivo, formato, tipo):
+    """Gera (número da linha, tipo, dados, erro) lendo o arquivo aos poucos
+
+    No NDJSON linhas sem "tipo" são do tipo informado (a saída de GET /tarefas?formato=ndjson
+    é importável como está); no CSV todas são. Células vazias do CSV são nulas.
+    """
+    if formato == 'ndjson':
+        for numero, linha in enumerate(arquivo, 1):
+            if not linha.strip():
+                continue
+            try:
+                dados = carregar_json(linha)
+            except ValueError:
+                yield numero, None, None, 'JSON inválido'
+                continue
+            if not isinstance(dados, dict):
+                yield numero, None, None, 'A linha não é um objeto JSON'
+                continue
+            yield numero, dados.pop('tipo', tipo), dados, None
+        return
+
+    leitor = csv.DictReader(arquivo)
+    for dados in leitor:
+        # Colunas a mais ficam na chave None
+        dados = {campo: valor or None for campo, valor in dados.items() if campo is not None}
+        erro = None
+        for campo in ('id', 'categoria_id', 'versao'):
+            if dados.get(campo) is not None:
+                try:
+                    dados[campo] = int(dados[campo])
+                except ValueError:
+                    erro = f'{campo} inválido: {dados[campo]}'
+        yield leitor.line_num, tipo, dados, erro
+
+def ler_data_importada(dados, campo):
+    """Data ISO opcional de uma linha importada; retorna (valor, erro)"""
+    valor = dados.get(campo)
+    if not valor:
+        return None, None
+    try:
+        return datetime.fromisoformat(valor), None
+    except (TypeError, ValueError):
+        return None, f'Formato de data inválido em {campo}: {valor}'
+
+def ler_id_importado(dados, campo='id'):
+    valor = dados.get(campo)
+    if valor is None or (isinstance(valor, int) and not isinstance(valor, bool) and valor > 0):
+        return valor, None
+    return None, f'{campo} inválido: {valor}'
+
+def conferir_textos(dados, campos):
+    """Erro do primeiro campo que não é texto nem nulo (o driver recusaria o lote inteiro)"""
+    for campo in campos:
+        if dados.get(campo) is not None and not isinstance(dados[campo], str):
+            return f'{campo} inválido: {dados[campo]}'
+    return None
+
+def preparar_categoria(dados, agora):
+    """Linha da tabela categoria a partir de uma linha importada; retorna (linha, erro)"""
+    nome = dados.get('nome')
+    if not isinstance(nome, str) or not nome.strip():
+        return None, 'Nome é obrigatório'
+    id, erro = ler_id_importado(dados)
+    versao, erro_versao = ler_id_importado(dados, 'versao')
+    data_criacao, erro_data = ler_data_importada(dados, 'data_criacao')
+    erro = erro or erro_versao or erro_data or conferir_textos(dados, ('descricao', 'cor'))
+    if erro:
+        return None, erro
+    return {'id': id, 'nome': nome, 'descricao': dados.get('descricao'), 'cor': dados.get('cor'),
+            'data_criacao': data_criacao or agora, 'versao': versao or 1}, None
+
+def preparar_tarefa(dados, agora):
+    """Linha de tarefa (ou de tarefa arquivada, com data_arquivamento) a partir de uma linha importada
+
+    Status, prioridade e vencimento passam pela validação das rotas; as demais datas e a
+    versão são as do arquivo, exceto data_atualizacao: a tarefa é nova neste banco, e os clientes da
+    sincronização incremental precisam recebê-la. Retorna (linha, erro).
+    """
+    if not isinstance(dados.get('titulo'), str) or not dados['titulo'].strip():
+        return None, 'Título é obrigatório'
+    valores, erro = validar_dados_tarefa(dados)
+    erro = erro or conferir_textos(dados, ('descricao', 'responsavel'))
+    if erro:
+        return None, erro
+    linha = {coluna: valores.get(coluna) for coluna in COLUNAS_IMPORTACAO}
+    for campo in ('id', 'categoria_id', 'versao'):
+        linha[campo], erro = ler_id_importado(dados, campo)
+        if erro:
+            return None, erro
+    linha['versao'] = linha['versao'] or 1
+    for campo in ('data_criacao', 'data_conclusao', 'data_arquivamento'):
+        linha[campo], erro = ler_data_importada(dados, campo)
+        if erro:
+            return None, erro
+    linha['data_criacao'] = linha['data_criacao'] or agora
+    linha['data_atualizacao'] = agora
+    if linha['data_arquivamento'] is None:
+        del linha['data_arquivamento']
+    elif linha['id'] is None:
+        return None, 'Tarefa arquivada sem id'
+    return linha, None
+
+def ids_existentes(conexao, colunas, valores):
+    """Quais dos valores já estão em alguma das colunas (uma consulta por coluna)"""
+    if not valores:
+        return set()
+    return {valor for coluna in colunas
+            for valor in conexao.scalars(db.select(coluna).where(coluna.in_(valores)))}
+
+def descartar_repetidas(linhas, campo, existentes, mensagem, relatar_erro):
+    """Tira as linhas [(número, linha)] cujo campo já existe no banco ou apareceu antes no lote"""
+    mantidas = []
+    for numero, linha in linhas:
+        valor = linha[campo]
+        if valor is not None and valor in existentes:
+            relatar_erro(numero, mensagem.format(valor))
+            continue
+        if valor is not None:
+            existentes.add(valor)
+        mantidas.append((numero, linha))
+    return mantidas
+
+def inserir_linhas(conexao, tabela, linhas):
+    """Insere as linhas [(número, linha)] em massa e retorna [(id, linha)]; as sem id recebem um do banco"""
+    com_id = [linha for _, linha in linhas if linha['id'] is not None]
+    sem_id = [{coluna: valor for coluna, valor in linha.items() if coluna != 'id'}
+              for _, linha in linhas if linha['id'] is None]
+    inseridas = [(linha['id'], linha) for linha in com_id]
+    if com_id:
+        inserir_em_massa(conexao, tabela, com_id)
+    if sem_id:
+        ids = conexao.scalars(tabela.insert().returning(tabela.c.id, sort_by_parameter_order=True), sem_id).all()
+        inseridas += zip(ids, sem_id)
+    return inseridas
+
+def avancar_sequencia(conexao, tabela, maior_id):
+    """Garante que os ids gerados depois da importação não colidam com os importados
+
+    No SQLite só a tabela tarefa tem AUTOINCREMENT: ids explícitos em tarefa já avançam o
+    sqlite_sequence, mas os das arquivadas não, e o id de uma arquivada não pode voltar.
+    No PostgreSQL ids explícitos não avançam as sequências.
+    """
+    if conexao.dialect.name == 'sqlite' and tabela.name == 'tarefa':
+        atualizadas = conexao.exec_driver_sql(
+            "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'tarefa'", (maior_id,)
+        ).rowcount
+        if not atualizadas:
+            conexao.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('tarefa', ?)", (maior_id,))
+    elif conexao.dialect.name == 'postgresql':
+        conexao.execute(
+            db.text("SELECT setval(pg_get_serial_sequence(:tabela, 'id'), "
+                    "GREATEST(:maior, nextval(pg_get_serial_sequence(:tabela, 'id'))))"),
+            {'tabela': tabela.name, 'maior': maior_id}
+        )
+
+def gravar_lote_importado(categorias, tarefas, relatar_erro):
+    """Grava numa única transação as linhas válidas [(número, linha)] de um lote; retorna as contagens
+
+    Ids repetidos, nomes de categoria repetidos e categorias inexistentes são conferidos
+    com uma consulta por lote (dentro da transação, então as categorias do próprio lote
+    já contam) e relatados por linha; o resto do lote segue.
+    """
+    conexao = db.session.connection()
+    categoria, tarefa, arquivo = Categoria.__table__, Tarefa.__table__, TarefaArquivada.__table__
+    contagem = Counter()
+    try:
+        categorias = descartar_repetidas(
+            categorias, 'id', ids_existentes(conexao, [categoria.c.id], {linha['id'] for _, linha in categorias}),
+            'Categoria {} já existe', relatar_erro)
+        categorias = descartar_repetidas(
+            categorias, 'nome', ids_existentes(conexao, [categoria.c.nome], {linha['nome'] for _, linha in categorias}),
+            "Já existe uma categoria com o nome '{}'", relatar_erro)
+        ids_categorias = [id for id, _ in inserir_linhas(conexao, categoria, categorias)] if categorias else []
+
+        tarefas = descartar_repetidas(
+            tarefas, 'id', ids_existentes(conexao, [tarefa.c.id, arquivo.c.id], {linha['id'] for _, linha in tarefas}),
+            'Tarefa {} já existe', relatar_erro)
+        referenciadas = {linha['categoria_id'] for _, linha in tarefas if linha['categoria_id'] is not None}
+        encontradas = ids_existentes(conexao, [categoria.c.id], referenciadas)
+        for numero, linha in tarefas:
+            if linha['categoria_id'] is not None and linha['categoria_id'] not in encontradas:
+                relatar_erro(numero, f"Categoria {linha['categoria_id']} não encontrada")
+        tarefas = [(numero, linha) for numero, linha in tarefas
+                   if linha['categoria_id'] is None or linha['categoria_id'] in encontradas]
+        ativas = [item for item in tarefas if 'data_arquivamento' not in item[1]]
+        arquivadas = [item for item in tarefas if 'data_arquivamento' in item[1]]
+        ids_tarefas = []
+        if ativas:
+            with indexacao_em_massa(conexao) as indexar:
+                inseridas = inserir_linhas(conexao, tarefa, ativas)
+                indexar.extend((id, linha['titulo'], linha['descricao']) for id, linha in inseridas)
+            ids_tarefas = [id for id, _ in inseridas]
+        if arquivadas:
+            inserir_em_massa(conexao, arquivo, [linha for _, linha in arquivadas])
+
+        # Escritas em massa não disparam os eventos do modelo: contadores (que cobrem as
+        # duas tabelas), remoções antigas dos mesmos ids, sequências, log e versão à mão
+        ajustar_contadores(conexao, Counter((linha['status'], linha['prioridade']) for _, linha in tarefas))
+        explicitos = [linha['id'] for _, linha in tarefas if linha['id'] is not None]
+        if explicitos:
+            conexao.execute(delete(TarefaRemovida).where(TarefaRemovida.id.in_(explicitos)))
+            avancar_sequencia(conexao, tarefa, max(explicitos))
+        explicitos = [linha['id'] for _, linha in categorias if linha['id'] is not None]
+        if explicitos:
+            avancar_sequencia(conexao, categoria, max(explicitos))
+        eventos = [('categoria', 'criada', id) for id in ids_categorias] + \
+            [('tarefa', 'criada', id) for id in ids_tarefas]
+        if eventos:
+            registrar_eventos(conexao, eventos)
+        incrementar_versao_dados(conexao)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        # Um conflito com uma escrita concorrente desfaz só este lote
+        db.session.rollback()
+        for numero, _ in categorias + tarefas:
+            relatar_erro(numero, f'Lote não gravado: {getattr(e, "orig", e)}')
+        return contagem
+    invalidar_cache_tarefas()
+    contagem.update(categorias=len(categorias), tarefas=len(ativas), arquivadas=len(arquivadas))
+    return contagem
+
+def importar_dados(arquivo, formato='ndjson', tipo='tarefa', tamanho_lote=IMPORTACAO_LOTE, relatar_erro=None):
+    """Importa categorias e tarefas de um arquivo de texto aberto; retorna as contagens
+
+    Cada linha passa pela validação das rotas (StatusTarefa, PrioridadeTarefa, datas ISO);
+    as inválidas são relatadas a relatar_erro(número da linha, mensagem) e puladas, e as
+    demais são gravadas em transações de tamanho_lote linhas. Ids do arquivo são mantidos
+    (as referências a categorias continuam valendo); linhas sem id recebem um novo.
+    """
+    resultado = Counter()
+
+    def erro(numero, mensagem):
+        resultado['erros'] += 1
+        if relatar_erro is not None:
+            relatar_erro(numero, mensagem)
+
+    categorias, tarefas = [], []
+    agora = datetime.utcnow()
+    for numero, tipo_linha, dados, falha in ler_registros(arquivo, formato, tipo):
+        resultado['linhas'] += 1
+        if falha is None:
+            if tipo_linha == 'categoria':
+                linha, falha = preparar_categoria(dados, agora)
+                destino = categorias
+            elif tipo_linha == 'tarefa':
+                linha, falha = preparar_tarefa(dados, agora)
+                destino = tarefas
+            else:
+                falha = f'Tipo inválido: {tipo_linha}'
+        if falha is not None:
+            erro(numero, falha)
+            continue
+        destino.append((numero, linha))
+        if len(categorias) + len(tarefas) >= tamanho_lote:
+            resultado.update(gravar_lote_importado(categorias, tarefas, erro))
+            categorias, tarefas = [], []
+            agora = datetime.utcnow()
+    if categorias or tarefas:
+        resultado.update(gravar_lote_importado(categorias, tarefas, erro))
+    return {chave: resultado[chave] for chave in ('linhas', 'categorias', 'tarefas', 'arquivadas', 'erros')}
+
+# ===== COMANDOS CLI =====
+
+@click.command('migrar')
+@with_appcontext
+def comando_migrar():
+    """Cria as tabelas e aplica as migrações de esquema pendentes"""
+    inicializar_banco()
+    print("🧱 Esquema do banco atualizado!")
+
+@click.command('reconstruir-busca')
+@with_appcontext
+def comando_reconstruir_busca():
+    """Recria o índice de busca textual a partir das tarefas existentes"""
+    with db.engine.begin() as conexao:
+        criar_busca_textual(conexao)
+    print("🔍 Índice de busca textual reconstruído!")
+
+@click.command('recalcular-contadores')
+@with_appcontext
+def comando_recalcular_contadores():
+    """Reconstrói a tabela de contadores a partir das tarefas existentes"""
+    recalcular_contadores()
+    print("🔢 Contadores de tarefas recalculados!")
+
+@click.command('limpar-remocoes')
+@click.option('--dias', default=RETENCAO_REMOCOES_DIAS, show_default=True, help='retenção em dias')
+@with_appcontext
+def comando_limpar_remocoes(dias):
+    """Apaga os registros de tarefas removidas mais antigos que a retenção"""
+    total = limpar_remocoes(dias)
+    print(f"🧹 {total} registros de remoção apagados!")
+
+@click.command('arquivar-tarefas')
+@click.option('--dias', default=ARQUIVAMENTO_DIAS, show_default=True,
+              help='idade mínima (dias sem alteração) das tarefas concluídas/canceladas')
+@click.option('--lote', default=ARQUIVAMENTO_LOTE, show_default=True, help='tarefas por transação')
+@with_appcontext
+def comando_arquivar_tarefas(dias, lote):
+    """Move as tarefas concluídas e canceladas antigas para a tabela de arquivadas"""
+    total = arquivar_tarefas(dias, lote)
+    print(f"🗄️  {total} tarefas arquivadas!")
+
+@click.command('exportar')
+@click.option('--formato', type=click.Choice(FORMATOS_EXPORTACAO), default='ndjson', show_default=True)
+@click.option('--tipo', type=click.Choice(['tudo', 'categorias', 'tarefas']), default='tudo', show_default=True,
+              help='no CSV, categorias ou tarefas (um tipo por arquivo)')
+@click.option('--saida', type=click.File('wb'), default='-', help='arquivo de destino (padrão: saída padrão)')
+@with_appcontext
+def comando_exportar(formato, tipo, saida):
+    """Exporta categorias e tarefas (inclusive as arquivadas) em NDJSON ou CSV, em fluxo"""
+    if formato == 'csv' and tipo == 'tudo':
+        raise click.UsageError('No CSV escolha --tipo categorias ou --tipo tarefas')
+    tipos = ('categoria', 'tarefa') if tipo == 'tudo' else (tipo[:-1],)
+    contagem, inicio = Counter(), time.perf_counter()
+    for pedaco in exportar_dados(formato, tipos, contagem):
+        saida.write(pedaco)
+    segundos = time.perf_counter() - inicio
+    total = sum(contagem.values())
+    # O resumo vai para stderr: a saída padrão pode ser o próprio arquivo exportado
+    click.echo(f"📤 {contagem['categoria']} categorias e {contagem['tarefa']} tarefas exportadas "
+               f"em {segundos:.1f} s ({total / max(segundos, 1e-9):,.0f} linhas/s)", err=True)
+
+@click.command('importar')
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--formato', type=click.Choice(FORMATOS_EXPORTACAO), default=None,
+              help='padrão: csv para arquivos .csv, ndjson para os demais')
+@click.option('--tipo', type=click.Choice(['categorias', 'tarefas']), default='tarefas', show_default=True,
+              help='tipo das linhas sem "tipo" (no CSV, de todas)')
+@click.option('--lote', default=IMPORTACAO_LOTE, show_default=True, help='linhas por transação')
+@with_appcontext
+def comando_importar(arquivo, formato, tipo, lote):
+    """Importa categorias e tarefas de NDJSON ou CSV, relatando as linhas com erro"""
+    formato = formato or ('csv' if arquivo.lower().endswith('.csv') else 'ndjson')
+    # utf-8-sig: aceita o BOM que planilhas põem no início do CSV
+    if arquivo == '-':
+        entrada = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    else:
+        entrada = open(arquivo, encoding='utf-8-sig', newline='')
+    inicio = time.perf_counter()
+    with entrada:
+        resultado = importar_dados(
+            entrada, formato, tipo[:-1], lote,
+            relatar_erro=lambda numero, mensagem: click.echo(f"⚠️  linha {numero}: {mensagem}", err=True)
+        )
+    segundos = time.perf_counter() - inicio
+    print(f"📥 {resultado['categorias']} categorias e {resultado['tarefas']} tarefas "
+          f"(+{resultado['arquivadas']} arquivadas) importadas de {resultado['linhas']} linhas "
+          f"em {segundos:.1f} s ({resultado['linhas'] / max(segundos, 1e-9):,.0f} linhas/s); "
+          f"{resultado['erros']} com erro")
+    if resultado['erros']:
+        sys.exit(1)
+
+# ===== APLICAÇÃO =====
+
+# (regra, métodos, view) registradas em cada app; os nomes das views são os endpoints
+ROTAS = [
+    ('/', ['GET'], index),
+    ('/tarefas', ['GET'], listar_tarefas),
+    ('/tarefas', ['POST'], criar_tarefa),
+    ('/tarefas/lote', ['POST'], processar_lote_tarefas),
+    ('/tarefas/<int:id>', ['GET'], obter_tarefa),
+    ('/tarefas/<int:id>', ['PUT', 'PATCH'], atualizar_tarefa),
+    ('/tarefas/<int:id>', ['DELETE'], deletar_tarefa),
+    ('/categorias', ['GET'], listar_categorias),
+    ('/categorias', ['POST'], criar_categoria),
+    ('/categorias/<int:id>', ['GET'], obter_categoria),
+    ('/categorias/<int:id>', ['PUT', 'PATCH'], atualizar_categoria),
+    ('/categorias/<int:id>', ['DELETE'], deletar_categoria),
+    ('/cache', ['GET'], obter_estatisticas_cache),
+    ('/estatisticas', ['GET'], obter_estatisticas),
+    ('/eventos', ['GET'], transmitir_eventos),
+    ('/health', ['GET'], health_check),
+    ('/metrics', ['GET'], exportar_metricas),
+]
+
+def criar_servicos(config):
+    """Cache de leitura, métricas, compressão, admissão, diagnóstico de SQL e eventos de um app"""
+    return {
+        'cache_leitura': CacheLRU(config['CACHE_TAMANHO_MAXIMO'], config['CACHE_TTL'],
+                                  habilitado=config['CACHE_HABILITADO']),
+        'metricas': MetricasRotas(BUCKETS_LATENCIA, habilitado=config['METRICAS_HABILITADAS']),
+        'compressao': CompressaoRespostas(config['COMPRESSAO_MINIMO'], config['COMPRESSAO_HABILITADA']),
+        'limitador': LimitadorClientes({
+            'leitura': (config['LIMITE_LEITURAS_POR_SEGUNDO'], config['LIMITE_LEITURAS_RAJADA']),
+            'escrita': (config['LIMITE_ESCRITAS_POR_SEGUNDO'], config['LIMITE_ESCRITAS_RAJADA']),
+        }, config['LIMITE_CABECALHO_CLIENTE'], habilitado=config['LIMITE_HABILITADO']),
+        'teto_concorrencia': TetoConcorrencia(config['CONCORRENCIA_MAXIMA'], config['CONCORRENCIA_ESPERA_MS'] / 1000),
+        'diagnostico_sql': DiagnosticoSQL(config['DIAGNOSTICO_SQL'], config['SQL_LENTO_MS'],
+                                          config['N_MAIS_UM_REPETICOES'], config['ORCAMENTO_CONSULTAS']),
+        'eventos_sse': DistribuidorEventos(config['EVENTOS_INTERVALO'], config['EVENTOS_MAX_ASSINANTES']),
+        'corte_eventos': CorteEventos(),
+        # Contagem de tarefas vencidas (única estatística que depende do relógio): por versão dos dados e por pouco tempo
+        'cache_vencidas': {'valor': None, 'versao': None, 'expira_em': 0.0},
+        # Se o banco do app tem a tabela FTS5 (None: ainda não verificado)
+        'busca_textual': {'disponivel': None},
+    }
+
+def servico(nome):
+    """Objeto de criar_servicos() do app atual; fora de um contexto do Flask (asgi.py, threads), do app padrão"""
+    return (current_app if has_app_context() else app).extensions[nome]
+
+COMANDOS = [comando_migrar, comando_reconstruir_busca, comando_recalcular_contadores, comando_limpar_remocoes,
+            comando_arquivar_tarefas, comando_exportar, comando_importar]
+
+def create_app(config=None):
+    """Cria a aplicação Flask: configuração, banco, CORS, rotas, métricas, admissão e comandos
+
+    config (dict) sobrescreve as configurações lidas do ambiente. Nada aqui abre conexão,
+    cria tabela ou imprime: o esquema é criado por `flask --app app migrar` (ou por
+    inicializar_banco()). Sem efeitos colaterais, o módulo pode ser importado uma vez pelo
+    processo mestre (gunicorn --preload) e compartilhado pelos workers.
+
+    Cache de leitura, métricas, compressão, limites de admissão, diagnóstico de SQL e o
+    distribuidor de eventos são de cada app (app.extensions, ver criar_servicos()): dois apps
+    no mesmo processo não dividem cache, contadores nem leitor do log, e criar um não muda a
+    configuração do outro.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(configuracao_do_ambiente())
+    app.config.from_mapping(config or {})
+    url = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', opcoes_do_pool(url))
+
+    db.init_app(app)
+
+    # CORS para o frontend (flask-cors é opcional: sem ele a API só atende a mesma origem)
+    if CORS is not None and app.config['CORS_ORIGINS']:
+        CORS(app, origins=app.config['CORS_ORIGINS'].split(','))
+
+    for regra, metodos, view in ROTAS:
+        app.add_url_rule(regra, view_func=view, methods=metodos)
+    app.before_request(iniciar_medicao)
+    app.before_request(admitir_requisicao)
+    app.after_request(registrar_medicao)
+    app.after_request(liberar_vaga)
+    app.teardown_request(liberar_vaga_em_erro)
+    # after_request roda na ordem inversa: a medição conta os bytes já comprimidos
+    app.after_request(comprimir_resposta)
+    for comando in COMANDOS:
+        app.cli.add_command(comando)
+    # Resolve os relacionamentos dos modelos já aqui (sem banco): com --preload isso é feito
+    # uma vez no mestre e herdado pelos workers, em vez de na 1ª requisição de cada um
+    configure_mappers()
+
+    app.extensions.update(criar_servicos(app.config))
+    return app
+
+# App padrão: `flask --app app`, `gunicorn --preload app:app`, asgi.py e os testes
+app = create_app()
+# Os serviços do app padrão pelos nomes de sempre (asgi.py, testes e benchmarks)
+cache_leitura, metricas, compressao, limitador, teto_concorrencia, diagnostico_sql, eventos_sse = (
+    app.extensions[nome] for nome in ('cache_leitura', 'metricas', 'compressao', 'limitador',
+                                      'teto_concorrencia', 'diagnostico_sql', 'eventos_sse')
+)
+
+if __name__ == '__main__':
+    # Servidor de desenvolvimento: aqui, sim, o banco é criado/migrado antes de subir
+    with app.app_context():
+        inicializar_banco()
+    print("🚀 Iniciando API Gerenciador de Tarefas...")
+    print("📡 Servidor rodando em: http://127.0.0.1:5000")
+    print("📖 Documentação: GET /")
+    app.run(debug=True)
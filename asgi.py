@@ -0,0 +1,496 @@
+"""Modo ASGI da API Gerenciador de Tarefas
+
+Serve o mesmo contrato de app.py (/tarefas, /categorias, /estatisticas, ETag, fluxo,
+paginação, busca...) sobre o engine assíncrono do SQLAlchemy (aiosqlite no SQLite).
+Enquanto uma requisição espera o banco, o event loop atende as outras: a concorrência
+deixa de ser limitada pelo número de threads.
+
+Modelos, validação, consultas e regras de escrita são os de app.py. A listagem de tarefas
+roda nativamente com await; as demais operações rodam com AsyncSession.run_sync, que
+executa o mesmo código síncrono sobre a conexão assíncrona, sem bloquear o event loop.
+
+Uso:
+    pip install starlette "uvicorn[standard]" aiosqlite
+    uvicorn asgi:app --port 8000
+"""
+import asyncio
+import contextlib
+import json
+import os
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.middleware import Middleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.exceptions import BadRequest, HTTPException, UnsupportedMediaType, default_exceptions
+from werkzeug.http import parse_etags
+
+from app import (
+    app as app_flask, db, Categoria, Tarefa,
+    ESTATISTICAS_CACHE_TTL, EVENTOS_FILA_MAXIMA, EVENTOS_HEARTBEAT, INDICE_API, TAMANHO_LOTE_FLUXO, TIPO_METRICAS,
+    consulta_eventos, consulta_limites_eventos, eventos_sse, formatar_evento, inicio_do_fluxo, ler_ultimo_evento,
+    aplicar_pragmas_sqlite, busca_textual_disponivel, cache_leitura, cabecalho_etag, calcular_etag, compressao,
+    consulta_versoes, ler_if_match,
+    concluir_medicao_requisicao, iniciar_medicao_requisicao, medicao_atual, metricas,
+    RECUSA_OCUPADO, exportar_admissao, precisa_de_vaga, teto_concorrencia, uma_vez, verificar_limite,
+    codificar_json, ler_campos, linhas_para_dicts, montar_listagem_tarefas, pagina_de_tarefas,
+    alterar_categoria, alterar_tarefa, carregar_categoria, carregar_categorias, carregar_tarefa,
+    excluir_categoria, excluir_tarefa, executar_idempotente, inserir_categoria, inserir_tarefa, montar_estatisticas,
+    processar_lote, sincronizacao_de_tarefas, verificar_saude
+)
+
+# Driver assíncrono equivalente ao de cada banco síncrono. Só bancos com UPDATE/DELETE
+# ... RETURNING, usados pelas escritas de app.py (o MySQL não tem)
+DRIVERS_ASSINCRONOS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg'
+}
+
+def url_assincrona():
+    """ASYNC_DATABASE_URL, ou a URL do app Flask com o driver trocado pelo assíncrono"""
+    if os.getenv('ASYNC_DATABASE_URL'):
+        return os.getenv('ASYNC_DATABASE_URL')
+    with app_flask.app_context():
+        # O Flask-SQLAlchemy já resolveu o caminho relativo do SQLite (pasta instance/)
+        url = db.engine.url
+    driver = DRIVERS_ASSINCRONOS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f'Sem driver assíncrono para {url.drivername}; defina ASYNC_DATABASE_URL')
+    return url.set(drivername=driver)
+
+motor = create_async_engine(url_assincrona(), **app_flask.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+Sessao = async_sessionmaker(motor)
+
+@event.listens_for(motor.sync_engine, 'connect')
+def configurar_aiosqlite(conexao_dbapi, registro):
+    """Mesmos PRAGMAs do app síncrono (o listener de app.py só reconhece o sqlite3)"""
+    if motor.dialect.name == 'sqlite':
+        aplicar_pragmas_sqlite(conexao_dbapi)
+
+# ===== RESPOSTAS =====
+
+def responder(corpo, status=200, cabecalhos=None):
+    """Equivalente ao jsonify() do Flask"""
+    return Response(codificar_json(corpo) + b'\n', status_code=status, headers=cabecalhos,
+                    media_type='application/json')
+
+async def ler_json(request):
+    """Corpo JSON com as mesmas regras do request.get_json() do Flask"""
+    tipo = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if tipo != 'application/json' and not (tipo.startswith('application/') and tipo.endswith('+json')):
+        raise UnsupportedMediaType(
+            "Did not attempt to load JSON data because the request Content-Type was not 'application/json'."
+        )
+    try:
+        return json.loads(await request.body())
+    except ValueError as e:
+        raise BadRequest(f'Failed to decode JSON object: {e}')
+
+async def tratar_erro_http(request, erro):
+    """Erros HTTP (abort(404) das operações, 405 do roteador...) com a página do Werkzeug"""
+    cabecalhos = {}
+    if isinstance(erro, StarletteHTTPException):
+        cabecalhos = dict(erro.headers or {})  # Allow, no 405
+        erro = default_exceptions[erro.status_code]()
+    return Response(erro.get_body(), status_code=erro.code, media_type='text/html', headers=cabecalhos)
+
+def endereco_do_cliente(request):
+    return request.client.host if request.client else None
+
+async def entrar_no_banco():
+    """O TetoConcorrencia.entrar() do Flask, esperando com await em vez de bloquear a thread"""
+    loop = asyncio.get_running_loop()
+    vaga = loop.create_future()
+    def avisar():
+        # Chamado por quem devolve a vaga, possivelmente em outra thread
+        loop.call_soon_threadsafe(lambda: vaga.done() or vaga.set_result(True))
+    if teto_concorrencia.entrar_ou_aguardar(avisar):
+        return True
+    try:
+        await asyncio.wait_for(asyncio.shield(vaga), teto_concorrencia.espera)
+        return True
+    except asyncio.TimeoutError:
+        # Se a vaga chegou junto com o tempo esgotado, ela já é desta requisição
+        return not teto_concorrencia.desistir(avisar)
+    except BaseException:
+        if not teto_concorrencia.desistir(avisar):
+            teto_concorrencia.sair()
+        raise
+
+async def liberar_no_fim(pedacos, liberar):
+    try:
+        async for pedaco in pedacos:
+            yield pedaco
+    finally:
+        liberar()
+
+def com_sessao(view):
+    """Uma AsyncSession por requisição, entregue à view (e ao @condicional)
+
+    Passa antes pelo controle de admissão de app.py: 429 pelo limite do cliente, 503 com o
+    teto de concorrência cheio. A vaga volta quando a resposta termina, inclusive em fluxo.
+    """
+    @wraps(view)
+    async def envolver(request):
+        endpoint = view.__name__
+        recusa = verificar_limite(endpoint, request.method, request.headers, endereco_do_cliente(request))
+        vaga = recusa is None and precisa_de_vaga(endpoint, request.method)
+        if vaga and not await entrar_no_banco():
+            recusa = RECUSA_OCUPADO
+        if recusa is not None:
+            return responder(*recusa)
+        if not vaga:
+            async with Sessao() as sessao:
+                return await view(request, sessao)
+
+        liberar = uma_vez(teto_concorrencia.sair)
+        try:
+            async with Sessao() as sessao:
+                resposta = await view(request, sessao)
+        except BaseException:
+            liberar()
+            raise
+        if isinstance(resposta, StreamingResponse):
+            # O fluxo usa o banco até o fim; a tarefa de fundo cobre um fluxo que nem começou
+            resposta.body_iterator = liberar_no_fim(resposta.body_iterator, liberar)
+            resposta.background = BackgroundTask(liberar)
+        else:
+            liberar()
+        return resposta
+    return envolver
+
+def condicional(validade=None, modelo=None):
+    """O @condicional de app.py: mesmo ETag e 304 sem rodar a consulta da rota; versões em request.state"""
+    def decorador(view):
+        @wraps(view)
+        async def envolver(request, sessao):
+            versoes = (await sessao.execute(consulta_versoes(modelo, request.path_params.get('id')))).first()
+            request.state.versoes = versoes
+            if versoes is None:
+                return await view(request, sessao)
+
+            # request.full_path do Flask: caminho + '?' + query string (mesmo vazia)
+            caminho_completo = f'{request.url.path}?{request.url.query}'
+            etag = calcular_etag(versoes[0], caminho_completo, request.headers.get('accept', ''), validade,
+                                 *versoes[1:])
+            if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+                return Response(status_code=304, headers={'ETag': f'"{etag}"'})
+
+            resposta = await view(request, sessao)
+            if resposta.status_code == 200:
+                resposta.headers['ETag'] = f'"{etag}"'
+            return resposta
+        return envolver
+    return decorador
+
+class MedirRequisicoes:
+    """Middleware ASGI com as mesmas métricas e diagnóstico de SQL do app Flask
+
+    A medição termina no último pedaço do corpo, então respostas em fluxo contam o tempo e
+    as consultas da transmissão inteira.
+    """
+
+    def __init__(self, aplicacao):
+        self.aplicacao = aplicacao
+
+    async def __call__(self, scope, receive, send):
+        token = iniciar_medicao_requisicao() if scope['type'] == 'http' else None
+        if token is None:
+            return await self.aplicacao(scope, receive, send)
+
+        medicao = medicao_atual.get()
+        status, tamanho = 500, 0
+
+        async def enviar(mensagem):
+            nonlocal status, tamanho
+            if mensagem['type'] == 'http.response.start':
+                status = mensagem['status']
+            elif mensagem['type'] == 'http.response.body':
+                tamanho += len(mensagem.get('body', b''))
+            await send(mensagem)
+
+        try:
+            await self.aplicacao(scope, receive, enviar)
+        finally:
+            medicao_atual.reset(token)
+            # O roteador grava a view escolhida no scope; o nome é o mesmo das views do Flask
+            view = scope.get('endpoint')
+            concluir_medicao_requisicao(scope['method'], view.__name__ if view else 'desconhecido', scope['path'],
+                                        status, medicao, tamanho)
+
+class ComprimirRespostas:
+    """Middleware ASGI com a compressão de app.py: mesma negociação, mínimo e cabeçalhos
+
+    O início da resposta fica retido até o primeiro pedaço do corpo: com ele se sabe se a
+    resposta é pequena (um corpo só, abaixo do mínimo) ou um fluxo, comprimido pedaço a pedaço.
+    """
+
+    def __init__(self, aplicacao):
+        self.aplicacao = aplicacao
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.aplicacao(scope, receive, send)
+
+        codificacao = compressao.escolher(Headers(scope=scope).get('accept-encoding'))
+        inicio, compressor = None, None
+
+        async def enviar(mensagem):
+            nonlocal inicio, compressor
+            if mensagem['type'] == 'http.response.start':
+                inicio = mensagem
+                return
+            if inicio is not None:
+                cabecalhos = MutableHeaders(raw=list(inicio['headers']))
+                corpo, mais = mensagem.get('body', b''), mensagem.get('more_body', False)
+                tipo = cabecalhos.get('content-type', '').split(';')[0].strip()
+                if compressao.aplicavel(tipo, inicio['status']) and 'content-encoding' not in cabecalhos:
+                    cabecalhos.add_vary_header('Accept-Encoding')
+                    if codificacao is not None and (mais or len(corpo) >= compressao.minimo):
+                        compressor = compressao.compressor(codificacao)
+                        cabecalhos['Content-Encoding'] = codificacao
+                        etag = cabecalhos.get('etag')
+                        if etag and not etag.startswith('W/'):
+                            cabecalhos['ETag'] = f'W/{etag}'
+                        if 'content-length' in cabecalhos:
+                            del cabecalhos['content-length']
+                        if not mais:
+                            corpo = compressor.compress(corpo) + compressor.flush()
+                            cabecalhos['Content-Length'] = str(len(corpo))
+                            mensagem, compressor = dict(mensagem, body=corpo), None
+                await send(dict(inicio, headers=cabecalhos.raw))
+                inicio = None
+            if compressor is not None:
+                saida = compressor.compress(mensagem.get('body', b''))
+                if not mensagem.get('more_body', False):
+                    saida += compressor.flush()
+                mensagem = dict(mensagem, body=saida)
+            await send(mensagem)
+
+        await self.aplicacao(scope, receive, enviar)
+
+# ===== ROTAS =====
+
+async def index(request):
+    return responder(INDICE_API)
+
+async def gerar_fluxo(listagem):
+    """Listagem completa em pedaços: um lote de linhas do cursor por vez"""
+    async with Sessao() as sessao:
+        resultado = await sessao.stream(listagem.consulta.execution_options(yield_per=TAMANHO_LOTE_FLUXO))
+        primeira = True
+        if listagem.modo == 'fluxo':
+            yield b'['
+        async for linhas in resultado.partitions():
+            tarefas = linhas_para_dicts(linhas, listagem.campos, listagem.conversores)
+            if listagem.modo == 'ndjson':
+                yield b''.join(codificar_json(tarefa) + b'\n' for tarefa in tarefas)
+                continue
+            pedaco = b','.join(codificar_json(tarefa) for tarefa in tarefas)
+            yield pedaco if primeira else b',' + pedaco
+            primeira = False
+        if listagem.modo == 'fluxo':
+            yield b']\n'
+
+@com_sessao
+@condicional()
+async def listar_tarefas(request, sessao):
+    # colunas_rapidas() e a busca textual consultam o dialeto do engine configurado no Flask
+    with app_flask.app_context():
+        listagem, erro = montar_listagem_tarefas(request.query_params, request.headers.get('accept'))
+    if erro:
+        return responder({'erro': erro}, 400)
+
+    if listagem.modo in ('fluxo', 'ndjson'):
+        tipo = 'application/x-ndjson' if listagem.modo == 'ndjson' else 'application/json'
+        return StreamingResponse(gerar_fluxo(listagem), media_type=tipo)
+    linhas = (await sessao.execute(listagem.consulta)).all()
+    if listagem.modo == 'lista':
+        return responder(list(linhas_para_dicts(linhas, listagem.campos, listagem.conversores)))
+    if listagem.modo == 'sincronizacao':
+        return responder(sincronizacao_de_tarefas(linhas, listagem))
+    return responder(pagina_de_tarefas(linhas, listagem))
+
+@com_sessao
+async def criar_tarefa(request, sessao):
+    dados = await ler_json(request)
+    corpo, status, cabecalhos = await sessao.run_sync(
+        executar_idempotente, 'criar_tarefa', request.headers.get('idempotency-key'), dados, inserir_tarefa
+    )
+    return responder(corpo, status, dict(cabecalhos, **cabecalho_etag(corpo)))
+
+@com_sessao
+@condicional(modelo=Tarefa)
+async def obter_tarefa(request, sessao):
+    campos, erro = ler_campos(Tarefa, request.query_params)
+    if erro:
+        return responder({'erro': erro}, 400)
+    incluir_arquivadas = request.query_params.get('incluir_arquivadas', '').lower() == 'true'
+    return responder(await sessao.run_sync(
+        carregar_tarefa, request.path_params['id'], campos, incluir_arquivadas, request.state.versoes
+    ))
+
+@com_sessao
+async def atualizar_tarefa(request, sessao):
+    dados = await ler_json(request)
+    corpo, status = await sessao.run_sync(
+        alterar_tarefa, request.path_params['id'], dados, ler_if_match(request.headers.get('if-match'))
+    )
+    return responder(corpo, status, cabecalho_etag(corpo))
+
+@com_sessao
+async def deletar_tarefa(request, sessao):
+    corpo, status = await sessao.run_sync(
+        excluir_tarefa, request.path_params['id'], ler_if_match(request.headers.get('if-match'))
+    )
+    return responder(corpo, status)
+
+@com_sessao
+async def processar_lote_tarefas(request, sessao):
+    corpo, status = await sessao.run_sync(processar_lote, await ler_json(request))
+    return responder(corpo, status)
+
+@com_sessao
+@condicional()
+async def listar_categorias(request, sessao):
+    campos, erro = ler_campos(Categoria, request.query_params)
+    if erro:
+        return responder({'erro': erro}, 400)
+    return responder(await sessao.run_sync(carregar_categorias, campos, request.state.versoes))
+
+@com_sessao
+async def criar_categoria(request, sessao):
+    dados = await ler_json(request)
+    corpo, status, cabecalhos = await sessao.run_sync(
+        executar_idempotente, 'criar_categoria', request.headers.get('idempotency-key'), dados, inserir_categoria
+    )
+    return responder(corpo, status, dict(cabecalhos, **cabecalho_etag(corpo)))
+
+@com_sessao
+@condicional(modelo=Categoria)
+async def obter_categoria(request, sessao):
+    return responder(await sessao.run_sync(carregar_categoria, request.path_params['id'], request.state.versoes))
+
+@com_sessao
+async def atualizar_categoria(request, sessao):
+    dados = await ler_json(request)
+    corpo, status = await sessao.run_sync(
+        alterar_categoria, request.path_params['id'], dados, ler_if_match(request.headers.get('if-match'))
+    )
+    return responder(corpo, status, cabecalho_etag(corpo))
+
+@com_sessao
+async def deletar_categoria(request, sessao):
+    corpo, status = await sessao.run_sync(
+        excluir_categoria, request.path_params['id'], ler_if_match(request.headers.get('if-match'))
+    )
+    return responder(corpo, status)
+
+async def obter_estatisticas_cache(request):
+    return responder(cache_leitura.estatisticas())
+
+@com_sessao
+@condicional(validade=ESTATISTICAS_CACHE_TTL)
+async def obter_estatisticas(request, sessao):
+    return responder(await sessao.run_sync(montar_estatisticas, request.state.versoes))
+
+@com_sessao
+async def health_check(request, sessao):
+    corpo, status = await sessao.run_sync(verificar_saude)
+    return responder(corpo, status)
+
+async def transmitir_eventos(request):
+    """O /eventos de app.py: cada assinante é uma fila no event loop, sem thread nem conexão"""
+    recusa = verificar_limite('transmitir_eventos', request.method, request.headers, endereco_do_cliente(request))
+    if recusa is not None:
+        return responder(*recusa)
+    try:
+        ultimo_id = ler_ultimo_evento(request.headers, request.query_params)
+    except ValueError:
+        return responder({'erro': 'Last-Event-ID inválido'}, 400)
+
+    loop = asyncio.get_running_loop()
+    fila = asyncio.Queue()
+    def avisar(eventos):
+        # Chamado na thread do distribuidor: a fila só é alterada pelo event loop
+        if fila.qsize() > EVENTOS_FILA_MAXIMA:
+            eventos_sse.cancelar(avisar)
+            eventos = None
+        loop.call_soon_threadsafe(fila.put_nowait, eventos)
+
+    # O leitor do log é o mesmo do app Flask (engine síncrono, thread própria)
+    with app_flask.app_context():
+        motor_sincrono = db.engine
+    if not await asyncio.to_thread(eventos_sse.assinar, motor_sincrono, avisar):
+        resposta = responder({'erro': 'Limite de assinantes de eventos atingido'}, 503)
+        resposta.headers['Retry-After'] = str(EVENTOS_HEARTBEAT)
+        return resposta
+
+    async def gerar(ultimo_id):
+        try:
+            async with motor.connect() as conexao:
+                limites = (await conexao.execute(consulta_limites_eventos())).one()
+                pendentes = (await conexao.execute(consulta_eventos(ultimo_id))).all() \
+                    if ultimo_id is not None else []
+            pedacos, ultimo_id = inicio_do_fluxo(ultimo_id, limites, pendentes)
+            yield b''.join(pedacos)
+            while True:
+                try:
+                    eventos = await asyncio.wait_for(fila.get(), EVENTOS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b': ping\n\n'
+                    continue
+                if eventos is None:
+                    return
+                novos = [evento for evento in eventos if evento.id > ultimo_id]
+                if novos:
+                    ultimo_id = novos[-1].id
+                    yield b''.join(formatar_evento(evento) for evento in novos)
+        finally:
+            eventos_sse.cancelar(avisar)
+
+    return StreamingResponse(gerar(ultimo_id), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+async def exportar_metricas(request):
+    return Response(metricas.exportar() + exportar_admissao(), headers={'Content-Type': TIPO_METRICAS})
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(aplicacao):
+    # Detecta a busca textual uma vez, com o engine síncrono, antes da primeira requisição
+    with app_flask.app_context():
+        busca_textual_disponivel()
+    yield
+    await motor.dispose()
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/tarefas', listar_tarefas, methods=['GET']),
+        Route('/tarefas', criar_tarefa, methods=['POST']),
+        Route('/tarefas/lote', processar_lote_tarefas, methods=['POST']),
+        Route('/tarefas/{id:int}', obter_tarefa, methods=['GET']),
+        Route('/tarefas/{id:int}', atualizar_tarefa, methods=['PUT', 'PATCH']),
+        Route('/tarefas/{id:int}', deletar_tarefa, methods=['DELETE']),
+        Route('/categorias', listar_categorias, methods=['GET']),
+        Route('/categorias', criar_categoria, methods=['POST']),
+        Route('/categorias/{id:int}', obter_categoria, methods=['GET']),
+        Route('/categorias/{id:int}', atualizar_categoria, methods=['PUT', 'PATCH']),
+        Route('/categorias/{id:int}', deletar_categoria, methods=['DELETE']),
+        Route('/cache', obter_estatisticas_cache),
+        Route('/estatisticas', obter_estatisticas),
+        Route('/eventos', transmitir_eventos),
+        Route('/health', health_check),
+        Route('/metrics', exportar_metricas),
+    ],
+    # A medição fica por fora: conta os bytes já comprimidos, como no app Flask
+    middleware=[Middleware(MedirRequisicoes), Middleware(ComprimirRespostas)],
+    exception_handlers={HTTPException: tratar_erro_http, StarletteHTTPException: tratar_erro_http},
+    lifespan=ciclo_de_vida
+)
@@ -0,0 +1 @@
+"""Scripts de benchmark da API (rodam offline, com um banco SQLite temporário)"""
@@ -0,0 +1,56 @@
+"""Benchmark da projeção de campos (?campos=) em GET /tarefas
+
+Compara a listagem completa com a listagem só dos campos usados nas telas de lista
+(id, titulo, status, data_vencimento), medindo bytes da resposta e latência.
+
+Uso:
+    python -m benchmarks.campos --tarefas 20000 --repeticoes 10
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.dados import preparar_banco
+
+CAMPOS_LISTA = 'id,titulo,status,data_vencimento'
+
+def medir(cliente, url, repeticoes):
+    """Retorna (bytes da resposta, latência mediana em ms, p95 em ms)"""
+    cliente.get(url)  # aquecimento
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = cliente.get(url)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        assert resposta.status_code == 200, resposta.status_code
+    tempos.sort()
+    return len(resposta.data), statistics.median(tempos), tempos[int(0.95 * (len(tempos) - 1))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tarefas', type=int, default=20000)
+    parser.add_argument('--tamanho-descricao', type=int, default=2000)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    args = parser.parse_args()
+
+    app = preparar_banco(args.tarefas, args.tamanho_descricao)
+    cliente = app.test_client()
+
+    cenarios = [
+        ('Listagem completa', '/tarefas'),
+        ('Página de 500', '/tarefas?limite=500'),
+        ('Tarefa única', '/tarefas/1'),
+    ]
+    print(f"\n📏 {args.tarefas} tarefas, descrição de {args.tamanho_descricao} caracteres")
+    print(f"{'Cenário':<20} {'Campos':<10} {'Bytes':>12} {'Mediana (ms)':>13} {'p95 (ms)':>10}")
+    for nome, url in cenarios:
+        separador = '&' if '?' in url else '?'
+        completo = medir(cliente, url, args.repeticoes)
+        projetado = medir(cliente, f'{url}{separador}campos={CAMPOS_LISTA}', args.repeticoes)
+        print(f"{nome:<20} {'todos':<10} {completo[0]:>12,} {completo[1]:>13.2f} {completo[2]:>10.2f}")
+        print(f"{'':<20} {'lista':<10} {projetado[0]:>12,} {projetado[1]:>13.2f} {projetado[2]:>10.2f}")
+        print(f"{'':<20} {'redução':<10} {1 - projetado[0] / completo[0]:>12.1%} "
+              f"{1 - projetado[1] / completo[1]:>13.1%}")
+
+if __name__ == '__main__':
+    main()
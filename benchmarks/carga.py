@@ -0,0 +1,369 @@
+"""Benchmark de carga reproduzível: latência e vazão por endpoint
+
+Roda uma mistura fixa de requisições (listagens, filtros, busca, detalhe, categorias,
+estatísticas, criação e atualização) contra um banco sintético de N tarefas e grava
+p50/p95/p99 e vazão de cada endpoint num JSON, que o benchmarks.comparar compara entre
+commits. A sequência de requisições sai de uma semente fixa e cada execução trabalha numa
+cópia descartável do banco-base (benchmarks.dados): duas execuções no mesmo commit e na
+mesma máquina fazem exatamente as mesmas requisições sobre os mesmos dados.
+
+Alvos:
+    (padrão)         em processo, com o cliente de teste do Flask (uma thread por cliente)
+    --servidor NOME  sobe o servidor local (flask ou asgi) num subprocesso
+    --url URL        servidor já rodando (sem banco sintético; o plano usa os dados dele)
+
+Tudo roda offline, numa máquina só.
+
+Uso:
+    python -m benchmarks.carga --tarefas 10000 100000 --saida resultados/base.json
+    python -m benchmarks.carga --servidor asgi --clientes 50 --tarefas 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.dados import PALAVRAS, copiar_banco, garantir_banco_base, preparar_copia
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Muda quando o formato do JSON de resultados muda
+VERSAO_FORMATO = 1
+
+SERVIDORES = {
+    'flask': lambda porta: [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(porta),
+                            '--with-threads', '--no-reload', '--no-debugger'],
+    'asgi': lambda porta: [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(porta),
+                           '--log-level', 'warning', '--no-access-log'],
+}
+
+STATUS = ['pendente', 'em_andamento', 'concluida', 'cancelada']
+PRIORIDADES = ['baixa', 'media', 'alta', 'urgente']
+
+# ===== CENÁRIO =====
+
+# (endpoint, peso na mistura, gerador da requisição a partir do sorteio e dos dados do banco)
+CENARIO = [
+    ('listar_pagina', 15, lambda a, d: ('GET', '/tarefas?limite=50', None)),
+    ('listar_filtrada', 15, lambda a, d: (
+        'GET', f'/tarefas?status={a.choice(STATUS)}&prioridade={a.choice(PRIORIDADES)}&limite=20', None)),
+    ('listar_categoria', 10, lambda a, d: (
+        'GET', f"/tarefas?categoria_id={a.choice(d['categorias'])}&limite=20", None)),
+    ('buscar', 5, lambda a, d: ('GET', '/tarefas?' + urlencode({'q': a.choice(PALAVRAS), 'limite': 20}), None)),
+    ('obter_tarefa', 25, lambda a, d: ('GET', f"/tarefas/{a.randint(1, d['total_tarefas'])}", None)),
+    ('listar_categorias', 5, lambda a, d: ('GET', '/categorias', None)),
+    ('estatisticas', 5, lambda a, d: ('GET', '/estatisticas', None)),
+    ('criar_tarefa', 5, lambda a, d: ('POST', '/tarefas', {
+        'titulo': f'Carga {a.choice(PALAVRAS)}', 'prioridade': a.choice(PRIORIDADES),
+        'categoria_id': a.choice(d['categorias'])})),
+    ('atualizar_tarefa', 15, lambda a, d: (
+        'PUT', f"/tarefas/{a.randint(1, d['total_tarefas'])}", {'prioridade': a.choice(PRIORIDADES)})),
+]
+
+def planejar(total, semente, dados):
+    """Sequência determinística de (endpoint, método, url, corpo)"""
+    aleatorio = random.Random(semente)
+    nomes = [nome for nome, _, _ in CENARIO]
+    pesos = [peso for _, peso, _ in CENARIO]
+    geradores = {nome: gerador for nome, _, gerador in CENARIO}
+    # Sem categorias no banco, os endpoints que precisam delas saem da mistura
+    if not dados['categorias']:
+        pesos = [0 if nome in ('listar_categoria', 'criar_tarefa') else peso for nome, peso in zip(nomes, pesos)]
+    plano = []
+    for nome in aleatorio.choices(nomes, pesos, k=total):
+        plano.append((nome, *geradores[nome](aleatorio, dados)))
+    return plano
+
+# ===== MEDIÇÃO =====
+
+def resumir(medicoes, decorrido):
+    """Estatísticas de uma lista de (latência em ms, sucesso)"""
+    latencias = sorted(latencia for latencia, sucesso in medicoes if sucesso)
+    if len(latencias) > 1:
+        percentis = statistics.quantiles(latencias, n=100, method='inclusive')
+    else:
+        percentis = [latencias[0] if latencias else 0.0] * 99
+    return {
+        'requisicoes': len(medicoes),
+        'erros': len(medicoes) - len(latencias),
+        'vazao_rps': round(len(latencias) / decorrido, 1),
+        'media_ms': round(statistics.fmean(latencias), 2) if latencias else 0.0,
+        'p50_ms': round(percentis[49], 2),
+        'p95_ms': round(percentis[94], 2),
+        'p99_ms': round(percentis[98], 2),
+    }
+
+def consolidar(medicoes, decorrido):
+    """Totais e estatísticas por endpoint, a partir de (endpoint, latência, sucesso)"""
+    por_endpoint = {}
+    for nome, latencia, sucesso in medicoes:
+        por_endpoint.setdefault(nome, []).append((latencia, sucesso))
+    return {
+        'duracao_s': round(decorrido, 2),
+        'total': resumir([(latencia, sucesso) for _, latencia, sucesso in medicoes], decorrido),
+        'endpoints': {nome: resumir(lista, decorrido) for nome, lista in sorted(por_endpoint.items())},
+    }
+
+def executar_em_processo(app, plano, clientes):
+    """Clientes em threads, cada um com seu cliente de teste do Flask"""
+    medicoes = []
+    fatias = [plano[i::clientes] for i in range(clientes)]
+
+    def cliente(fatia):
+        http = app.test_client()
+        for nome, metodo, url, corpo in fatia:
+            inicio = time.perf_counter()
+            try:
+                status = http.open(url, method=metodo, json=corpo).status_code
+            except Exception:
+                status = 599
+            # list.append é atômico no CPython
+            medicoes.append((nome, (time.perf_counter() - inicio) * 1000, status < 400))
+
+    threads = [threading.Thread(target=cliente, args=(fatia,)) for fatia in fatias]
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return medicoes, time.perf_counter() - inicio
+
+class ConexaoHTTP:
+    """Conexão HTTP/1.1 keep-alive mínima (respostas com Content-Length)"""
+
+    def __init__(self, porta, host='127.0.0.1'):
+        self.porta = porta
+        self.host = host
+        self.leitor = self.escritor = None
+
+    async def abrir(self):
+        self.leitor, self.escritor = await asyncio.open_connection(self.host, self.porta)
+
+    def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            self.leitor = self.escritor = None
+
+    async def requisitar(self, metodo, url, corpo=None):
+        """Envia a requisição e retorna o status, reabrindo a conexão se o servidor a fechar"""
+        if self.escritor is None:
+            await self.abrir()
+        dados = json.dumps(corpo).encode() if corpo is not None else b''
+        self.escritor.write(
+            f'{metodo} {url} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(dados)}\r\n\r\n'.encode() + dados
+        )
+        status = int((await self.leitor.readline()).split()[1])
+        tamanho, fechar = 0, False
+        while (linha := await self.leitor.readline()) not in (b'\r\n', b''):
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            nome = nome.strip().lower()
+            if nome == 'content-length':
+                tamanho = int(valor)
+            elif nome == 'connection':
+                fechar = valor.strip().lower() == 'close'
+        await self.leitor.readexactly(tamanho)
+        if fechar:
+            self.fechar()
+        return status
+
+async def executar_via_http(host, porta, plano, clientes):
+    """Clientes como tarefas asyncio, cada um com sua conexão keep-alive"""
+    medicoes = []
+    conexoes = [ConexaoHTTP(porta, host) for _ in range(clientes)]
+    await asyncio.gather(*(conexao.abrir() for conexao in conexoes))
+
+    async def cliente(conexao, fatia):
+        for nome, metodo, url, corpo in fatia:
+            inicio = time.perf_counter()
+            try:
+                status = await conexao.requisitar(metodo, url, corpo)
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                conexao.fechar()
+                status = 599
+            medicoes.append((nome, (time.perf_counter() - inicio) * 1000, status < 400))
+        conexao.fechar()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(conexao, plano[i::clientes]) for i, conexao in enumerate(conexoes)))
+    return medicoes, time.perf_counter() - inicio
+
+# ===== ALVOS =====
+
+def subir_servidor(nome, porta, banco, cache=False, ambiente=None):
+    # Todos os clientes do benchmark saem do mesmo endereço: sem limite por cliente
+    ambiente = dict(os.environ, DATABASE_URL=f'sqlite:///{banco}', CACHE_HABILITADO=str(cache),
+                    LIMITE_HABILITADO='False', **(ambiente or {}))
+    processo = subprocess.Popen(SERVIDORES[nome](porta), cwd=RAIZ, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{porta}/', timeout=1).close()
+            return processo
+        except OSError:
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError(f'Servidor {nome} não respondeu na porta {porta}')
+
+def tempo_de_cpu(processo):
+    """Segundos de CPU (usuário + sistema) já usados pelo processo; None fora do Linux"""
+    try:
+        with open(f'/proc/{processo.pid}/stat') as arquivo:
+            campos = arquivo.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(campos[11]) + int(campos[12])) / os.sysconf('SC_CLK_TCK')
+
+def dados_do_banco(obter_json):
+    """Total de tarefas e ids de categorias, para o plano só pedir o que existe"""
+    return {
+        'total_tarefas': max(obter_json('/estatisticas')['total_tarefas'], 1),
+        'categorias': [categoria['id'] for categoria in obter_json('/categorias?campos=id')],
+    }
+
+def medir(args, total_tarefas):
+    """Uma rodada completa (aquecimento + medição) contra um banco de N tarefas"""
+    if args.url:
+        partes = urlsplit(args.url)
+        host, porta, processo = partes.hostname, partes.port or 80, None
+    elif args.servidor:
+        banco = os.path.join(tempfile.mkdtemp(prefix='carga_'), 'carga.db')
+        copiar_banco(garantir_banco_base(total_tarefas, args.semente), banco)
+        host, porta = '127.0.0.1', args.porta
+        processo = subir_servidor(args.servidor, porta, banco, args.cache)
+    else:
+        app, _ = preparar_copia(total_tarefas, args.cache, args.semente)
+        processo = None
+        http = app.test_client()
+        dados = dados_do_banco(lambda url: http.get(url).get_json())
+
+    try:
+        if args.url or args.servidor:
+            def obter_json(url):
+                with urllib.request.urlopen(f'http://{host}:{porta}{url}', timeout=30) as resposta:
+                    return json.load(resposta)
+            dados = dados_do_banco(obter_json)
+
+            def executar(plano):
+                return asyncio.run(executar_via_http(host, porta, plano, args.clientes))
+        else:
+            def executar(plano):
+                return executar_em_processo(app, plano, args.clientes)
+
+        # Aquecimento com outra semente: pool de conexões aberto e páginas do banco em cache
+        executar(planejar(args.aquecimento, args.semente + 1, dados))
+        cpu_inicial = tempo_de_cpu(processo) if processo else None
+        medicoes, decorrido = executar(planejar(args.requisicoes, args.semente, dados))
+        resultado = consolidar(medicoes, decorrido)
+        if cpu_inicial is not None:
+            cpu = tempo_de_cpu(processo) - cpu_inicial
+            resultado['cpu_servidor_ms_por_requisicao'] = round(cpu * 1000 / max(len(medicoes), 1), 2)
+        resultado['tarefas_no_banco'] = dados['total_tarefas']
+        return resultado
+    finally:
+        if processo:
+            processo.terminate()
+            processo.wait()
+
+def medir_em_subprocesso(args, total_tarefas):
+    """Cada tamanho num processo novo: o app só aponta para um banco por processo"""
+    with tempfile.NamedTemporaryFile(suffix='.json') as arquivo:
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.carga', '--interno',
+             json.dumps(dict(vars(args), tarefas=[total_tarefas], saida=arquivo.name))],
+            cwd=RAIZ, check=True
+        )
+        return json.load(arquivo)
+
+def identificar_commit():
+    """Hash do commit atual e se há alterações não commitadas"""
+    def git(*comando):
+        return subprocess.run(['git', *comando], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+    try:
+        return git('rev-parse', '--short', 'HEAD') or None, bool(git('status', '--porcelain', '--untracked-files=no'))
+    except OSError:
+        return None, False
+
+def descrever_maquina():
+    return {
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+def imprimir(resultados):
+    for tamanho, resultado in resultados.items():
+        print(f"\n📊 {tamanho} tarefas ({resultado['duracao_s']}s)")
+        print(f"{'Endpoint':<18} {'Req':>6} {'Req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'Erros':>6}")
+        linhas = {**resultado['endpoints'], 'TOTAL': resultado['total']}
+        for nome, r in linhas.items():
+            print(f"{nome:<18} {r['requisicoes']:>6} {r['vazao_rps']:>8.1f} {r['p50_ms']:>9.2f} "
+                  f"{r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['erros']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tarefas', type=int, nargs='+', default=[10000],
+                        help='tamanhos do banco sintético (ex.: 10000 100000 1000000)')
+    parser.add_argument('--requisicoes', type=int, default=2000, help='requisições medidas por tamanho')
+    parser.add_argument('--aquecimento', type=int, default=200, help='requisições antes da medição')
+    parser.add_argument('--clientes', type=int, default=8, help='clientes simultâneos')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--cache', action='store_true', help='liga o cache de leitura (CACHE_HABILITADO)')
+    alvo = parser.add_mutually_exclusive_group()
+    alvo.add_argument('--servidor', choices=list(SERVIDORES), help='sobe o servidor local indicado')
+    alvo.add_argument('--url', help='servidor já rodando, ex.: http://127.0.0.1:5000')
+    parser.add_argument('--porta', type=int, default=8701, help='porta do servidor com --servidor')
+    parser.add_argument('--saida', help='grava os resultados em JSON neste arquivo')
+    parser.add_argument('--interno', help=argparse.SUPPRESS)
+
+    if '--interno' in sys.argv:
+        # Processo filho de medir_em_subprocesso: uma rodada, resultado no arquivo indicado
+        args = argparse.Namespace(**json.loads(parser.parse_args().interno))
+        with open(args.saida, 'w') as arquivo:
+            json.dump(medir(args, args.tarefas[0]), arquivo)
+        return
+
+    args = parser.parse_args()
+    if args.url:
+        # Contra um servidor externo o banco é o dele
+        resultados = {'externo': medir(args, None)}
+    elif len(args.tarefas) == 1:
+        resultados = {str(args.tarefas[0]): medir(args, args.tarefas[0])}
+    else:
+        resultados = {str(total): medir_em_subprocesso(args, total) for total in args.tarefas}
+
+    commit, sujo = identificar_commit()
+    relatorio = {
+        'versao_formato': VERSAO_FORMATO,
+        'commit': commit,
+        'alteracoes_nao_commitadas': sujo,
+        'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'maquina': descrever_maquina(),
+        'parametros': {chave: valor for chave, valor in vars(args).items() if chave not in ('saida', 'interno')},
+        'alvo': args.url or args.servidor or 'em_processo',
+        'resultados': resultados,
+    }
+    imprimir(resultados)
+
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, 'w') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados gravados em {args.saida}")
+
+if __name__ == '__main__':
+    main()
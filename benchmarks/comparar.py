@@ -0,0 +1,72 @@
+"""Compara dois resultados do benchmarks.carga (ex.: commit base x commit novo)
+
+Para cada tamanho de banco e endpoint presentes nos dois arquivos, mostra a variação de
+vazão e de p50/p95/p99. Sai com código 1 se alguma métrica piorar além da tolerância, para
+ser usado como verificação entre commits.
+
+Uso:
+    python -m benchmarks.comparar resultados/base.json resultados/novo.json --tolerancia 0.15
+"""
+import argparse
+import json
+import sys
+
+# Métrica -> True quando maior é melhor
+METRICAS = {'vazao_rps': True, 'p50_ms': False, 'p95_ms': False, 'p99_ms': False}
+
+def carregar(caminho):
+    with open(caminho) as arquivo:
+        return json.load(arquivo)
+
+def variacao(antes, depois):
+    return (depois - antes) / antes if antes else 0.0
+
+def comparar(base, novo, tolerancia):
+    """Linhas (tamanho, endpoint, métrica, antes, depois, variação, regrediu)"""
+    linhas = []
+    for tamanho, resultado_base in base['resultados'].items():
+        resultado_novo = novo['resultados'].get(tamanho)
+        if resultado_novo is None:
+            continue
+        endpoints = {**resultado_base['endpoints'], 'TOTAL': resultado_base['total']}
+        endpoints_novos = {**resultado_novo['endpoints'], 'TOTAL': resultado_novo['total']}
+        for endpoint, antes in endpoints.items():
+            depois = endpoints_novos.get(endpoint)
+            if depois is None:
+                continue
+            for metrica, maior_melhor in METRICAS.items():
+                delta = variacao(antes[metrica], depois[metrica])
+                piora = -delta if maior_melhor else delta
+                linhas.append((tamanho, endpoint, metrica, antes[metrica], depois[metrica], delta,
+                               piora > tolerancia))
+            if depois['erros'] > antes['erros']:
+                linhas.append((tamanho, endpoint, 'erros', antes['erros'], depois['erros'], 0.0, True))
+    return linhas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('novo')
+    parser.add_argument('--tolerancia', type=float, default=0.10,
+                        help='piora relativa aceita antes de acusar regressão (0.10 = 10%%)')
+    args = parser.parse_args()
+
+    base, novo = carregar(args.base), carregar(args.novo)
+    print(f"🔎 {base.get('commit') or '?'} -> {novo.get('commit') or '?'} (tolerância {args.tolerancia:.0%})")
+    if base.get('maquina') != novo.get('maquina'):
+        print("⚠️  Resultados de máquinas diferentes: as variações não são comparáveis")
+
+    linhas = comparar(base, novo, args.tolerancia)
+    print(f"{'Tarefas':>8} {'Endpoint':<18} {'Métrica':<10} {'Antes':>10} {'Depois':>10} {'Variação':>9}")
+    for tamanho, endpoint, metrica, antes, depois, delta, regrediu in linhas:
+        print(f"{tamanho:>8} {endpoint:<18} {metrica:<10} {antes:>10} {depois:>10} {delta:>+9.1%}"
+              f"{'  ❌' if regrediu else ''}")
+
+    regressoes = [linha for linha in linhas if linha[-1]]
+    if regressoes:
+        print(f"\n❌ {len(regressoes)} métrica(s) pioraram além da tolerância")
+        sys.exit(1)
+    print("\n✅ Nenhuma regressão além da tolerância")
+
+if __name__ == '__main__':
+    main()
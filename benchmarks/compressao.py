@@ -0,0 +1,156 @@
+"""Benchmark da compressão negociada: bytes trafegados e latência ponta a ponta
+
+Sobe o servidor local (flask ou asgi) sobre uma cópia do banco-base e pede as listagens
+grandes com cada Accept-Encoding disponível (identity, gzip, br, zstd). O cliente é um
+socket cru: conta os bytes que realmente passaram pelo fio (cabeçalhos + corpo, com os
+delimitadores do chunked), e a latência vai do envio da requisição até o corpo
+descomprimido. Com --banda o cliente limita a leitura à taxa dada (Mbit/s), simulando um
+enlace mais lento que o loopback.
+
+Uso:
+    python -m benchmarks.compressao --tarefas 50000 --servidor flask asgi
+    python -m benchmarks.compressao --tarefas 50000 --banda 100
+"""
+import argparse
+import gzip
+import os
+import socket
+import statistics
+import tempfile
+import time
+
+from app import compressao
+from benchmarks.carga import subir_servidor
+from benchmarks.dados import copiar_banco, garantir_banco_base
+
+CENARIOS = [
+    ('Listagem completa', '/tarefas'),
+    ('Listagem em fluxo', '/tarefas?stream=true'),
+    ('NDJSON', '/tarefas?formato=ndjson'),
+    ('Página de 50', '/tarefas?limite=50'),
+]
+
+def descompressores():
+    """Codificação -> função que devolve o corpo original"""
+    funcoes = {'identity': lambda dados: dados, 'gzip': gzip.decompress}
+    if 'br' in compressao.codificacoes:
+        import brotli
+        funcoes['br'] = brotli.decompress
+    if 'zstd' in compressao.codificacoes:
+        import zstandard
+        funcoes['zstd'] = lambda dados: zstandard.ZstdDecompressor().decompressobj().decompress(dados)
+    return funcoes
+
+DESCOMPRESSORES = descompressores()
+
+class Leitor:
+    """Leitura de um socket contando bytes e, opcionalmente, limitada a uma taxa"""
+
+    def __init__(self, conexao, banda_mbits=None):
+        self.conexao = conexao
+        self.bytes_por_segundo = banda_mbits * 125_000 if banda_mbits else None
+        self.buffer = b''
+        self.total = 0
+        self.inicio = time.perf_counter()
+
+    def receber(self):
+        pedaco = self.conexao.recv(65536)
+        if not pedaco:
+            raise ConnectionError('conexão fechada no meio da resposta')
+        self.total += len(pedaco)
+        if self.bytes_por_segundo:
+            atraso = self.total / self.bytes_por_segundo - (time.perf_counter() - self.inicio)
+            if atraso > 0:
+                time.sleep(atraso)
+        self.buffer += pedaco
+
+    def linha(self):
+        while b'\r\n' not in self.buffer:
+            self.receber()
+        linha, self.buffer = self.buffer.split(b'\r\n', 1)
+        return linha
+
+    def exatos(self, tamanho):
+        while len(self.buffer) < tamanho:
+            self.receber()
+        dados, self.buffer = self.buffer[:tamanho], self.buffer[tamanho:]
+        return dados
+
+def requisitar(porta, url, codificacao, banda):
+    """Retorna (bytes no fio, latência em ms, Content-Encoding, corpo descomprimido)"""
+    with socket.create_connection(('127.0.0.1', porta)) as conexao:
+        leitor = Leitor(conexao, banda)
+        conexao.sendall(f'GET {url} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept-Encoding: {codificacao}\r\n'
+                        f'Connection: close\r\n\r\n'.encode())
+        status = int(leitor.linha().split()[1])
+        cabecalhos = {}
+        while linha := leitor.linha():
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            cabecalhos[nome.strip().lower()] = valor.strip()
+        if cabecalhos.get('transfer-encoding') == 'chunked':
+            pedacos = []
+            while tamanho := int(leitor.linha().split(b';')[0], 16):
+                pedacos.append(leitor.exatos(tamanho))
+                leitor.linha()
+            leitor.linha()
+            corpo = b''.join(pedacos)
+        elif 'content-length' in cabecalhos:
+            corpo = leitor.exatos(int(cabecalhos['content-length']))
+        else:
+            while True:
+                try:
+                    leitor.receber()
+                except ConnectionError:
+                    break
+            corpo, leitor.buffer = leitor.buffer, b''
+        assert status == 200, status
+        recebida = cabecalhos.get('content-encoding', 'identity')
+        corpo = DESCOMPRESSORES[recebida](corpo)
+        return leitor.total, (time.perf_counter() - leitor.inicio) * 1000, recebida, corpo
+
+def medir(porta, url, codificacao, repeticoes, banda):
+    """Retorna (bytes no fio, latência mediana em ms, p95 em ms, codificação recebida, tamanho original)"""
+    _, _, _, original = requisitar(porta, url, codificacao, banda)  # aquecimento
+    tempos = []
+    for _ in range(repeticoes):
+        trafegados, tempo, recebida, corpo = requisitar(porta, url, codificacao, banda)
+        tempos.append(tempo)
+    assert len(corpo) == len(original)
+    tempos.sort()
+    return trafegados, statistics.median(tempos), tempos[int(0.95 * (len(tempos) - 1))], recebida, len(corpo)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tarefas', type=int, default=50000)
+    parser.add_argument('--servidor', nargs='+', choices=['flask', 'asgi'], default=['flask'])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--banda', type=float, default=None, help='limite de leitura do cliente em Mbit/s')
+    parser.add_argument('--porta', type=int, default=5091)
+    args = parser.parse_args()
+
+    base = garantir_banco_base(args.tarefas)
+    banda = f'{args.banda:g} Mbit/s' if args.banda else 'loopback'
+    for nome in args.servidor:
+        banco = os.path.join(tempfile.mkdtemp(prefix='compressao_'), 'compressao.db')
+        copiar_banco(base, banco)
+        processo = subir_servidor(nome, args.porta, banco)
+        try:
+            print(f"\n🗜️  {nome}: {args.tarefas} tarefas, {banda}, mínimo de {compressao.minimo} bytes")
+            print(f"{'Cenário':<20} {'Accept-Encoding':<16} {'Bytes no fio':>14} {'Razão':>7} "
+                  f"{'Mediana (ms)':>13} {'p95 (ms)':>10}")
+            for cenario, url in CENARIOS:
+                referencia = None
+                for codificacao in DESCOMPRESSORES:
+                    trafegados, mediana, p95, recebida, original = medir(
+                        args.porta, url, codificacao, args.repeticoes, args.banda)
+                    referencia = referencia or trafegados
+                    rotulo = codificacao if recebida == codificacao else f'{codificacao} ({recebida})'
+                    print(f"{cenario:<20} {rotulo:<16} {trafegados:>14,} {trafegados / referencia:>7.1%} "
+                          f"{mediana:>13.1f} {p95:>10.1f}")
+                    cenario = ''
+        finally:
+            processo.terminate()
+            processo.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Carga concorrente: servidor Flask (uma thread por conexão) x modo ASGI (asgi.py)
+
+Sobe cada servidor num subprocesso, sobre uma cópia do mesmo banco sintético, e dispara
+N clientes simultâneos por um tempo fixo, medindo vazão, latências, erros e a CPU gasta
+pelo servidor e pelo cliente. Cada cliente mantém uma conexão HTTP/1.1 keep-alive aberta.
+O cache de leitura fica desligado para que toda requisição vá ao banco.
+
+O gerador de carga é um cliente HTTP mínimo sobre asyncio: o pool de conexões de clientes
+como o httpx custa mais CPU que o próprio servidor com centenas de conexões, e numa máquina
+com poucos núcleos isso distorce a comparação.
+
+Respostas 429/503 (controle de admissão) contam como recusadas, não como erros: com
+--concorrencia-maxima 0 o servidor roda sem teto, para comparar com o padrão.
+
+Uso:
+    pip install starlette "uvicorn[standard]" aiosqlite
+    python -m benchmarks.concorrencia --clientes 500 --duracao 20
+    python -m benchmarks.concorrencia --clientes 500 --servidores asgi --concorrencia-maxima 0
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.carga import SERVIDORES, ConexaoHTTP, subir_servidor, tempo_de_cpu
+from benchmarks.dados import copiar_banco, preparar_banco
+
+def sortear_requisicao(total_tarefas, escritas):
+    """Mistura de leituras (listagem paginada, detalhe, filtro, estatísticas) e escritas"""
+    id = random.randint(1, total_tarefas)
+    if random.random() < escritas:
+        return 'PUT', f'/tarefas/{id}', {'prioridade': random.choice(['baixa', 'media', 'alta', 'urgente'])}
+    return random.choice([
+        ('GET', '/tarefas?limite=50', None),
+        ('GET', f'/tarefas/{id}', None),
+        ('GET', '/tarefas?status=pendente&limite=20', None),
+        ('GET', '/estatisticas', None),
+    ])
+
+async def disparar(porta, clientes, duracao, total_tarefas, escritas):
+    latencias, erros, recusadas = [], 0, 0
+    conexoes = [ConexaoHTTP(porta) for _ in range(clientes)]
+    await asyncio.gather(*(conexao.abrir() for conexao in conexoes))
+
+    async def cliente(conexao, fim):
+        nonlocal erros, recusadas
+        while time.perf_counter() < fim:
+            metodo, url, corpo = sortear_requisicao(total_tarefas, escritas)
+            inicio = time.perf_counter()
+            try:
+                status = await conexao.requisitar(metodo, url, corpo)
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                conexao.fechar()
+                erros += 1
+                continue
+            if status in (429, 503):
+                # Como um cliente que respeita o Retry-After (1 s no teto de concorrência)
+                recusadas += 1
+                await asyncio.sleep(1)
+            elif status >= 400:
+                erros += 1
+            else:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+        conexao.fechar()
+
+    inicio, cpu_inicial = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(cliente(conexao, inicio + duracao) for conexao in conexoes))
+    decorrido, cpu_cliente = time.perf_counter() - inicio, time.process_time() - cpu_inicial
+
+    percentis = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else [0.0] * 99
+    return {
+        'requisicoes': len(latencias),
+        'erros': erros,
+        'recusadas': recusadas,
+        'vazao_rps': round(len(latencias) / decorrido, 1),
+        'p50_ms': round(percentis[49], 1),
+        'p95_ms': round(percentis[94], 1),
+        'p99_ms': round(percentis[98], 1),
+        'cpu_cliente_ms_por_requisicao': round(cpu_cliente * 1000 / max(len(latencias), 1), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tarefas', type=int, default=10000)
+    parser.add_argument('--clientes', type=int, default=500)
+    parser.add_argument('--duracao', type=float, default=20, help='segundos de carga por servidor')
+    parser.add_argument('--escritas', type=float, default=0.1, help='fração de PUTs na mistura')
+    parser.add_argument('--servidores', nargs='+', choices=list(SERVIDORES), default=list(SERVIDORES))
+    parser.add_argument('--concorrencia-maxima', type=int,
+                        help='CONCORRENCIA_MAXIMA do servidor (padrão: o do app; 0 = sem teto)')
+    parser.add_argument('--saida', help='grava os resultados em JSON neste arquivo')
+    args = parser.parse_args()
+
+    preparar_banco(args.tarefas)
+    banco_original = os.environ['DATABASE_URL'].removeprefix('sqlite:///')
+
+    resultados = {}
+    for porta, nome in enumerate(args.servidores, start=8701):
+        banco = os.path.join(tempfile.mkdtemp(prefix=f'carga_{nome}_'), 'carga.db')
+        copiar_banco(banco_original, banco)
+        ambiente = {} if args.concorrencia_maxima is None else {'CONCORRENCIA_MAXIMA': str(args.concorrencia_maxima)}
+        processo = subir_servidor(nome, porta, banco, ambiente=ambiente)
+        try:
+            # Aquecimento: conexões do pool abertas e páginas do banco em cache
+            asyncio.run(disparar(porta, min(args.clientes, 20), 2, args.tarefas, 0))
+            cpu_inicial = tempo_de_cpu(processo)
+            resultado = asyncio.run(disparar(porta, args.clientes, args.duracao, args.tarefas, args.escritas))
+            if cpu_inicial is not None and resultado['requisicoes']:
+                cpu = tempo_de_cpu(processo) - cpu_inicial
+                resultado['cpu_ms_por_requisicao'] = round(cpu * 1000 / resultado['requisicoes'], 2)
+            resultados[nome] = resultado
+        finally:
+            processo.terminate()
+            processo.wait()
+
+    print(f"\n{args.clientes} clientes, {args.duracao:g}s, {args.tarefas} tarefas, "
+          f"{args.escritas:.0%} escritas, {os.cpu_count()} CPU(s)")
+    print(f"{'Servidor':<8} {'Req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'Erros':>7} "
+          f"{'Recusadas':>10} {'CPU/req (ms)':>13}")
+    for nome, r in resultados.items():
+        print(f"{nome:<8} {r['vazao_rps']:>8.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['erros']:>7} {r['recusadas']:>10} {r.get('cpu_ms_por_requisicao', '-'):>13}")
+
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            json.dump({'parametros': vars(args), 'resultados': resultados}, arquivo, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Gerador de dados sintéticos para os benchmarks
+
+Popula um banco SQLite com categorias e tarefas distribuídas entre status, prioridades,
+categorias, responsáveis e datas de vencimento. A geração é determinística (semente fixa):
+o mesmo tamanho gera sempre o mesmo banco. Os bancos-base ficam guardados numa pasta
+temporária e cada execução de benchmark trabalha numa cópia descartável.
+
+Uso:
+    python -m benchmarks.dados --tarefas 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Muda junto com a distribuição dos dados ou com o esquema, para não reaproveitar bancos antigos
+VERSAO_GERADOR = 5
+PASTA_BANCOS = os.path.join(tempfile.gettempdir(), 'gerenciador_tarefas_benchmarks')
+TOTAL_CATEGORIAS = 20
+TAMANHO_LOTE = 10000
+
+# Tarefas criadas ao longo de um ano a partir desta data
+DATA_INICIAL = datetime(2025, 1, 1)
+PERIODO = timedelta(days=365)
+
+PALAVRAS = [
+    'relatório', 'reunião', 'cliente', 'deploy', 'revisão', 'orçamento', 'backup', 'contrato',
+    'migração', 'auditoria', 'treinamento', 'fatura', 'planejamento', 'entrevista',
+    'documentação', 'teste', 'servidor', 'campanha', 'estoque', 'suporte'
+]
+RESPONSAVEIS = [f'Responsável {i}' for i in range(50)]
+SILABAS = ['ba', 'ce', 'di', 'fo', 'gu', 'la', 'me', 'ni', 'po', 'ru', 'sa', 'te', 'vi', 'xo', 'zu']
+TAMANHO_VOCABULARIO = 3000
+
+def gerar_texto(aleatorio, total_palavras):
+    """Texto corrido com frequência de palavras de Zipf, como texto real
+
+    As palavras do vocabulário não estão em PALAVRAS: a busca por essas só encontra
+    tarefas pelo título, e a seletividade não se confunde com a da descrição.
+    """
+    vocabulario = sorted({
+        ''.join(aleatorio.choices(SILABAS, k=aleatorio.randint(2, 4))) for _ in range(TAMANHO_VOCABULARIO * 2)
+    })[:TAMANHO_VOCABULARIO]
+    aleatorio.shuffle(vocabulario)
+    pesos = [1 / posicao for posicao in range(1, len(vocabulario) + 1)]
+    return ' '.join(aleatorio.choices(vocabulario, pesos, k=total_palavras))
+
+def caminho_banco_base(total_tarefas, semente=42):
+    return os.path.join(PASTA_BANCOS, f'tarefas_{total_tarefas}_s{semente}_v{VERSAO_GERADOR}.db')
+
+def copiar_banco(origem, destino):
+    """Cópia consistente do SQLite (inclui o que ainda está no WAL)"""
+    with sqlite3.connect(origem) as fonte, sqlite3.connect(destino) as alvo:
+        fonte.backup(alvo)
+
+def apontar_banco(caminho, cache=False):
+    """Faz a aplicação usar o banco informado; deve vir antes de qualquer import de app"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{caminho}'
+    os.environ['CACHE_HABILITADO'] = str(cache)
+    # Os clientes do benchmark são todos o mesmo cliente para o limitador
+    os.environ['LIMITE_HABILITADO'] = 'False'
+
+def gerar_tarefas(total_tarefas, ids_categorias, tamanho_descricao, semente):
+    """Linhas da tabela tarefa, em ordem de criação (ids crescentes com data_criacao)"""
+    from app import StatusTarefa, PrioridadeTarefa
+
+    aleatorio = random.Random(semente)
+    status = [StatusTarefa.PENDENTE, StatusTarefa.EM_ANDAMENTO, StatusTarefa.CONCLUIDA, StatusTarefa.CANCELADA]
+    pesos_status = [40, 25, 30, 5]
+    prioridades = [PrioridadeTarefa.BAIXA, PrioridadeTarefa.MEDIA, PrioridadeTarefa.ALTA, PrioridadeTarefa.URGENTE]
+    pesos_prioridade = [30, 40, 20, 10]
+    # Descrições são trechos de um texto longo, em posições sorteadas
+    texto = gerar_texto(aleatorio, 200000)
+    passo = PERIODO / max(total_tarefas, 1)
+
+    for i in range(total_tarefas):
+        data_criacao = DATA_INICIAL + passo * i
+        situacao = aleatorio.choices(status, pesos_status)[0]
+        inicio_descricao = aleatorio.randrange(len(texto) - tamanho_descricao) if tamanho_descricao else 0
+        tarefa = {
+            'titulo': f'{aleatorio.choice(PALAVRAS).capitalize()} {aleatorio.choice(PALAVRAS)} #{i + 1}',
+            'descricao': texto[inicio_descricao:inicio_descricao + tamanho_descricao] or None,
+            'status': situacao,
+            'prioridade': aleatorio.choices(prioridades, pesos_prioridade)[0],
+            'data_criacao': data_criacao,
+            # 80% com vencimento, entre 10 dias antes e 60 dias depois da criação
+            'data_vencimento': data_criacao + timedelta(days=aleatorio.randint(-10, 60))
+            if aleatorio.random() < 0.8 else None,
+            'data_conclusao': data_criacao + timedelta(days=aleatorio.randint(0, 20))
+            if situacao == StatusTarefa.CONCLUIDA else None,
+            'responsavel': aleatorio.choice(RESPONSAVEIS) if aleatorio.random() < 0.7 else None,
+            # 10% sem categoria
+            'categoria_id': aleatorio.choice(ids_categorias)
+            if ids_categorias and aleatorio.random() < 0.9 else None,
+        }
+        # Última escrita: a conclusão, quando houve
+        tarefa['data_atualizacao'] = tarefa['data_conclusao'] or data_criacao
+        yield tarefa
+
+def popular_banco(total_tarefas, total_categorias=TOTAL_CATEGORIAS, tamanho_descricao=200, semente=42):
+    """Cria o esquema, insere categorias e tarefas sintéticas e recalcula os contadores"""
+    from app import app, db, Categoria, Tarefa, inicializar_banco, recalcular_contadores
+
+    with app.app_context():
+        inicializar_banco()
+        ids_categorias = db.session.scalars(
+            db.insert(Categoria).returning(Categoria.id, sort_by_parameter_order=True),
+            [
+                {'nome': f'Categoria {i + 1}', 'cor': f'#{(i * 0x0b3c5d) % 0xffffff:06x}',
+                 'data_criacao': DATA_INICIAL}
+                for i in range(total_categorias)
+            ]
+        ).all() if total_categorias else []
+
+        # render_nulls: sem ele o ORM separa o lote em um INSERT por combinação de colunas nulas
+        inserir = db.insert(Tarefa).execution_options(render_nulls=True)
+        lote = []
+        for tarefa in gerar_tarefas(total_tarefas, ids_categorias, tamanho_descricao, semente):
+            lote.append(tarefa)
+            if len(lote) == TAMANHO_LOTE:
+                db.session.execute(inserir, lote)
+                lote = []
+        if lote:
+            db.session.execute(inserir, lote)
+        db.session.commit()
+        recalcular_contadores()
+
+def preparar_banco(total_tarefas, tamanho_descricao=200, cache=False, total_categorias=TOTAL_CATEGORIAS,
+                   semente=42):
+    """Banco temporário novo, populado na hora; retorna o app Flask"""
+    apontar_banco(os.path.join(tempfile.mkdtemp(prefix='benchmark_'), 'benchmark.db'), cache)
+    from app import app
+    popular_banco(total_tarefas, total_categorias, tamanho_descricao, semente)
+    return app
+
+def garantir_banco_base(total_tarefas, semente=42):
+    """Caminho do banco-base de N tarefas, gerado (num subprocesso) se ainda não existir"""
+    caminho = caminho_banco_base(total_tarefas, semente)
+    if not os.path.exists(caminho):
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.dados', '--tarefas', str(total_tarefas),
+             '--semente', str(semente), '--gerar'],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True
+        )
+    return caminho
+
+def preparar_copia(total_tarefas, cache=False, semente=42):
+    """Cópia descartável do banco-base de N tarefas; retorna (app Flask, caminho da cópia)"""
+    copia = os.path.join(tempfile.mkdtemp(prefix='benchmark_'), 'benchmark.db')
+    copiar_banco(garantir_banco_base(total_tarefas, semente), copia)
+    apontar_banco(copia, cache)
+    from app import app
+    return app, copia
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tarefas', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--gerar', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.gerar:
+        # Processo filho: gera um único banco-base (o app só pode apontar para um banco)
+        destino = caminho_banco_base(args.tarefas[0], args.semente)
+        temporario = f'{destino}.{os.getpid()}.tmp'
+        os.makedirs(PASTA_BANCOS, exist_ok=True)
+        apontar_banco(temporario)
+        inicio = time.perf_counter()
+        popular_banco(args.tarefas[0], semente=args.semente)
+        from app import app, db
+        with app.app_context():
+            db.engine.dispose()
+        os.replace(temporario, destino)
+        for sufixo in ('-wal', '-shm'):
+            if os.path.exists(temporario + sufixo):
+                os.remove(temporario + sufixo)
+        print(f"🎲 {args.tarefas[0]} tarefas geradas em {time.perf_counter() - inicio:.1f}s: {destino}")
+        return
+
+    for total in args.tarefas:
+        caminho = garantir_banco_base(total, args.semente)
+        print(f"💾 {total} tarefas: {caminho} ({os.path.getsize(caminho) / 1e6:.0f} MB)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark da exportação e da importação em massa (flask exportar / flask importar)
+
+Exporta uma cópia do banco-base em NDJSON e em CSV para arquivos temporários e importa
+cada arquivo num banco novo, medindo linhas por segundo. Uma segunda passada, com
+tracemalloc, mede o pico de memória de cada operação: ele não deve crescer com o número
+de tarefas. Como referência, mede também o caminho antigo de migração: uma amostra de
+tarefas regravadas uma a uma por POST /tarefas (test client, sem HTTP).
+
+Uso:
+    python -m benchmarks.exportacao --tarefas 50000
+    python -m benchmarks.exportacao --tarefas 10000 100000 --amostra-post 2000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+from benchmarks.dados import copiar_banco, garantir_banco_base
+
+def exportar(aplicacao, destino, formato, tipos):
+    contagem = Counter()
+    with open(destino, 'wb') as saida:
+        for pedaco in aplicacao.exportar_dados(formato, tipos, contagem):
+            saida.write(pedaco)
+    return sum(contagem.values())
+
+def importar(aplicacao, banco, entradas, tamanho_lote):
+    """Importa [(arquivo, formato, tipo)] num banco novo; retorna (linhas, erros)"""
+    app = aplicacao.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{banco}', 'CACHE_HABILITADO': False})
+    linhas = erros = 0
+    with app.app_context():
+        aplicacao.inicializar_banco()
+        for arquivo, formato, tipo in entradas:
+            with open(arquivo, encoding='utf-8', newline='') as entrada:
+                resultado = aplicacao.importar_dados(entrada, formato, tipo, tamanho_lote)
+            linhas += resultado['linhas']
+            erros += resultado['erros']
+    return linhas, erros
+
+def medir(funcao):
+    """(segundos, pico de memória em MB, resultado); o pico vem de uma segunda execução com tracemalloc"""
+    inicio = time.perf_counter()
+    resultado = funcao()
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcao()
+    pico = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return segundos, pico, resultado
+
+def replicar_por_post(aplicacao, banco, arquivo, amostra):
+    """Regrava as primeiras tarefas do NDJSON uma a uma por POST /tarefas; retorna linhas/s"""
+    app = aplicacao.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{banco}', 'CACHE_HABILITADO': False,
+                                'LIMITE_HABILITADO': False})
+    with app.app_context():
+        aplicacao.inicializar_banco()
+    cliente = app.test_client()
+    campos = ('titulo', 'descricao', 'status', 'prioridade', 'data_vencimento', 'responsavel')
+    tarefas = []
+    with open(arquivo, encoding='utf-8') as entrada:
+        for linha in entrada:
+            dados = json.loads(linha)
+            if dados['tipo'] == 'tarefa':
+                tarefas.append({campo: dados[campo] for campo in campos})
+                if len(tarefas) == amostra:
+                    break
+    inicio = time.perf_counter()
+    for tarefa in tarefas:
+        assert cliente.post('/tarefas', json=tarefa).status_code == 201
+    return len(tarefas) / (time.perf_counter() - inicio)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tarefas', type=int, nargs='+', default=[50000])
+    parser.add_argument('--lote', type=int, default=None, help='linhas por transação na importação')
+    parser.add_argument('--amostra-post', type=int, default=1000, help='tarefas regravadas por POST (0 = não mede)')
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix='exportacao_')
+    os.environ['LIMITE_HABILITADO'] = 'False'
+    import app as aplicacao
+    tamanho_lote = args.lote or aplicacao.IMPORTACAO_LOTE
+
+    print(f"\n{'Tarefas':>8} {'Operação':<28} {'Linhas':>8} {'Segundos':>9} {'Linhas/s':>10} "
+          f"{'Pico (MB)':>10} {'Arquivo (MB)':>13}")
+    for total in args.tarefas:
+        origem = os.path.join(pasta, f'origem_{total}.db')
+        copiar_banco(garantir_banco_base(total), origem)
+        app = aplicacao.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{origem}', 'CACHE_HABILITADO': False})
+        arquivos = {
+            'ndjson': os.path.join(pasta, f'tudo_{total}.ndjson'),
+            'categorias': os.path.join(pasta, f'categorias_{total}.csv'),
+            'tarefas': os.path.join(pasta, f'tarefas_{total}.csv'),
+        }
+        with app.app_context():
+            exportacoes = [
+                ('Exportar NDJSON', arquivos['ndjson'], 'ndjson', ('categoria', 'tarefa')),
+                ('Exportar CSV (tarefas)', arquivos['tarefas'], 'csv', ('tarefa',)),
+            ]
+            exportar(aplicacao, arquivos['categorias'], 'csv', ('categoria',))
+            for nome, destino, formato, tipos in exportacoes:
+                segundos, pico, linhas = medir(lambda: exportar(aplicacao, destino, formato, tipos))
+                print(f"{total:>8} {nome:<28} {linhas:>8} {segundos:>9.2f} {linhas / segundos:>10,.0f} "
+                      f"{pico:>10.1f} {os.path.getsize(destino) / 2**20:>13.1f}")
+
+        importacoes = [
+            ('Importar NDJSON', [(arquivos['ndjson'], 'ndjson', 'tarefa')]),
+            ('Importar CSV', [(arquivos['categorias'], 'csv', 'categoria'), (arquivos['tarefas'], 'csv', 'tarefa')]),
+        ]
+        for nome, entradas in importacoes:
+            bancos = iter(os.path.join(pasta, f'destino_{total}_{nome[-6:].strip()}_{i}.db') for i in range(2))
+            segundos, pico, (linhas, erros) = medir(lambda: importar(aplicacao, next(bancos), entradas, tamanho_lote))
+            assert not erros, f'{erros} linhas com erro'
+            tamanho = sum(os.path.getsize(arquivo) for arquivo, _, _ in entradas) / 2**20
+            print(f"{total:>8} {nome:<28} {linhas:>8} {segundos:>9.2f} {linhas / segundos:>10,.0f} "
+                  f"{pico:>10.1f} {tamanho:>13.1f}")
+
+        if args.amostra_post:
+            taxa = replicar_por_post(aplicacao, os.path.join(pasta, f'post_{total}.db'), arquivos['ndjson'],
+                                     args.amostra_post)
+            print(f"{total:>8} {'POST /tarefas um a um':<28} {args.amostra_post:>8} {args.amostra_post / taxa:>9.2f} "
+                  f"{taxa:>10,.0f}")
+
+if __name__ == '__main__':
+    main()
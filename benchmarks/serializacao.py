@@ -0,0 +1,65 @@
+"""Micro-benchmark da serialização de GET /tarefas: ORM + to_dict() x Core + conversão rápida
+
+Mede só a montagem do JSON da listagem completa (consulta, conversão e codificação),
+sem o custo HTTP, e confere que as duas saídas têm o mesmo conteúdo.
+
+Uso:
+    python -m benchmarks.serializacao --tarefas 10000 100000
+"""
+import argparse
+import time
+
+from benchmarks.dados import preparar_banco
+
+def caminho_orm(app, db, Tarefa):
+    tarefas = Tarefa.query.order_by(Tarefa.data_criacao, Tarefa.id).all()
+    resposta = app.json.response([tarefa.to_dict() for tarefa in tarefas]).get_data()
+    db.session.expunge_all()
+    return resposta
+
+def caminho_rapido(aplicacao, db, Tarefa):
+    colunas, conversores = aplicacao.colunas_rapidas(Tarefa.CAMPOS)
+    linhas = db.session.query(*colunas).select_from(Tarefa).order_by(Tarefa.data_criacao, Tarefa.id).all()
+    return aplicacao.codificar_json(list(aplicacao.linhas_para_dicts(linhas, Tarefa.CAMPOS, conversores)))
+
+def cronometrar(funcao, repeticoes):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor * 1000, resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tarefas', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    app = preparar_banco(max(args.tarefas))
+    import app as aplicacao
+    from app import db, Tarefa
+
+    orjson = aplicacao.orjson
+    print(f"\n{'Tarefas':>8} {'Caminho':<22} {'Melhor (ms)':>12} {'Aceleração':>11}")
+    with app.app_context():
+        for total in sorted(args.tarefas, reverse=True):
+            # Limita a tabela ao tamanho do cenário sem recriar o banco
+            db.session.execute(db.delete(Tarefa).where(Tarefa.id > total))
+            db.session.commit()
+
+            tempo_orm, saida_orm = cronometrar(lambda: caminho_orm(app, db, Tarefa), args.repeticoes)
+            print(f"{total:>8} {'ORM + to_dict':<22} {tempo_orm:>12.1f} {'1.00x':>11}")
+
+            for nome, codificador in [('Core + json', None), ('Core + orjson', orjson)]:
+                if nome.endswith('orjson') and orjson is None:
+                    print(f"{total:>8} {nome:<22} {'(orjson não instalado)':>24}")
+                    continue
+                aplicacao.orjson = codificador
+                tempo, saida = cronometrar(lambda: caminho_rapido(aplicacao, db, Tarefa), args.repeticoes)
+                assert saida + b'\n' == saida_orm, 'saída diferente da do jsonify'
+                print(f"{total:>8} {nome:<22} {tempo:>12.1f} {tempo_orm / tempo:>10.2f}x")
+            aplicacao.orjson = orjson
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Configuração do gunicorn para app.py
+
+Uso:
+    pip install gunicorn
+    flask --app app migrar        # esquema do banco, uma vez por implantação
+    gunicorn app:app
+
+Com preload_app o mestre importa o app uma única vez e os workers nascem por fork,
+compartilhando o código já carregado (copy-on-write). Importar o app não abre conexão
+nem cria tabelas, então não há nada do banco para os workers herdarem.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Cada fluxo de /eventos (SSE) ocupa uma thread enquanto o cliente estiver conectado: com
+# threads=1 um único assinante travaria o worker. Com threads > 1 o gunicorn usa o worker
+# gthread, e os fluxos por processo ficam limitados à metade das threads, para que as demais
+# sempre atendam as rotas comuns (os assinantes além disso recebem 503 com Retry-After; com
+# GUNICORN_THREADS=1, todos). Para muitos assinantes, sirva /eventos pelo asgi.py.
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+os.environ.setdefault('EVENTOS_MAX_ASSINANTES', str(threads // 2))
+preload_app = True
+
+def pre_fork(server, worker):
+    # Objetos do mestre saem das gerações do coletor: o gc dos workers não escreve nos
+    # cabeçalhos deles, e as páginas continuam compartilhadas
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Garantia: conexões que o mestre tenha aberto não podem ser usadas por dois processos
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
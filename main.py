@@ -1,36 +1,13 @@
 import os
-from flask import Flask, jsonify
-from flask_cors import CORS
-from dotenv import load_dotenv
+from app import create_app, inicializar_banco
 
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
-
-app = Flask(__name__)
-
-# Configurações da aplicação
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-app.config['DEBUG'] = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
-
-# Configurar CORS para permitir requisições do frontend
-CORS(app, origins=os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(','))
-
-@app.route('/')
-def hello_world():
-    return jsonify({
-        'message': 'Olá, mundo da API de Tarefas!',
-        'status': 'ativo',
-        'version': '1.0.0'
-    })
-
-@app.route('/health')
-def health_check():
-    return jsonify({
-        'status': 'healthy',
-        'timestamp': '2025-06-06'
-    })
+# Mesmo app de app.py (rotas, banco, CORS), criado pela fábrica
+app = create_app()
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento: cria/migra o banco antes de subir
+    with app.app_context():
+        inicializar_banco()
     port = int(os.getenv('FLASK_PORT', 5000))
     debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     app.run(host='127.0.0.1', port=port, debug=debug)
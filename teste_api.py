@@ -1,10 +1,20 @@
 import requests
 import json
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # URL base da API
 BASE_URL = 'http://127.0.0.1:5000'
 
+# Testes contra o servidor: 429 e 503 (limite por cliente, teto de concorrência) são
+# repetidos depois do Retry-After, como faria um cliente bem-comportado
+sessao_http = requests.Session()
+sessao_http.mount('http://', HTTPAdapter(max_retries=Retry(
+    total=10, status_forcelist=[429, 503], allowed_methods=None, respect_retry_after_header=True,
+    raise_on_status=False
+)))
+
 def imprimir_resposta(titulo, response):
     """Imprime resposta da API de forma organizada"""
     print(f"\n{'='*50}")
@@ -26,7 +36,7 @@ def testar_api_completa():
     try:
         # 1. Testar página inicial
         print("\n1️⃣ Testando página inicial...")
-        response = requests.get(f'{BASE_URL}/')
+        response = sessao_http.get(f'{BASE_URL}/')
         dados_api = imprimir_resposta("Informações da API", response)
         
         # 2. Criar categorias
@@ -39,7 +49,7 @@ def testar_api_completa():
         
         categorias_criadas = []
         for categoria in categorias_teste:
-            response = requests.post(
+            response = sessao_http.post(
                 f'{BASE_URL}/categorias',
                 json=categoria,
                 headers={'Content-Type': 'application/json'}
@@ -50,7 +60,7 @@ def testar_api_completa():
         
         # 3. Listar categorias
         print("\n3️⃣ Listando todas as categorias...")
-        response = requests.get(f'{BASE_URL}/categorias')
+        response = sessao_http.get(f'{BASE_URL}/categorias')
         imprimir_resposta("Lista de Categorias", response)
         
         # 4. Criar tarefas
@@ -95,7 +105,7 @@ def testar_api_completa():
         
         tarefas_criadas = []
         for tarefa in tarefas_teste:
-            response = requests.post(
+            response = sessao_http.post(
                 f'{BASE_URL}/tarefas',
                 json=tarefa,
                 headers={'Content-Type': 'application/json'}
@@ -106,17 +116,17 @@ def testar_api_completa():
         
         # 5. Listar todas as tarefas
         print("\n5️⃣ Listando todas as tarefas...")
-        response = requests.get(f'{BASE_URL}/tarefas')
+        response = sessao_http.get(f'{BASE_URL}/tarefas')
         imprimir_resposta("Lista Completa de Tarefas", response)
         
         # 6. Filtrar tarefas por status
         print("\n6️⃣ Filtrando tarefas por status 'pendente'...")
-        response = requests.get(f'{BASE_URL}/tarefas?status=pendente')
+        response = sessao_http.get(f'{BASE_URL}/tarefas?status=pendente')
         imprimir_resposta("Tarefas Pendentes", response)
         
         # 7. Filtrar tarefas por prioridade
         print("\n7️⃣ Filtrando tarefas por prioridade 'alta'...")
-        response = requests.get(f'{BASE_URL}/tarefas?prioridade=alta')
+        response = sessao_http.get(f'{BASE_URL}/tarefas?prioridade=alta')
         imprimir_resposta("Tarefas de Alta Prioridade", response)
         
         # 8. Atualizar uma tarefa
@@ -127,7 +137,7 @@ def testar_api_completa():
                 "status": "concluida",
                 "descricao": "Tarefa concluída com sucesso! ✅"
             }
-            response = requests.put(
+            response = sessao_http.put(
                 f'{BASE_URL}/tarefas/{tarefa_id}',
                 json=atualizacao,
                 headers={'Content-Type': 'application/json'}
@@ -138,23 +148,23 @@ def testar_api_completa():
         if tarefas_criadas:
             print("\n9️⃣ Obtendo tarefa específica...")
             tarefa_id = tarefas_criadas[0]['id']
-            response = requests.get(f'{BASE_URL}/tarefas/{tarefa_id}')
+            response = sessao_http.get(f'{BASE_URL}/tarefas/{tarefa_id}')
             imprimir_resposta(f"Tarefa ID {tarefa_id}", response)
         
         # 10. Estatísticas
         print("\n🔟 Obtendo estatísticas...")
-        response = requests.get(f'{BASE_URL}/estatisticas')
+        response = sessao_http.get(f'{BASE_URL}/estatisticas')
         imprimir_resposta("Estatísticas do Sistema", response)
         
         # 11. Testar erro (tarefa inexistente)
         print("\n1️⃣1️⃣ Testando erro (tarefa inexistente)...")
-        response = requests.get(f'{BASE_URL}/tarefas/999')
+        response = sessao_http.get(f'{BASE_URL}/tarefas/999')
         imprimir_resposta("Erro esperado - Tarefa não encontrada", response)
         
         # 12. Testar validação (criar tarefa sem título)
         print("\n1️⃣2️⃣ Testando validação (tarefa sem título)...")
         tarefa_invalida = {"descricao": "Tarefa sem título"}
-        response = requests.post(
+        response = sessao_http.post(
             f'{BASE_URL}/tarefas',
             json=tarefa_invalida,
             headers={'Content-Type': 'application/json'}
@@ -175,8 +185,10 @@ def testar_api_completa():
         print("❌ ERRO: Não foi possível conectar ao servidor.")
         print("💡 Certifique-se de que o servidor Flask está rodando:")
         print("   python app.py")
+        raise SystemExit(1)
     except Exception as e:
         print(f"❌ ERRO INESPERADO: {e}")
+        raise SystemExit(1)
 
 def testar_crud_simples():
     """Teste simples e rápido das funcionalidades básicas"""
@@ -185,7 +197,7 @@ def testar_crud_simples():
     try:
         # Criar categoria
         categoria = {"nome": "Teste Rápido", "cor": "#000000"}
-        response = requests.post(f'{BASE_URL}/categorias', json=categoria)
+        response = sessao_http.post(f'{BASE_URL}/categorias', json=categoria)
         print(f"✅ Categoria criada: {response.status_code}")
         
         # Criar tarefa
@@ -194,16 +206,16 @@ def testar_crud_simples():
             "descricao": "Apenas um teste rápido",
             "prioridade": "baixa"
         }
-        response = requests.post(f'{BASE_URL}/tarefas', json=tarefa)
+        response = sessao_http.post(f'{BASE_URL}/tarefas', json=tarefa)
         print(f"✅ Tarefa criada: {response.status_code}")
         
         # Listar tarefas
-        response = requests.get(f'{BASE_URL}/tarefas')
+        response = sessao_http.get(f'{BASE_URL}/tarefas')
         tarefas = response.json()
         print(f"✅ Tarefas listadas: {len(tarefas)} encontradas")
         
         # Estatísticas
-        response = requests.get(f'{BASE_URL}/estatisticas')
+        response = sessao_http.get(f'{BASE_URL}/estatisticas')
         stats = response.json()
         print(f"✅ Estatísticas: {stats['total_tarefas']} tarefas total")
         
@@ -211,21 +223,1863 @@ def testar_crud_simples():
         
     except Exception as e:
         print(f"❌ Erro no teste rápido: {e}")
+        raise SystemExit(1)
+
+def capturar_consultas(cliente, metodo, url, **kwargs):
+    """Executa a requisição no cliente de teste e retorna os comandos SQL emitidos"""
+    from sqlalchemy import event
+    from app import app, db
+
+    comandos = []
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', registrar)
+        try:
+            response = getattr(cliente, metodo)(url, **kwargs)
+            # Respostas em fluxo consultam o banco enquanto são lidas: lê tudo ainda aqui
+            response.get_data()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', registrar)
+    return comandos, response
+
+def contar_consultas(cliente, metodo, url):
+    """Executa a requisição no cliente de teste e conta os comandos SQL emitidos"""
+    comandos, response = capturar_consultas(cliente, metodo, url)
+    return len(comandos), response
+
+def importar_modo_asgi():
+    """(asgi, httpx) para as partes dos testes que usam o modo ASGI; (None, None) sem as dependências dele"""
+    try:
+        import httpx
+        import asgi
+    except ImportError as e:
+        print(f"⚠️  Modo ASGI indisponível ({e.name.split('.')[0]} não instalado: pip install -r requirements.txt); parte ASGI ignorada")
+        return None, None
+    return asgi, httpx
+
+def testar_consultas_por_requisicao():
+    """Garante que o número de consultas SQL não cresce com o número de categorias"""
+    print("🔬 TESTE DE CONSULTAS SQL POR REQUISIÇÃO")
+    from app import app, cache_leitura
+
+    # Com o cache ligado as leituras repetidas nem chegam ao banco
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categorias_criadas = []
+    tarefas_criadas = []
+    medicoes = {}
+
+    try:
+        for rodada in range(3):
+            # Cada rodada adiciona 5 categorias com 2 tarefas cada
+            for i in range(5):
+                response = cliente.post('/categorias', json={'nome': f'Consultas {sufixo} {rodada}-{i}'})
+                categoria_id = response.get_json()['id']
+                categorias_criadas.append(categoria_id)
+                for _ in range(2):
+                    response = cliente.post('/tarefas', json={'titulo': 'Tarefa de consulta', 'categoria_id': categoria_id})
+                    tarefas_criadas.append(response.get_json()['id'])
+
+            rotas = {
+                'listar_categorias': ('get', '/categorias'),
+                'obter_categoria': ('get', f'/categorias/{categorias_criadas[-1]}'),
+                'deletar_categoria (com tarefas)': ('delete', f'/categorias/{categorias_criadas[0]}'),
+            }
+            for nome, (metodo, url) in rotas.items():
+                total, response = contar_consultas(cliente, metodo, url)
+                medicoes.setdefault(nome, []).append(total)
+
+        for nome, totais in medicoes.items():
+            constante = len(set(totais)) == 1
+            print(f"{'✅' if constante else '❌'} {nome}: {totais} consultas")
+            assert constante, f'{nome} emite mais consultas conforme as categorias crescem'
+
+        print("\n🎉 Número de consultas constante em todas as rotas!")
+    finally:
+        for tarefa_id in tarefas_criadas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        for categoria_id in categorias_criadas:
+            cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_planos_de_consulta():
+    """Garante que nenhuma rota faz varredura completa das tabelas de tarefas sem índice"""
+    print("🔬 TESTE DE PLANOS DE CONSULTA (EXPLAIN QUERY PLAN)")
+    import app as aplicacao
+    from app import app, cache_leitura, db
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    response = cliente.post('/categorias', json={'nome': f'Planos {sufixo}'})
+    categoria_id = response.get_json()['id']
+    response = cliente.post('/tarefas', json={'titulo': 'Tarefa de plano', 'categoria_id': categoria_id})
+    tarefa_id = response.get_json()['id']
+
+    rotas = [
+        '/tarefas',
+        '/tarefas?limite=10',
+        '/tarefas?status=pendente&limite=10',
+        '/tarefas?status=pendente&prioridade=alta',
+        f'/tarefas?categoria_id={categoria_id}&limite=10',
+        '/tarefas?q=plano&limite=10',
+        '/tarefas?desde=2025-01-01T00:00:00&limite=10',
+        '/tarefas?incluir_arquivadas=true&limite=10',
+        f'/tarefas?incluir_arquivadas=true&categoria_id={categoria_id}&limite=10',
+        '/tarefas?incluir_arquivadas=true&status=concluida',
+        f'/tarefas/{tarefa_id}',
+        '/categorias',
+        f'/categorias/{categoria_id}',
+        '/estatisticas',
+    ]
+    falhas = []
+
+    try:
+        for url in rotas:
+            # Força o recálculo da contagem de vencidas para que a consulta apareça
+            app.extensions['cache_vencidas']['expira_em'] = 0.0
+            comandos, _ = capturar_consultas(cliente, 'get', url)
+            with app.app_context():
+                conexao = db.engine.raw_connection()
+                try:
+                    for statement, parameters in comandos:
+                        plano = aplicacao.plano_de_consulta(conexao, statement, parameters)
+                        # "SCAN tarefa" sem índice é uma leitura da tabela inteira
+                        varreduras = [passo for passo in plano if passo in ('SCAN tarefa', 'SCAN tarefa_arquivada')]
+                        print(f"{'❌' if varreduras else '✅'} GET {url}: {'; '.join(plano)}")
+                        if varreduras:
+                            falhas.append(url)
+                finally:
+                    conexao.close()
+
+        assert not falhas, f'Rotas sem índice: {falhas}'
+        print("\n🎉 Todas as rotas usam índices nas tabelas de tarefas!")
+    finally:
+        cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_sincronizacao():
+    """Garante que ?desde= devolve só as tarefas criadas, alteradas e removidas desde o token"""
+    print("🔬 TESTE DE SINCRONIZAÇÃO INCREMENTAL (?desde=)")
+    import app as aplicacao
+    from app import app, cache_leitura
+
+    cache_leitura.habilitado = False
+    # Sem margem, o token não reenvia as alterações dos últimos segundos
+    margem, aplicacao.SINCRONIZACAO_MARGEM = aplicacao.SINCRONIZACAO_MARGEM, 0
+    cliente = app.test_client()
+    ids = []
+
+    def sincronizar(desde, **parametros):
+        response = cliente.get('/tarefas', query_string={'desde': desde, **parametros})
+        assert response.status_code == 200, f'?desde=: {response.status_code} {response.get_data(as_text=True)}'
+        return response.get_json()
+
+    try:
+        token = sincronizar(datetime.utcnow().isoformat())['proximo_desde']
+        for i in range(3):
+            ids.append(cliente.post('/tarefas', json={'titulo': f'Sincronização {i}'}).get_json()['id'])
+
+        # Páginas de uma tarefa até o fim: as três criações, nenhuma a mais
+        recebidas, desde = [], token
+        for _ in range(5):
+            resposta = sincronizar(desde, limite=1)
+            recebidas += [tarefa['id'] for tarefa in resposta['tarefas']]
+            desde = resposta['proximo_desde']
+            if not resposta['mais']:
+                break
+        assert recebidas == ids, f'criações: {recebidas} (esperado {ids})'
+        token = desde
+        print(f"✅ Criações em páginas: {recebidas}")
+
+        cliente.put(f'/tarefas/{ids[0]}', json={'status': 'concluida'})
+        cliente.delete(f'/tarefas/{ids[1]}')
+        cliente.post('/tarefas/lote', json={'operacoes': [
+            {'operacao': 'atualizar', 'id': ids[2], 'dados': {'titulo': 'Sincronização alterada'}}
+        ]})
+        resposta = sincronizar(token)
+        alteradas = {tarefa['id']: tarefa for tarefa in resposta['tarefas']}
+        assert set(alteradas) == {ids[0], ids[2]}, f'alteradas: {sorted(alteradas)}'
+        assert resposta['removidas'] == [ids[1]], f"removidas: {resposta['removidas']}"
+        assert alteradas[ids[0]]['status'] == 'concluida' and not resposta['completo']
+        print(f"✅ Alteradas {sorted(alteradas)}, removidas {resposta['removidas']}")
+
+        resposta = sincronizar(resposta['proximo_desde'])
+        assert not resposta['tarefas'] and not resposta['removidas'], f'sem mudanças: {resposta}'
+        print("✅ Sem mudanças: resposta vazia")
+
+        # Desde mais antigo que a retenção: sincronização completa, marcada em todas as páginas
+        primeira = sincronizar('2000-01-01T00:00:00', limite=1)
+        segunda = sincronizar(primeira['proximo_desde'], limite=1)
+        assert primeira['completo'] and segunda['completo'], 'sincronização completa perdeu a marca'
+        print("✅ Sincronização completa marcada entre as páginas")
+
+        for parametros in ({'desde': 'ontem'}, {'desde': token, 'status': 'pendente'}):
+            status = cliente.get('/tarefas', query_string=parametros).status_code
+            assert status == 400, f'{parametros}: {status}'
+        print("✅ desde inválido ou com filtros: 400")
+
+        print("\n🎉 Sincronização incremental funcionando!")
+    finally:
+        aplicacao.SINCRONIZACAO_MARGEM = margem
+        for tarefa_id in ids:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+
+def testar_arquivamento():
+    """Garante que arquivar tira as tarefas da tabela quente sem mudar as estatísticas"""
+    print("🔬 TESTE DE ARQUIVAMENTO DE TAREFAS")
+    from collections import Counter
+    from app import (app, cache_leitura, db, Tarefa, TarefaArquivada, ajustar_contadores,
+                     arquivar_tarefas)
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'Arquivo {sufixo}'}).get_json()['id']
+    ids = [
+        cliente.post('/tarefas', json={'titulo': f'Arquivo {sufixo} {status}', 'status': status,
+                                       'categoria_id': categoria_id}).get_json()['id']
+        for status in ('concluida', 'cancelada', 'pendente')
+    ]
+    filtro = f'categoria_id={categoria_id}'
+    arquivadas = []
+
+    try:
+        # Só estas tarefas ficam mais antigas que a idade pedida
+        with app.app_context():
+            db.session.execute(db.update(Tarefa).where(Tarefa.id.in_(ids)).values(data_atualizacao=datetime(2000, 1, 1)))
+            db.session.commit()
+        originais = {id: cliente.get(f'/tarefas/{id}').get_json() for id in ids}
+        estatisticas = cliente.get('/estatisticas').get_json()
+        desde = cliente.get('/tarefas', query_string={'desde': datetime.utcnow().isoformat()}).get_json()['proximo_desde']
+
+        with app.app_context():
+            total = arquivar_tarefas((datetime.utcnow() - datetime(2001, 1, 1)).days, tamanho_lote=1, pausa=0)
+        arquivadas = ids[:2]
+        assert total == 2, f'{total} tarefas arquivadas (esperado 2)'
+        assert cliente.get('/estatisticas').get_json() == estatisticas, 'estatísticas mudaram ao arquivar'
+        print("✅ Concluída e cancelada arquivadas em lotes; estatísticas iguais")
+
+        ativas = [tarefa['id'] for tarefa in cliente.get(f'/tarefas?{filtro}').get_json()]
+        todas = [tarefa['id'] for tarefa in cliente.get(f'/tarefas?{filtro}&incluir_arquivadas=true').get_json()]
+        assert ativas == ids[2:] and todas == ids, f'ativas {ativas}, com arquivadas {todas}'
+        paginas, cursor = [], None
+        while True:
+            parametros = {'categoria_id': categoria_id, 'incluir_arquivadas': 'true', 'limite': 1}
+            pagina = cliente.get('/tarefas', query_string=dict(parametros, **({'cursor': cursor} if cursor else {}))).get_json()
+            paginas += [tarefa['id'] for tarefa in pagina['tarefas']]
+            cursor = pagina['proximo_cursor']
+            if not cursor:
+                break
+        assert paginas == ids, f'páginas com arquivadas: {paginas}'
+        busca = cliente.get(f'/tarefas?q=Arquivo {sufixo}&incluir_arquivadas=true').get_json()
+        assert sorted(tarefa['id'] for tarefa in busca) == ids, f'busca com arquivadas: {busca}'
+        print("✅ Listagem padrão só com ativas; ?incluir_arquivadas=true em lista, páginas e busca")
+
+        assert cliente.get(f'/tarefas/{ids[0]}').status_code == 404
+        arquivada = cliente.get(f'/tarefas/{ids[0]}?incluir_arquivadas=true').get_json()
+        assert arquivada == originais[ids[0]], f'arquivada: {arquivada}'
+        assert cliente.put(f'/tarefas/{ids[0]}', json={'titulo': 'x'}).status_code == 404
+        print("✅ Arquivada só por ?incluir_arquivadas=true, igual à original e somente leitura")
+
+        sincronizacao = cliente.get('/tarefas', query_string={'desde': desde}).get_json()
+        assert sorted(sincronizacao['removidas']) == arquivadas, f"removidas: {sincronizacao['removidas']}"
+        # Mesmo sem tarefas ativas com id maior, o id de uma arquivada não volta
+        cliente.delete(f'/tarefas/{ids[2]}')
+        novo = cliente.post('/tarefas', json={'titulo': 'Depois do arquivo'}).get_json()['id']
+        cliente.delete(f'/tarefas/{novo}')
+        assert novo > max(ids), f'id {novo} reaproveitado'
+        response = cliente.delete(f'/categorias/{categoria_id}')
+        assert response.status_code == 400, f'categoria com arquivadas removida: {response.status_code}'
+        # O total da categoria conta as mesmas tarefas que impedem removê-la
+        associadas = response.get_json()['tarefas_associadas']
+        totais = [cliente.get(f'/categorias/{categoria_id}').get_json()['total_tarefas']] + \
+            [categoria['total_tarefas'] for categoria in cliente.get('/categorias').get_json()
+             if categoria['id'] == categoria_id]
+        assert associadas == 2 and totais == [2, 2], f'associadas {associadas}, total_tarefas {totais}'
+        print("✅ Arquivadas saem em removidas no ?desde=; ids não reaproveitados; categoria protegida e com total igual")
+
+        print("\n🎉 Arquivamento funcionando!")
+    finally:
+        for tarefa_id in ids[2:]:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        # Arquivadas não têm rota de remoção: saem direto do banco, com os contadores
+        with app.app_context():
+            linhas = db.session.execute(db.delete(TarefaArquivada).where(TarefaArquivada.id.in_(arquivadas))
+                                        .returning(TarefaArquivada.status, TarefaArquivada.prioridade)).all()
+            removidas = Counter(tuple(linha) for linha in linhas)
+            ajustar_contadores(db.session.connection(), {chave: -total for chave, total in removidas.items()})
+            db.session.commit()
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_paginacao():
+    """Percorre GET /tarefas página a página pelo cursor, com filtros, e confere cursores inválidos"""
+    print("🔬 TESTE DE PAGINAÇÃO POR CURSOR")
+    from app import app, cache_leitura, codificar_cursor
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'Paginação {sufixo}'}).get_json()['id']
+    tarefas = [cliente.post('/tarefas', json={
+        'titulo': f'Paginação {sufixo} {i}', 'categoria_id': categoria_id,
+        'status': 'concluida' if i % 2 else 'pendente'
+    }).get_json()['id'] for i in range(7)]
+
+    def percorrer(parametros, durante=None):
+        ids, paginas, cursor = [], 0, None
+        while True:
+            response = cliente.get('/tarefas', query_string=dict(parametros, **({'cursor': cursor} if cursor else {})))
+            corpo = response.get_json()
+            assert response.status_code == 200 and corpo['limite'] == parametros['limite'], corpo
+            assert len(corpo['tarefas']) <= parametros['limite']
+            ids += [tarefa['id'] for tarefa in corpo['tarefas']]
+            paginas += 1
+            cursor = corpo['proximo_cursor']
+            if cursor is None:
+                return ids, paginas
+            if durante and paginas == 1:
+                durante()
+
+    try:
+        completa = [tarefa['id'] for tarefa in cliente.get(f'/tarefas?categoria_id={categoria_id}').get_json()]
+        assert completa == tarefas, completa
+        ids, paginas = percorrer({'categoria_id': categoria_id, 'limite': 2})
+        assert ids == tarefas and paginas == 4, (ids, paginas)
+        ids, paginas = percorrer({'categoria_id': categoria_id, 'status': 'concluida', 'limite': 1})
+        assert ids == tarefas[1::2] and paginas == 3, (ids, paginas)
+        print("✅ Páginas de 2 (e de 1, com status): mesma ordem da lista completa, sem repetir nem pular")
+
+        # Escritas entre as páginas não deslocam as seguintes (OFFSET deslocaria)
+        def escrever():
+            cliente.delete(f'/tarefas/{tarefas.pop(0)}')
+            tarefas.append(cliente.post('/tarefas', json={'titulo': f'Paginação {sufixo} nova',
+                                                          'categoria_id': categoria_id}).get_json()['id'])
+        ids, _ = percorrer({'categoria_id': categoria_id, 'limite': 3}, durante=escrever)
+        assert ids == completa[:3] + tarefas[2:], (ids, tarefas)
+        print("✅ Remoção e criação entre as páginas: nenhuma tarefa repetida ou pulada")
+
+        for parametros in ({'cursor': 'não é cursor'}, {'cursor': codificar_cursor('2025-01-01')},
+                           {'cursor': codificar_cursor('ontem', 1)}, {'limite': 0}, {'limite': 'dez'}):
+            response = cliente.get('/tarefas', query_string=dict(parametros, categoria_id=categoria_id))
+            assert response.status_code == 400 and 'erro' in response.get_json(), (parametros, response.status_code)
+        print("✅ Cursor ilegível, com partes a menos ou de tipo errado, e limite inválido: 400")
+
+        print("\n🎉 Paginação por cursor funcionando!")
+    finally:
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_contadores():
+    """Confere que /estatisticas (contadores mantidos nas escritas) bate com uma recontagem completa"""
+    print("🔬 TESTE DOS CONTADORES DE ESTATÍSTICAS")
+    from sqlalchemy import func
+    from app import app, cache_leitura, db, Tarefa, TarefaArquivada, StatusTarefa, PrioridadeTarefa
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    vencida = (datetime.now() - timedelta(days=2)).isoformat(timespec='seconds')
+    tarefas = []
+
+    def recontar():
+        """As mesmas estatísticas, contadas com GROUP BY nas duas tabelas"""
+        por_status = {status.value: 0 for status in StatusTarefa}
+        por_prioridade = {prioridade.value: 0 for prioridade in PrioridadeTarefa}
+        vencidas = 0
+        with app.app_context():
+            for modelo in (Tarefa, TarefaArquivada):
+                for status, prioridade, total in db.session.query(
+                    modelo.status, modelo.prioridade, func.count(modelo.id)
+                ).group_by(modelo.status, modelo.prioridade):
+                    por_status[status.value] += total
+                    por_prioridade[prioridade.value] += total
+                vencidas += db.session.query(func.count(modelo.id)).filter(
+                    modelo.data_vencimento < datetime.utcnow(), modelo.status != StatusTarefa.CONCLUIDA
+                ).scalar()
+        return sum(por_status.values()), por_status, por_prioridade, vencidas
+
+    def conferir(etapa):
+        estatisticas = cliente.get('/estatisticas').get_json()
+        obtido = (estatisticas['total_tarefas'], estatisticas['por_status'], estatisticas['por_prioridade'],
+                  estatisticas['tarefas_vencidas'])
+        esperado = recontar()
+        assert obtido == esperado, f'{etapa}: {obtido} != {esperado}'
+        print(f"✅ {etapa}: total {obtido[0]}, {obtido[3]} vencida(s), igual à recontagem")
+
+    try:
+        conferir('Antes das escritas')
+        for i, (status, prioridade) in enumerate([('pendente', 'alta'), ('em_andamento', 'baixa'), ('pendente', 'media')]):
+            tarefas.append(cliente.post('/tarefas', json={
+                'titulo': f'Contadores {sufixo} {i}', 'status': status, 'prioridade': prioridade,
+                'data_vencimento': vencida
+            }).get_json()['id'])
+        conferir('Depois de criar 3 tarefas vencidas')
+        cliente.patch(f'/tarefas/{tarefas[0]}', json={'status': 'concluida', 'prioridade': 'baixa'})
+        cliente.put(f'/tarefas/{tarefas[1]}', json={'titulo': f'Contadores {sufixo} editada', 'prioridade': 'alta'})
+        conferir('Depois de mudar status e prioridade')
+        # Só o vencimento: nenhum contador muda, mas a contagem de vencidas em cache não vale mais
+        cliente.patch(f'/tarefas/{tarefas[2]}', json={'data_vencimento': None})
+        conferir('Depois de mudar só o vencimento')
+        cliente.delete(f'/tarefas/{tarefas.pop()}')
+        response = cliente.post('/tarefas/lote', json={'operacoes': [
+            {'operacao': 'criar', 'dados': {'titulo': f'Contadores {sufixo} lote', 'status': 'cancelada'}},
+            {'operacao': 'atualizar', 'id': tarefas[1], 'dados': {'status': 'concluida'}},
+            {'operacao': 'deletar', 'id': tarefas[0]},
+        ]})
+        assert response.status_code == 200, response.get_json()
+        tarefas[0] = response.get_json()['resultados'][0]['id']
+        conferir('Depois de remover e de um lote')
+
+        print("\n🎉 Contadores sempre iguais à recontagem!")
+    finally:
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+
+def testar_fluxo():
+    """Confere as listagens em fluxo (?stream=true e NDJSON): mesmo conteúdo da lista, em pedaços"""
+    print("🔬 TESTE DE LISTAGEM EM FLUXO")
+    import app as aplicacao
+    from app import app, cache_leitura
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'Fluxo {sufixo}'}).get_json()['id']
+    tarefas = [cliente.post('/tarefas', json={'titulo': f'Fluxo {sufixo} {i}', 'categoria_id': categoria_id}).get_json()['id']
+               for i in range(5)]
+    # Lotes de 2 linhas: o fluxo das 5 tarefas atravessa várias leituras do cursor (yield_per)
+    tamanho_lote = aplicacao.TAMANHO_LOTE_FLUXO
+    aplicacao.TAMANHO_LOTE_FLUXO = 2
+
+    try:
+        base = f'/tarefas?categoria_id={categoria_id}'
+        lista = cliente.get(base)
+        response = cliente.get(f'{base}&stream=true', buffered=False)
+        assert response.is_streamed and 'Content-Length' not in response.headers
+        assert response.mimetype == 'application/json'
+        pedacos = [pedaco for pedaco in response.response if pedaco]
+        response.close()
+        assert len(pedacos) == len(tarefas) + 2, len(pedacos)
+        assert b''.join(pedacos) == lista.data, (b''.join(pedacos)[:200], lista.data[:200])
+        print(f"✅ ?stream=true: {len(pedacos)} pedaços (um por tarefa), juntos iguais à lista")
+
+        for parametros, cabecalhos in (('&formato=ndjson', {}), ('', {'Accept': 'application/x-ndjson'})):
+            response = cliente.get(base + parametros, headers=cabecalhos)
+            assert response.is_streamed and response.mimetype == 'application/x-ndjson', response.mimetype
+            linhas = response.data.splitlines()
+            assert [json.loads(linha) for linha in linhas] == lista.get_json()
+        print("✅ NDJSON por ?formato=ndjson e por Accept: uma tarefa por linha, iguais à lista")
+
+        response = cliente.get(f'{base}&stream=true&campos=id,titulo&status=concluida')
+        assert response.data == b'[]\n', response.data
+        response = cliente.get(f'{base}&formato=ndjson&campos=id,titulo')
+        assert [json.loads(linha) for linha in response.data.splitlines()] == \
+            [{'id': tarefa['id'], 'titulo': tarefa['titulo']} for tarefa in lista.get_json()]
+        assert cliente.get(f'{base}&stream=true&campos=nada').status_code == 400
+        print("✅ Fluxo com filtros e ?campos=; resultado vazio é []; campo inválido é 400 antes do fluxo")
+
+        print("\n🎉 Listagem em fluxo funcionando!")
+    finally:
+        aplicacao.TAMANHO_LOTE_FLUXO = tamanho_lote
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_condicional():
+    """Confere If-None-Match: 304 sem rodar a consulta da rota, e ETag novo depois de cada escrita"""
+    print("🔬 TESTE DE REQUISIÇÕES CONDICIONAIS (ETag)")
+    from app import app, cache_leitura
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'ETag {sufixo}'}).get_json()['id']
+    tarefa_id = cliente.post('/tarefas', json={'titulo': f'ETag {sufixo}', 'categoria_id': categoria_id}).get_json()['id']
+    tarefas = [tarefa_id]
+    rotas = ['/tarefas', f'/tarefas/{tarefa_id}', '/categorias', f'/categorias/{categoria_id}', '/estatisticas']
+
+    def etags():
+        return {url: cliente.get(url).headers['ETag'] for url in rotas}
+
+    try:
+        antes = etags()
+        for url, etag in antes.items():
+            comandos, response = capturar_consultas(cliente, 'get', url, headers={'If-None-Match': etag})
+            comandos = [sql for sql, _ in comandos if not sql.startswith('PRAGMA')]
+            assert response.status_code == 304 and response.data == b'', (url, response.status_code)
+            assert response.headers['ETag'] == etag and len(comandos) == 1, (url, comandos)
+            fraco = cliente.get(url, headers={'If-None-Match': f'"outro", W/{etag}'})
+            assert fraco.status_code == 304, url
+        print(f"✅ {len(rotas)} rotas: If-None-Match igual dá 304 sem corpo, com 1 consulta (a da versão)")
+
+        assert cliente.get('/tarefas?limite=1', headers={'If-None-Match': antes['/tarefas']}).status_code == 200
+        assert cliente.get('/tarefas', headers={'If-None-Match': antes['/tarefas'],
+                                                'Accept': 'application/x-ndjson'}).status_code == 200
+        print("✅ Outra URL ou outro Accept: outro ETag (200)")
+
+        for escrita in (lambda: tarefas.append(cliente.post('/tarefas', json={'titulo': f'ETag {sufixo} nova'}).get_json()['id']),
+                        lambda: cliente.patch(f'/tarefas/{tarefa_id}', json={'status': 'concluida'}),
+                        lambda: cliente.patch(f'/categorias/{categoria_id}', json={'cor': '#00ff00'}),
+                        lambda: cliente.delete(f'/tarefas/{tarefas.pop()}')):
+            escrita()
+            depois = etags()
+            for url in rotas:
+                assert depois[url] != antes[url], f'{url} manteve o ETag depois de uma escrita'
+                response = cliente.get(url, headers={'If-None-Match': antes[url]})
+                assert response.status_code == 200 and response.headers['ETag'] == depois[url], url
+            antes = depois
+        print("✅ Criar, editar tarefa, editar categoria e remover: todo ETag muda e o antigo volta a dar 200")
+
+        print("\n🎉 Requisições condicionais funcionando!")
+    finally:
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_busca():
+    """Confere a busca textual (?q=): acentos, todas as palavras, ordem por relevância e reconstrução do índice"""
+    print("🔬 TESTE DE BUSCA TEXTUAL (FTS5)")
+    from app import app, cache_leitura, db
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    dados = [
+        {'titulo': f'Reunião {sufixo}', 'descricao': 'Pauta longa da reunião de equipe, com orçamento, prazos, '
+                                                     'contratações e, no fim, o relatório do trimestre'},
+        {'titulo': f'Relatório {sufixo}', 'descricao': 'Relatório mensal de vendas'},
+        {'titulo': f'Outra {sufixo}', 'descricao': 'Sem a palavra buscada'},
+    ]
+    tarefas = [cliente.post('/tarefas', json=tarefa).get_json()['id'] for tarefa in dados]
+
+    def buscar(texto, **parametros):
+        response = cliente.get('/tarefas', query_string=dict(parametros, q=texto))
+        assert response.status_code == 200, (texto, response.get_json())
+        return [tarefa['id'] for tarefa in response.get_json()]
+
+    try:
+        with app.app_context():
+            if db.engine.dialect.name != 'sqlite':
+                print("⚠️  Banco sem FTS5: a busca usa LIKE, sem relevância; teste ignorado")
+                return
+
+        assert buscar(f'relatorio {sufixo}') == [tarefas[1], tarefas[0]]
+        assert buscar(f'RELATÓRIO {sufixo}') == [tarefas[1], tarefas[0]]
+        assert buscar(f'relatorio mensal {sufixo}') == [tarefas[1]]
+        print("✅ Sem acento e sem caixa, todas as palavras; o título com o termo vem antes da descrição longa")
+
+        paginas, cursor = [], None
+        while True:
+            response = cliente.get('/tarefas', query_string={'q': f'relatorio {sufixo}', 'limite': 1,
+                                                             **({'cursor': cursor} if cursor else {})})
+            corpo = response.get_json()
+            paginas += [tarefa['id'] for tarefa in corpo['tarefas']]
+            cursor = corpo['proximo_cursor']
+            if cursor is None:
+                break
+        assert paginas == [tarefas[1], tarefas[0]], paginas
+        print("✅ Páginas da busca seguem a ordem de relevância")
+
+        for texto in ('"', 'relat*', f'{sufixo} OR reuniao', 'NEAR(a b)', 'titulo:x'):
+            buscar(texto)
+        assert buscar(f'{sufixo} OR reuniao') == []
+        print("✅ Aspas, *, OR, NEAR e coluna: texto comum, nunca sintaxe do FTS5 (200)")
+
+        cliente.patch(f'/tarefas/{tarefas[2]}', json={'titulo': f'Relatório anual {sufixo}'})
+        assert buscar(f'anual {sufixo}') == [tarefas[2]] and buscar(f'outra {sufixo}') == []
+        print("✅ Edição reindexada pelos triggers: o título novo é achado, o antigo não")
+
+        with app.app_context():
+            with db.engine.begin() as conexao:
+                conexao.exec_driver_sql("INSERT INTO tarefa_fts(tarefa_fts) VALUES ('delete-all')")
+        assert buscar(f'relatorio {sufixo}') == []
+        resultado = app.test_cli_runner().invoke(args=['reconstruir-busca'])
+        assert resultado.exit_code == 0, resultado.output
+        assert buscar(f'relatorio {sufixo}') == [tarefas[1], tarefas[2], tarefas[0]], buscar(f'relatorio {sufixo}')
+        print("✅ Índice apagado: a busca não acha nada; flask reconstruir-busca devolve os resultados")
+
+        print("\n🎉 Busca textual funcionando!")
+    finally:
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+
+def testar_campos():
+    """Confere ?campos=: a resposta e o SELECT trazem só as colunas pedidas"""
+    print("🔬 TESTE DE PROJEÇÃO DE CAMPOS (?campos=)")
+    import re
+    from app import app, cache_leitura
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'Campos {sufixo}'}).get_json()['id']
+    tarefa_id = cliente.post('/tarefas', json={'titulo': f'Campos {sufixo}', 'descricao': 'Texto longo ' * 50,
+                                               'categoria_id': categoria_id}).get_json()['id']
+
+    def ler(url, tabela):
+        """Corpo da resposta e as colunas de tabela lidas pelo SELECT principal da rota"""
+        comandos, response = capturar_consultas(cliente, 'get', url)
+        assert response.status_code == 200, (url, response.get_json())
+        principais = [sql for sql, _ in comandos if re.search(rf'FROM {tabela}\b', sql) and 'versao_dados' not in sql]
+        assert len(principais) == 1, (url, principais)
+        return response.get_json(), set(re.findall(rf'\b{tabela}\.(\w+)', re.split(r'\sFROM\s', principais[0])[0]))
+
+    try:
+        casos = [
+            (f'/tarefas?categoria_id={categoria_id}&campos=titulo,status', 'tarefa', {'titulo', 'status'}),
+            (f'/tarefas?categoria_id={categoria_id}&campos=titulo&limite=5', 'tarefa', {'titulo', 'data_criacao', 'id'}),
+            (f'/tarefas?categoria_id={categoria_id}&campos=id&formato=ndjson', 'tarefa', {'id'}),
+            (f'/tarefas/{tarefa_id}?campos=titulo,prioridade', 'tarefa', {'id', 'titulo', 'prioridade'}),
+            ('/categorias?campos=id,nome', 'categoria', {'id', 'nome'}),
+        ]
+        for url, tabela, esperadas in casos:
+            corpo, colunas = ler(url, tabela)
+            assert colunas == esperadas, (url, colunas)
+            if corpo is None:  # NDJSON, conferido abaixo
+                continue
+            pedidos = set(url.split('campos=')[1].split('&')[0].split(','))
+            if isinstance(corpo, dict) and 'tarefas' in corpo:
+                corpo = corpo['tarefas']
+            for item in corpo if isinstance(corpo, list) else [corpo]:
+                assert set(item) == pedidos, (url, item)
+        resposta = cliente.get(f'/tarefas?categoria_id={categoria_id}&campos=id&formato=ndjson')
+        assert json.loads(resposta.data) == {'id': tarefa_id}
+        print(f"✅ {len(casos)} leituras: só as colunas pedidas no SELECT (mais a chave do cursor) e na resposta")
+
+        comandos, _ = capturar_consultas(cliente, 'get', '/categorias?campos=id,nome')
+        assert not any('count(' in sql for sql, _ in comandos), 'total_tarefas contado sem ser pedido'
+        comandos, response = capturar_consultas(cliente, 'get', '/categorias?campos=nome,total_tarefas')
+        assert any('count(' in sql for sql, _ in comandos)
+        assert {'nome': f'Campos {sufixo}', 'total_tarefas': 1} in response.get_json()
+        print("✅ /categorias só conta as tarefas quando total_tarefas é pedido")
+
+        for url in ('/tarefas?campos=senha', '/tarefas?campos=,', f'/tarefas/{tarefa_id}?campos=titulo,x',
+                    '/categorias?campos=cor,nada'):
+            response = cliente.get(url)
+            assert response.status_code == 400 and response.get_json()['erro'].startswith('Campos inválidos'), url
+        print("✅ Campo desconhecido ou lista vazia: 400")
+
+        print("\n🎉 Projeção de campos funcionando!")
+    finally:
+        cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_lote():
+    """Confere /tarefas/lote: corpo validado, lote atômico desfeito inteiro e lote parcial item a item"""
+    print("🔬 TESTE DE OPERAÇÕES EM LOTE")
+    from app import app, cache_leitura
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    tarefas = [cliente.post('/tarefas', json={'titulo': f'Lote {sufixo} {i}'}).get_json()['id'] for i in range(2)]
+
+    def total():
+        return cliente.get('/estatisticas').get_json()['total_tarefas']
+
+    try:
+        for corpo in ([{'operacao': 'deletar', 'id': tarefas[0]}],
+                      {'atomico': 'false', 'operacoes': [{'operacao': 'deletar', 'id': tarefas[0]}]},
+                      {'atomico': 0, 'operacoes': []}):
+            response = cliente.post('/tarefas/lote', json=corpo)
+            assert response.status_code == 400 and 'erro' in response.get_json(), (corpo, response.status_code)
+        assert cliente.get(f'/tarefas/{tarefas[0]}').status_code == 200
+        print("✅ Corpo que não é objeto e atomico que não é booleano: 400, nada gravado")
+
+        # true e false não são ids (em Python, bool é um int: true seria a tarefa 1)
+        primeira = cliente.get('/tarefas/1')
+        response = cliente.post('/tarefas/lote', json={'atomico': False, 'operacoes': [
+            {'operacao': 'deletar', 'id': True}, {'operacao': 'atualizar', 'id': False, 'dados': {'titulo': 'x'}}]})
+        corpo = response.get_json()
+        assert corpo['sucesso'] == 0 and [r['status'] for r in corpo['resultados']] == [400, 400], corpo
+        assert cliente.get('/tarefas/1').status_code == primeira.status_code
+        print("✅ id booleano: 400 por item, a tarefa 1 não é tocada")
+
+        antes = total()
+        operacoes = [
+            {'operacao': 'criar', 'dados': {'titulo': f'Lote {sufixo} nova'}},
+            {'operacao': 'atualizar', 'id': tarefas[0], 'dados': {'status': 'concluida'}},
+            {'operacao': 'deletar', 'id': tarefas[1]},
+            {'operacao': 'atualizar', 'id': 999999999, 'dados': {'titulo': 'Não existe'}},
+            {'operacao': 'criar', 'dados': {'titulo': 'Sem categoria', 'categoria_id': 999999999}},
+        ]
+        response = cliente.post('/tarefas/lote', json={'operacoes': operacoes})
+        corpo = response.get_json()
+        assert response.status_code == 400 and corpo['atomico'] is True, (response.status_code, corpo)
+        assert corpo['sucesso'] == 0 and corpo['falhas'] == 2, corpo
+        assert [r.get('status') for r in corpo['resultados']] == [None, None, None, 404, 400], corpo['resultados']
+        assert total() == antes and cliente.get(f'/tarefas/{tarefas[0]}').get_json()['status'] == 'pendente'
+        assert cliente.get(f'/tarefas/{tarefas[1]}').status_code == 200
+        assert not cliente.get('/tarefas', query_string={'q': f'"Lote {sufixo} nova"'}).get_json()
+        print("✅ Lote atômico com 2 operações inválidas: 400 e nenhuma das 3 válidas gravada")
+
+        response = cliente.post('/tarefas/lote', json={'atomico': False, 'operacoes': operacoes})
+        corpo = response.get_json()
+        assert response.status_code == 200 and corpo['atomico'] is False, (response.status_code, corpo)
+        assert corpo['sucesso'] == 3 and corpo['falhas'] == 2, corpo
+        assert [r['status'] for r in corpo['resultados']] == [201, 200, 200, 404, 400], corpo['resultados']
+        assert corpo['resultados'][4]['erro'] == 'Categoria 999999999 não encontrada', corpo['resultados'][4]
+        tarefas.append(corpo['resultados'][0]['id'])
+        assert cliente.get(f'/tarefas/{tarefas[-1]}').get_json()['titulo'] == f'Lote {sufixo} nova'
+        assert cliente.get('/tarefas', query_string={'q': f'"Lote {sufixo} nova"'}).get_json()
+        assert cliente.get(f'/tarefas/{tarefas[0]}').get_json()['status'] == 'concluida'
+        assert cliente.get(f'/tarefas/{tarefas[1]}').status_code == 404 and total() == antes
+        print("✅ Lote parcial: as 3 válidas gravadas, as 2 inválidas com erro por item")
+
+        print("\n🎉 Operações em lote funcionando!")
+    finally:
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+
+def testar_cache():
+    """Confere acerto, falha e invalidação do cache de leitura, também com dois workers no mesmo banco"""
+    print("🔬 TESTE DO CACHE DE LEITURA")
+    from app import app, cache_leitura, create_app
+
+    # Dois apps no mesmo banco, cada um com o seu cache: dois workers do gunicorn
+    outro = create_app({'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'], 'CACHE_HABILITADO': True,
+                        'LIMITE_HABILITADO': False})
+    habilitado, cache_leitura.habilitado = cache_leitura.habilitado, True
+    cache_leitura.limpar()
+    cliente, worker = app.test_client(), outro.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'Cache {sufixo}'}).get_json()['id']
+    tarefas = [cliente.post('/tarefas', json={'titulo': f'Cache {sufixo} {i}', 'categoria_id': categoria_id}).get_json()['id']
+               for i in range(2)]
+
+    def contadores(http):
+        estatisticas = http.get('/cache').get_json()
+        return estatisticas['acertos'], estatisticas['falhas']
+
+    def ler(http, url, **kwargs):
+        antes = contadores(http)
+        response = http.get(url, **kwargs)
+        depois = contadores(http)
+        return response, (depois[0] - antes[0], depois[1] - antes[1])
+
+    try:
+        url = f'/tarefas/{tarefas[0]}'
+        primeira, delta_primeira = ler(cliente, url)
+        segunda, delta_segunda = ler(cliente, url)
+        assert (delta_primeira, delta_segunda) == ((0, 1), (1, 0)), (delta_primeira, delta_segunda)
+        assert segunda.get_json() == primeira.get_json() and segunda.headers['ETag'] == primeira.headers['ETag']
+        print("✅ 1ª leitura é falha, a 2ª é acerto com o mesmo corpo e ETag")
+
+        cliente.patch(f'/tarefas/{tarefas[1]}', json={'titulo': f'Cache {sufixo} outra'})
+        _, delta = ler(cliente, url)
+        assert delta == (1, 0), f'escrita em outra tarefa tirou esta do cache: {delta}'
+        cliente.patch(url, json={'titulo': f'Cache {sufixo} editada'})
+        response, delta = ler(cliente, url)
+        assert delta == (0, 1) and response.get_json()['titulo'] == f'Cache {sufixo} editada', (delta, response.get_json())
+        print("✅ Escrita na tarefa invalida; escrita em outra tarefa não")
+
+        # O outro worker guardou a tarefa e a categoria antes de uma escrita feita neste
+        antiga = worker.get(url)
+        categoria = worker.get(f'/categorias/{categoria_id}')
+        assert worker.get(url).get_json() == antiga.get_json() and categoria.get_json()['total_tarefas'] == 2
+        cliente.patch(url, json={'titulo': f'Cache {sufixo} no outro worker'})
+        tarefas.append(cliente.post('/tarefas', json={'titulo': f'Cache {sufixo} 2', 'categoria_id': categoria_id}).get_json()['id'])
+        nova = worker.get(url)
+        corpo = nova.get_json()
+        assert corpo['titulo'] == f'Cache {sufixo} no outro worker', f'corpo antigo do cache: {corpo}'
+        assert nova.headers['ETag'].startswith(f'"{corpo["versao"]}.') and nova.headers['ETag'] != antiga.headers['ETag']
+        assert worker.get(f'/categorias/{categoria_id}').get_json()['total_tarefas'] == 3
+        assert worker.get(url, headers={'If-None-Match': antiga.headers['ETag']}).status_code == 200
+        print("✅ Escrita em outro worker: corpo, ETag e total_tarefas novos, sem esperar o TTL")
+
+        # If-Match com o ETag velho é recusado; com o ETag lido do cache, aceito
+        assert worker.patch(url, json={'status': 'em_andamento'}, headers={'If-Match': antiga.headers['ETag']}).status_code == 412
+        response = worker.patch(url, json={'status': 'em_andamento'}, headers={'If-Match': nova.headers['ETag']})
+        assert response.status_code == 200, response.get_json()
+        print("✅ If-Match com o ETag antigo: 412; com o do corpo atual: 200")
+
+        print("\n🎉 Cache de leitura funcionando!")
+    finally:
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+        cache_leitura.habilitado = habilitado
+        cache_leitura.limpar()
+        with outro.app_context():
+            from app import db
+            db.engine.dispose()
+
+def testar_serializacao():
+    """Confere que o caminho rápido (Core + codificar_json) gera os mesmos bytes do jsonify(to_dict())"""
+    print("🔬 TESTE DE SERIALIZAÇÃO RÁPIDA")
+    import app as aplicacao
+    from flask import jsonify
+    from app import app, cache_leitura, codificar_json, Tarefa
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'Serialização {sufixo}'}).get_json()['id']
+    textos = ['Ação', 'Revisão do relatório – versão “final”', 'Emoji 😀 e 𝄞', 'Barra \\x e aspas "', 'DEL \x7f e\ttab']
+    tarefas = [
+        cliente.post('/tarefas', json={
+            'titulo': texto, 'descricao': texto[::-1], 'responsavel': 'João', 'categoria_id': categoria_id,
+            'prioridade': 'alta', 'data_vencimento': '2030-01-01T12:30:00'
+        }).get_json()['id']
+        for texto in textos
+    ]
+    orjson = aplicacao.orjson
+
+    try:
+        for nome, codificador in [('orjson', orjson), ('json padrão', None)]:
+            if nome == 'orjson' and orjson is None:
+                print("⚠️  orjson não instalado: só o json padrão é conferido")
+                continue
+            aplicacao.orjson = codificador
+            with app.app_context():
+                esperado = [t.to_dict() for t in Tarefa.query.filter(Tarefa.categoria_id == categoria_id)
+                            .order_by(Tarefa.data_criacao, Tarefa.id)]
+                lista = jsonify(esperado).get_data()
+                item = jsonify(esperado[0]).get_data()
+                ndjson = [jsonify(tarefa).get_data() for tarefa in esperado]
+                assert codificar_json(esperado) + b'\n' == lista
+                assert codificar_json({'v': [1e-05, 1e16, 0.5, 2 ** 70, 'ç']}) + b'\n' == \
+                    jsonify({'v': [1e-05, 1e16, 0.5, 2 ** 70, 'ç']}).get_data()
+            response = cliente.get(f'/tarefas?categoria_id={categoria_id}')
+            assert response.data == lista, (response.data[:200], lista[:200])
+            assert b'\\u00e7\\u00e3o' in response.data and b'\\ud83d\\ude00' in response.data and b'\\u007f' in response.data
+            assert cliente.get(f'/tarefas/{tarefas[0]}').data == item
+            linhas = cliente.get(f'/tarefas?categoria_id={categoria_id}&formato=ndjson').data.splitlines()
+            assert [linha + b'\n' for linha in linhas] == ndjson
+            print(f"✅ {nome}: lista, item e NDJSON iguais ao jsonify(to_dict()), byte a byte")
+
+        print("\n🎉 Serialização rápida idêntica ao jsonify!")
+    finally:
+        aplicacao.orjson = orjson
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_idempotencia():
+    """Garante que retentativas com o mesmo Idempotency-Key não gravam de novo"""
+    print("🔬 TESTE DE IDEMPOTÊNCIA (Idempotency-Key)")
+    import asyncio
+    import threading
+    from app import app, cache_leitura, db, ChaveIdempotencia, Tarefa
+    asgi, httpx = importar_modo_asgi()
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    titulo = f'Idempotente {sufixo}'
+    tarefas, categorias = set(), set()
+
+    def contar(titulo):
+        with app.app_context():
+            return db.session.query(Tarefa).filter(Tarefa.titulo == titulo).count()
+
+    try:
+        chave = {'Idempotency-Key': f'tarefa-{sufixo}'}
+        primeira = cliente.post('/tarefas', json={'titulo': titulo}, headers=chave)
+        repetida = cliente.post('/tarefas', json={'titulo': titulo}, headers=chave)
+        tarefas.update(r.get_json()['id'] for r in (primeira, repetida))
+        assert primeira.status_code == repetida.status_code == 201, (primeira.status_code, repetida.status_code)
+        assert repetida.get_json() == primeira.get_json() and repetida.headers.get('Idempotent-Replayed') == 'true'
+        assert 'Idempotent-Replayed' not in primeira.headers and contar(titulo) == 1
+        print("✅ Retentativa repete a resposta (201, mesmo id) sem criar outra tarefa")
+
+        response = cliente.post('/tarefas', json={'titulo': 'Outro corpo'}, headers=chave)
+        assert response.status_code == 422, response.status_code
+        response = cliente.post('/tarefas', json={'titulo': titulo}, headers={'Idempotency-Key': 'x' * 256})
+        assert response.status_code == 400, response.status_code
+        print("✅ Mesma chave com outro corpo: 422; chave longa demais: 400")
+
+        # Erros não são guardados: a chave continua livre para a requisição corrigida
+        erro_chave = {'Idempotency-Key': f'erro-{sufixo}'}
+        assert cliente.post('/tarefas', json={}, headers=erro_chave).status_code == 400
+        response = cliente.post('/tarefas', json={'titulo': f'{titulo} corrigida'}, headers=erro_chave)
+        tarefas.add(response.get_json()['id'])
+        assert response.status_code == 201 and 'Idempotent-Replayed' not in response.headers
+        print("✅ Resposta de erro não fica guardada")
+
+        # Categorias: nome repetido é 409; a retentativa com chave repete o 201 original
+        nome = {'nome': f'Idempotente {sufixo}'}
+        chave_categoria = {'Idempotency-Key': f'categoria-{sufixo}'}
+        response = cliente.post('/categorias', json=nome, headers=chave_categoria)
+        categorias.add(response.get_json()['id'])
+        repetida = cliente.post('/categorias', json=nome, headers=chave_categoria)
+        assert repetida.status_code == 201 and repetida.get_json()['id'] == response.get_json()['id']
+        response = cliente.post('/categorias', json=nome)
+        assert response.status_code == 409 and 'Já existe' in response.get_json()['erro'], response.status_code
+        outra = cliente.post('/categorias', json={'nome': f'Outra {sufixo}'}).get_json()['id']
+        categorias.add(outra)
+        assert cliente.put(f'/categorias/{outra}', json=nome).status_code == 409
+        print("✅ Categoria com nome repetido: 409 (criação e atualização); retentativa com chave: 201")
+
+        # Chave vencida: a requisição roda de novo
+        with app.app_context():
+            db.session.execute(db.update(ChaveIdempotencia).where(ChaveIdempotencia.chave == chave['Idempotency-Key'])
+                               .values(data_criacao=datetime(2000, 1, 1)))
+            db.session.commit()
+        response = cliente.post('/tarefas', json={'titulo': titulo}, headers=chave)
+        tarefas.add(response.get_json()['id'])
+        assert 'Idempotent-Replayed' not in response.headers and contar(titulo) == 2
+        with app.app_context():
+            vencidas = db.session.query(ChaveIdempotencia).filter(ChaveIdempotencia.data_criacao < datetime(2001, 1, 1)).count()
+        assert vencidas == 0, f'{vencidas} chaves vencidas não apagadas'
+        print("✅ Depois do TTL a chave expira e as vencidas são apagadas")
+
+        # Retentativas simultâneas: uma só grava, todas recebem a mesma tarefa
+        concorrente = f'Concorrente {sufixo}'
+        respostas = []
+        def postar():
+            respostas.append(app.test_client().post('/tarefas', json={'titulo': concorrente},
+                                                     headers={'Idempotency-Key': f'concorrente-{sufixo}'}))
+        threads = [threading.Thread(target=postar) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ids = {r.get_json().get('id') for r in respostas}
+        tarefas.update(id for id in ids if id)
+        assert [r.status_code for r in respostas] == [201] * 8 and len(ids) == 1 and contar(concorrente) == 1, \
+            [(r.status_code, r.get_json()) for r in respostas]
+        print("✅ 8 requisições simultâneas com a mesma chave: 1 tarefa criada")
+
+        # Modo ASGI: mesma tabela de chaves, então a retentativa pode cair em outro servidor
+        if asgi:
+            async def no_asgi():
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.app), base_url='http://asgi') as http:
+                    try:
+                        repetida = await http.post('/tarefas', json={'titulo': concorrente},
+                                                   headers={'Idempotency-Key': f'concorrente-{sufixo}'})
+                        conflito = await http.post('/categorias', json=nome)
+                        return repetida, conflito
+                    finally:
+                        await asgi.motor.dispose()
+            repetida, conflito = asyncio.run(no_asgi())
+            assert repetida.status_code == 201 and repetida.json()['id'] in ids, repetida.text
+            assert repetida.headers.get('idempotent-replayed') == 'true' and conflito.status_code == 409
+            print("✅ ASGI repete a resposta gravada pelo Flask e responde 409 ao nome repetido")
+
+        print("\n🎉 Idempotência funcionando!")
+    finally:
+        for tarefa_id in tarefas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        for categoria_id in categorias:
+            cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_concorrencia_otimista():
+    """Garante que If-Match evita sobrescrever a edição de outro cliente (412), sem SELECT antes do UPDATE"""
+    print("🔬 TESTE DE CONCORRÊNCIA OTIMISTA (If-Match e PATCH)")
+    import asyncio
+    import threading
+    from app import app, cache_leitura, ContadorTarefa, recalcular_contadores
+    asgi, httpx = importar_modo_asgi()
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria = cliente.post('/categorias', json={'nome': f'Versões {sufixo}'})
+    categoria_id = categoria.get_json()['id']
+    criada = cliente.post('/tarefas', json={'titulo': f'Versões {sufixo}', 'descricao': 'original',
+                                            'categoria_id': categoria_id})
+    tarefa_id = criada.get_json()['id']
+    url = f'/tarefas/{tarefa_id}'
+
+    def contadores():
+        with app.app_context():
+            return {(contador.status, contador.prioridade): contador.total for contador in ContadorTarefa.query}
+
+    try:
+        assert criada.get_json()['versao'] == 1 and criada.headers['ETag'] == '"1"', criada.headers
+        leitura = cliente.get(url)
+        assert leitura.headers['ETag'].startswith('"1.'), leitura.headers['ETag']
+        assert cliente.get(url, headers={'If-None-Match': leitura.headers['ETag']}).status_code == 304
+        print("✅ POST devolve versao 1 e ETag; o ETag do GET leva a versão e ainda responde 304")
+
+        # O ETag do GET serve de If-Match; o PATCH só toca nos campos enviados
+        comandos, response = capturar_consultas(cliente, 'patch', url, json={'titulo': f'Editada {sufixo}'},
+                                                headers={'If-Match': leitura.headers['ETag']})
+        tarefa = response.get_json()
+        assert response.status_code == 200 and response.headers['ETag'] == '"2"', (response.status_code, tarefa)
+        assert tarefa['versao'] == 2 and tarefa['descricao'] == 'original', tarefa
+        primeiro = next(statement for statement, _ in comandos if 'tarefa' in statement)
+        assert primeiro.startswith('UPDATE tarefa'), f'antes do UPDATE: {primeiro}'
+        print(f"✅ PATCH com If-Match: um UPDATE condicional sem SELECT antes ({len(comandos)} comandos)")
+
+        response = cliente.patch(url, json={'titulo': 'Sobrescrita'}, headers={'If-Match': leitura.headers['ETag']})
+        assert response.status_code == 412 and response.get_json()['versao_atual'] == 2, response.get_json()
+        assert cliente.get(url).get_json()['titulo'] == f'Editada {sufixo}'
+        assert cliente.delete(url, headers={'If-Match': '"1"'}).status_code == 412
+        assert cliente.patch('/tarefas/999999999', json={'titulo': 'x'}, headers={'If-Match': '"1"'}).status_code == 404
+        assert cliente.patch(url, json={'status': 'invalido'}, headers={'If-Match': '"2"'}).status_code == 400
+        print("✅ Versão antiga: 412 no PATCH e no DELETE, sem gravar; inexistente: 404")
+
+        # Sem If-Match (clientes antigos) o PUT continua gravando; * vale para qualquer versão
+        response = cliente.put(url, json={'prioridade': 'alta'})
+        assert response.status_code == 200 and response.get_json()['versao'] == 3, response.get_json()
+        response = cliente.patch(url, json={'prioridade': 'media'}, headers={'If-Match': '*'})
+        assert response.status_code == 200 and response.get_json()['versao'] == 4, response.get_json()
+        print("✅ PUT sem If-Match e PATCH com If-Match: * continuam gravando")
+
+        # Editores simultâneos com a mesma versão: só um grava
+        respostas = []
+        def editar(numero):
+            respostas.append(app.test_client().patch(url, json={'status': 'em_andamento', 'responsavel': str(numero)},
+                                                      headers={'If-Match': '"4"'}))
+        threads = [threading.Thread(target=editar, args=(numero,)) for numero in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        status = sorted(response.status_code for response in respostas)
+        assert status == [200] + [412] * 7, status
+        vencedora = next(response.get_json() for response in respostas if response.status_code == 200)
+        assert cliente.get(url).get_json() == vencedora and vencedora['versao'] == 5, vencedora
+        print("✅ 8 PATCH simultâneos com a mesma versão: 1 grava, 7 recebem 412")
+
+        # Mudanças de status pelo UPDATE condicional mantêm os contadores exatos
+        response = cliente.patch(url, json={'status': 'concluida'}, headers={'If-Match': '"5"'})
+        assert response.status_code == 200 and response.get_json()['data_conclusao'], response.get_json()
+        atuais = contadores()
+        with app.app_context():
+            recalcular_contadores()
+        assert contadores() == atuais, 'contadores divergem da recontagem'
+        lote = cliente.post('/tarefas/lote', json={'operacoes': [
+            {'operacao': 'atualizar', 'id': tarefa_id, 'dados': {'responsavel': 'lote'}}
+        ]})
+        assert lote.status_code == 200 and cliente.get(url).get_json()['versao'] == 7
+        print("✅ Contadores iguais à recontagem; o lote também incrementa a versão")
+
+        # Categorias: mesmo contrato
+        etag = cliente.get(f'/categorias/{categoria_id}').headers['ETag']
+        response = cliente.patch(f'/categorias/{categoria_id}', json={'cor': '#123456'}, headers={'If-Match': etag})
+        assert response.status_code == 200 and response.get_json()['versao'] == 2, response.get_json()
+        assert response.get_json()['nome'] == f'Versões {sufixo}' and response.get_json()['total_tarefas'] == 1
+        response = cliente.patch(f'/categorias/{categoria_id}', json={'cor': '#654321'}, headers={'If-Match': etag})
+        assert response.status_code == 412, response.status_code
+        print("✅ Categoria: PATCH com If-Match e 412 com a versão antiga")
+
+        # Modo ASGI: mesmas operações, mesmo ETag
+        if asgi:
+            async def no_asgi():
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.app), base_url='http://asgi') as http:
+                    try:
+                        leitura = await http.get(url)
+                        editada = await http.patch(url, json={'titulo': 'ASGI'}, headers={'If-Match': leitura.headers['etag']})
+                        recusada = await http.patch(url, json={'titulo': 'x'}, headers={'If-Match': leitura.headers['etag']})
+                        return leitura, editada, recusada
+                    finally:
+                        await asgi.motor.dispose()
+            leitura, editada, recusada = asyncio.run(no_asgi())
+            assert leitura.headers['etag'].startswith('"7.'), leitura.headers
+            assert editada.status_code == 200 and editada.headers['etag'] == '"8"', editada.text
+            assert recusada.status_code == 412 and recusada.json()['versao_atual'] == 8, recusada.text
+            print("✅ ASGI: mesmo ETag, PATCH com If-Match e 412")
+        else:
+            assert cliente.patch(url, json={'titulo': 'ASGI'}, headers={'If-Match': '"7"'}).status_code == 200
+
+        assert cliente.delete(url, headers={'If-Match': '"8"'}).status_code == 200
+        assert cliente.delete(f'/categorias/{categoria_id}', headers={'If-Match': '"1"'}).status_code == 412
+        assert cliente.delete(f'/categorias/{categoria_id}', headers={'If-Match': '"2"'}).status_code == 200
+        print("✅ DELETE com a versão atual remove a tarefa e a categoria")
+
+        print("\n🎉 Concorrência otimista funcionando!")
+    finally:
+        cliente.delete(url)
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_admissao():
+    """Garante o limite por cliente (429), o teto de concorrência (503) e as métricas deles"""
+    print("🔬 TESTE DE CONTROLE DE ADMISSÃO")
+    import asyncio
+    from app import app, cache_leitura, limitador, teto_concorrencia
+    asgi, httpx = importar_modo_asgi()
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    tarefa_id = cliente.post('/tarefas', json={'titulo': 'Tarefa de admissão'}).get_json()['id']
+    configuracao = (limitador.habilitado, limitador.orcamentos, limitador.cabecalho_cliente,
+                    teto_concorrencia.maximo, teto_concorrencia.espera)
+    assert teto_concorrencia.em_andamento == 0, f'{teto_concorrencia.em_andamento} vagas não devolvidas'
+
+    try:
+        limitador.habilitado = True
+        limitador.orcamentos = {'leitura': (1000, 5), 'escrita': (0.5, 2)}
+        limitador.cabecalho_cliente = 'X-Forwarded-For'
+        um, outro = {'X-Forwarded-For': '203.0.113.1, 10.0.0.1'}, {'X-Forwarded-For': '203.0.113.2'}
+
+        status = [cliente.put(f'/tarefas/{tarefa_id}', json={'prioridade': 'alta'}, headers=um).status_code
+                  for _ in range(3)]
+        response = cliente.put(f'/tarefas/{tarefa_id}', json={'prioridade': 'alta'}, headers=um)
+        assert status == [200, 200, 429] and response.status_code == 429, status
+        assert int(response.headers['Retry-After']) >= 1, response.headers
+        print(f"✅ Rajada de 2 escritas: a 3ª recebe 429 com Retry-After: {response.headers['Retry-After']}")
+
+        leitura = cliente.get(f'/tarefas/{tarefa_id}', headers=um).status_code
+        escrita = cliente.put(f'/tarefas/{tarefa_id}', json={'prioridade': 'baixa'}, headers=outro).status_code
+        monitoramento = [cliente.get(url, headers=um).status_code for url in ('/health', '/metrics') * 5]
+        assert leitura == 200 and escrita == 200 and set(monitoramento) == {200}, (leitura, escrita, monitoramento)
+        print("✅ Leituras têm orçamento próprio, cada cliente tem o seu, /health e /metrics não são limitados")
+
+        limitador.habilitado = False
+        teto_concorrencia.maximo, teto_concorrencia.espera = 1, 0.05
+        # Um fluxo ainda não lido segura a única vaga
+        fluxo = cliente.get('/tarefas?stream=true')
+        ocupado = cliente.get(f'/tarefas/{tarefa_id}')
+        assert ocupado.status_code == 503 and ocupado.headers['Retry-After'] == '1', ocupado.status_code
+
+        async def no_asgi(*urls):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.app), base_url='http://asgi') as http:
+                try:
+                    return [(await http.get(url)).status_code for url in urls]
+                finally:
+                    await asgi.motor.dispose()
+        if asgi:
+            assert asyncio.run(no_asgi(f'/tarefas/{tarefa_id}', '/health')) == [503, 200]
+        fluxo.get_data()
+        assert cliente.get(f'/tarefas/{tarefa_id}').status_code == 200 and teto_concorrencia.em_andamento == 0
+        if asgi:
+            assert asyncio.run(no_asgi('/tarefas?stream=true', f'/tarefas/{tarefa_id}')) == [200, 200]
+            assert teto_concorrencia.em_andamento == 0, 'fluxo do ASGI não devolveu a vaga'
+        print("✅ Teto de 1 vaga ocupado por um fluxo: 503 no Flask e no ASGI até o fluxo terminar")
+
+        metricas = cliente.get('/metrics').get_data(as_text=True)
+        for linha in ('tarefas_api_limite_recusadas_total{tipo="escrita"} 2',
+                      'tarefas_api_concorrencia_maxima 1', 'tarefas_api_concorrencia_recusadas_total'):
+            assert linha in metricas, f'/metrics sem {linha}'
+        print("✅ Recusas e vagas em uso expostas em /metrics")
+
+        print("\n🎉 Controle de admissão funcionando!")
+    finally:
+        (limitador.habilitado, limitador.orcamentos, limitador.cabecalho_cliente,
+         teto_concorrencia.maximo, teto_concorrencia.espera) = configuracao
+        cliente.delete(f'/tarefas/{tarefa_id}')
+
+def testar_compressao():
+    """Garante a negociação do Accept-Encoding, o mínimo de tamanho e a compressão em fluxo"""
+    print("🔬 TESTE DE COMPRESSÃO DAS RESPOSTAS")
+    import gzip
+    from app import app, cache_leitura, compressao
+
+    descompressores = {'gzip': gzip.decompress}
+    if 'br' in compressao.codificacoes:
+        import brotli
+        descompressores['br'] = brotli.decompress
+    if 'zstd' in compressao.codificacoes:
+        import zstandard
+        descompressores['zstd'] = lambda dados: zstandard.ZstdDecompressor().decompressobj().decompress(dados)
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'Compressão {sufixo}'}).get_json()['id']
+    ids = [
+        cliente.post('/tarefas', json={'titulo': f'Compressão {i}', 'descricao': 'Texto repetitivo ' * 20,
+                                       'categoria_id': categoria_id}).get_json()['id']
+        for i in range(10)
+    ]
+
+    try:
+        for url in (f'/tarefas?categoria_id={categoria_id}', f'/tarefas?categoria_id={categoria_id}&stream=true',
+                    f'/tarefas?categoria_id={categoria_id}&formato=ndjson'):
+            original = cliente.get(url)
+            assert 'Content-Encoding' not in original.headers, 'comprimiu sem Accept-Encoding'
+            for codificacao, descomprimir in descompressores.items():
+                response = cliente.get(url, headers={'Accept-Encoding': codificacao})
+                assert response.headers.get('Content-Encoding') == codificacao, f'{url} {codificacao}: {response.headers}'
+                assert descomprimir(response.data) == original.data, f'{url} {codificacao}: corpo diferente'
+                assert 'Accept-Encoding' in response.headers.get('Vary', '')
+            print(f"✅ GET {url}: {len(original.data)} bytes -> {len(response.data)} ({', '.join(descompressores)})")
+
+        url = f'/tarefas?categoria_id={categoria_id}'
+        response = cliente.get(url, headers={'Accept-Encoding': 'gzip'})
+        etag = response.headers['ETag']
+        assert etag.startswith('W/'), f'ETag da resposta comprimida: {etag}'
+        status = cliente.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code
+        assert status == 304, f'If-None-Match com ETag fraco: {status}'
+        print("✅ ETag fraco na resposta comprimida; If-None-Match responde 304")
+
+        preferida = compressao.codificacoes[0]
+        for aceitas, esperada in (('gzip;q=0.5, identity', None), ('*', preferida), ('gzip, br;q=0', 'gzip'),
+                                  (f'gzip;q=0.5, {preferida}', preferida), ('identity', None)):
+            obtida = cliente.get(url, headers={'Accept-Encoding': aceitas}).headers.get('Content-Encoding')
+            assert obtida == esperada, f'Accept-Encoding {aceitas!r}: {obtida} (esperado {esperada})'
+        print("✅ Negociação respeita qualidades, curinga e identity")
+
+        response = cliente.get(f'/tarefas/{ids[0]}', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers and len(response.data) < compressao.minimo, \
+            f'resposta pequena comprimida: {response.headers}'
+        assert not compressao.aplicavel('text/event-stream', 200), '/eventos seria comprimido'
+        print(f"✅ Abaixo de {compressao.minimo} bytes ({len(response.data)}) e /eventos: sem compressão")
+
+        print("\n🎉 Compressão das respostas funcionando!")
+    finally:
+        for tarefa_id in ids:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_exportacao():
+    """Garante que exportar e importar reproduz categorias e tarefas (inclusive arquivadas) noutro banco"""
+    print("🔬 TESTE DE EXPORTAÇÃO E IMPORTAÇÃO EM MASSA")
+    import io
+    import os
+    import tempfile
+    from collections import Counter
+    from app import (app, cache_leitura, create_app, db, Tarefa, TarefaArquivada, ajustar_contadores,
+                     arquivar_tarefas, exportar_dados, importar_dados, inicializar_banco)
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categoria_id = cliente.post('/categorias', json={'nome': f'Exportação {sufixo}', 'cor': '#123456'}).get_json()['id']
+    ids = [
+        cliente.post('/tarefas', json={
+            'titulo': f'Exportação {sufixo} {status}', 'descricao': 'Linha 1\nLinha 2, com "aspas"',
+            'status': status, 'prioridade': 'alta', 'data_vencimento': '2030-01-02T03:04:05',
+            'responsavel': 'João', 'categoria_id': categoria_id
+        }).get_json()['id']
+        for status in ('pendente', 'concluida')
+    ]
+
+    try:
+        # A concluída vai para o arquivo
+        with app.app_context():
+            db.session.execute(db.update(Tarefa).where(Tarefa.id == ids[1]).values(data_atualizacao=datetime(2000, 1, 1)))
+            db.session.commit()
+            arquivar_tarefas((datetime.utcnow() - datetime(2001, 1, 1)).days, pausa=0)
+            ndjson = b''.join(exportar_dados()).decode()
+            csv_categorias = b''.join(exportar_dados('csv', ('categoria',))).decode()
+            csv_tarefas = b''.join(exportar_dados('csv', ('tarefa',))).decode()
+        originais = {id: cliente.get(f'/tarefas/{id}?incluir_arquivadas=true').get_json() for id in ids}
+        estatisticas = cliente.get('/estatisticas').get_json()
+
+        linhas = [json.loads(linha) for linha in ndjson.splitlines()]
+        tipos = [linha['tipo'] for linha in linhas]
+        assert tipos == sorted(tipos), 'categorias devem vir antes das tarefas'
+        exportadas = {linha['id']: linha for linha in linhas if linha['tipo'] == 'tarefa' and linha['id'] in ids}
+        assert exportadas[ids[0]]['data_arquivamento'] is None and exportadas[ids[1]]['data_arquivamento'], exportadas
+        assert exportadas[ids[0]]['categoria_id'] == categoria_id, exportadas[ids[0]]
+        assert csv_tarefas.startswith('id,titulo,') and csv_tarefas.count('\n') > len(exportadas), 'CSV de tarefas'
+        print(f"✅ {len(linhas)} linhas em NDJSON; arquivadas com data_arquivamento; CSV com cabeçalho")
+
+        maior_id = max(linha['id'] for linha in linhas if linha['tipo'] == 'tarefa')
+        arquivos = {
+            'NDJSON': [(ndjson, 'ndjson', 'tarefa')],
+            'CSV': [(csv_categorias, 'csv', 'categoria'), (csv_tarefas, 'csv', 'tarefa')],
+        }
+        for nome, entradas in arquivos.items():
+            banco = os.path.join(tempfile.mkdtemp(prefix='importacao_'), 'importacao.db')
+            destino = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{banco}', 'CACHE_HABILITADO': False,
+                                  'LIMITE_HABILITADO': False})
+            erros = []
+            with destino.app_context():
+                inicializar_banco()
+                for texto, formato, tipo in entradas:
+                    # Lotes pequenos: várias transações, e a categoria num lote anterior ao das tarefas
+                    importar_dados(io.StringIO(texto, newline=''), formato, tipo, tamanho_lote=7,
+                                   relatar_erro=lambda numero, mensagem: erros.append((numero, mensagem)))
+            assert not erros, f'{nome}: {erros[:5]}'
+            outro = destino.test_client()
+            for id in ids:
+                importada = outro.get(f'/tarefas/{id}?incluir_arquivadas=true').get_json()
+                # data_atualizacao é a da importação: a tarefa é nova para a sincronização
+                assert {**importada, 'data_atualizacao': None} == {**originais[id], 'data_atualizacao': None}, \
+                    f'{nome}: {importada} != {originais[id]}'
+            assert outro.get('/estatisticas').get_json() == estatisticas, f'{nome}: estatísticas diferentes'
+            busca = [tarefa['id'] for tarefa in outro.get(f'/tarefas?q=Exportação {sufixo}').get_json()]
+            assert busca == ids[:1], f'{nome}: busca {busca}'
+            novo = outro.post('/tarefas', json={'titulo': 'Depois da importação'}).get_json()['id']
+            assert novo > maior_id, f'{nome}: id {novo} não passa do maior importado ({maior_id})'
+            print(f"✅ {nome}: tarefas e arquivadas iguais às originais, estatísticas, busca e ids preservados")
+
+        # Linhas inválidas são relatadas e puladas; as válidas seguem
+        ruins = [
+            '{"titulo": "Válida sem id"}',
+            'não é JSON',
+            '[1, 2]',
+            '{"titulo": "x", "status": "feita"}',
+            '{"titulo": "x", "data_vencimento": "amanhã"}',
+            '{"titulo": "x", "categoria_id": 999999999}',
+            '{"tipo": "projeto", "nome": "x"}',
+            '{"descricao": "sem título"}',
+            f'{{"tipo": "categoria", "nome": "Exportação {sufixo}"}}',
+            f'{{"id": {ids[0]}, "titulo": "id repetido"}}',
+            '{"titulo": "x", "data_arquivamento": "2020-01-01T00:00:00"}',
+            '{"titulo": "x", "descricao": {"texto": "não é texto"}}',
+        ]
+        esperados = ['JSON inválido', 'não é um objeto', 'Status inválido', 'Formato de data inválido',
+                     'Categoria 999999999 não encontrada', 'Tipo inválido', 'Título é obrigatório',
+                     'Já existe uma categoria', f'Tarefa {ids[0]} já existe', 'arquivada sem id', 'descricao inválido']
+        erros, erros_csv = {}, {}
+        with destino.app_context():
+            resultado = importar_dados(io.StringIO('\n'.join(ruins)), relatar_erro=erros.__setitem__)
+            resultado_csv = importar_dados(io.StringIO('id,titulo\nabc,Id inválido\n,Sem id\n', newline=''), 'csv',
+                                           relatar_erro=erros_csv.__setitem__)
+        assert resultado['tarefas'] == 1 and resultado['erros'] == len(esperados), resultado
+        assert resultado_csv['tarefas'] == 1 and list(erros_csv) == [2], erros_csv
+        # Erros de validação saem na leitura; os conferidos no banco, na gravação do lote
+        assert sorted(erros) == list(range(2, len(ruins) + 1)), erros
+        for numero, esperado in zip(range(2, len(ruins) + 1), esperados):
+            assert esperado in erros[numero], f'linha {numero}: {erros[numero]!r} sem {esperado!r}'
+        assert 'id inválido: abc' in erros_csv[2], erros_csv
+        print("✅ Linhas inválidas relatadas com número e motivo; as válidas importadas")
+
+        print("\n🎉 Exportação e importação funcionando!")
+    finally:
+        cliente.delete(f'/tarefas/{ids[0]}')
+        # Arquivadas não têm rota de remoção: saem direto do banco, com os contadores
+        with app.app_context():
+            linhas = db.session.execute(db.delete(TarefaArquivada).where(TarefaArquivada.id == ids[1])
+                                        .returning(TarefaArquivada.status, TarefaArquivada.prioridade)).all()
+            removidas = Counter(tuple(linha) for linha in linhas)
+            ajustar_contadores(db.session.connection(), {chave: -total for chave, total in removidas.items()})
+            db.session.commit()
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_paridade_asgi():
+    """Compara as respostas do modo ASGI (asgi.py) com as do app Flask, no mesmo banco"""
+    print("🔬 TESTE DE PARIDADE FLASK x ASGI")
+    import asyncio
+    import gzip
+    import app as aplicacao
+    from app import app, cache_leitura
+
+    asgi, httpx = importar_modo_asgi()
+    if asgi is None:
+        print("⚠️  Sem o modo ASGI não há o que comparar; teste ignorado")
+        return
+
+    # Sem cache: cada servidor lê do banco o que o outro acabou de gravar
+    cache_leitura.habilitado = False
+    # Margem enorme: o proximo_desde de ?desde= não depende do relógio, e sim do desde
+    margem, aplicacao.SINCRONIZACAO_MARGEM = aplicacao.SINCRONIZACAO_MARGEM, 10 ** 7
+    ontem = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    response = cliente.post('/categorias', json={'nome': f'Paridade {sufixo}'})
+    categoria_id = response.get_json()['id']
+    tarefas_criadas = [
+        cliente.post('/tarefas', json={
+            'titulo': f'Paridade {i}', 'descricao': 'Comparação ASGI', 'categoria_id': categoria_id,
+            'prioridade': prioridade, 'data_vencimento': '2020-01-01T00:00:00'
+        }).get_json()['id']
+        for i, prioridade in enumerate(['alta', 'baixa', 'urgente'])
+    ]
+
+    leituras = [
+        '/',
+        '/tarefas',
+        '/tarefas?limite=2',
+        f'/tarefas?categoria_id={categoria_id}&campos=id,titulo,prioridade',
+        '/tarefas?q=paridade&limite=10',
+        '/tarefas?status=invalido',
+        '/tarefas?formato=ndjson',
+        '/tarefas?stream=true',
+        f'/tarefas?desde={ontem}&limite=2',
+        f'/tarefas?desde={ontem}',
+        f'/tarefas?incluir_arquivadas=true&categoria_id={categoria_id}&limite=2',
+        f'/tarefas/{tarefas_criadas[0]}',
+        f'/tarefas/{tarefas_criadas[0]}?incluir_arquivadas=true',
+        '/tarefas/999999999',
+        '/categorias',
+        f'/categorias/{categoria_id}',
+        '/estatisticas',
+    ]
+
+    def resumo(status, tipo, corpo, cabecalhos):
+        return status, tipo, corpo, cabecalhos.get('ETag'), cabecalhos.get('Content-Encoding'), cabecalhos.get('Vary')
+
+    async def comparar(http):
+        divergencias = []
+        # O ETag depende do Accept e a compressão do Accept-Encoding: os dois clientes mandam os mesmos
+        cabecalhos = {'Accept': '*/*', 'Accept-Encoding': 'gzip'}
+        for url in leituras:
+            # O ETag de /estatisticas muda com a janela de tempo: se ela virar entre as duas
+            # leituras, uma segunda tentativa cai inteira na janela seguinte
+            for _ in range(2 if url == '/estatisticas' else 1):
+                esperado = cliente.get(url, headers=cabecalhos)
+                # O httpx já entrega o corpo descomprimido
+                corpo = gzip.decompress(esperado.data) if esperado.headers.get('Content-Encoding') == 'gzip' else esperado.data
+                obtido = await http.get(url, headers=cabecalhos)
+                igual = resumo(esperado.status_code, esperado.content_type, corpo, esperado.headers) == \
+                    resumo(obtido.status_code, obtido.headers['content-type'], obtido.content, obtido.headers)
+                if igual:
+                    break
+            print(f"{'✅' if igual else '❌'} GET {url}: {obtido.status_code}")
+            if not igual:
+                divergencias.append(url)
+
+        # Escritas pelo ASGI aparecem no Flask, com contadores e versão dos dados atualizados
+        antes = cliente.get('/estatisticas').get_json()['total_tarefas']
+        response = await http.post('/tarefas', json={'titulo': 'Criada no ASGI', 'categoria_id': categoria_id})
+        tarefas_criadas.append(response.json()['id'])
+        response = await http.put(f'/tarefas/{tarefas_criadas[-1]}', json={'status': 'concluida'})
+        assert response.json()['status'] == 'concluida', response.text
+        response = await http.post('/tarefas/lote', json={'operacoes': [{'operacao': 'deletar', 'id': tarefas_criadas[0]}]})
+        assert response.json()['sucesso'] == 1, response.text
+        depois = cliente.get('/estatisticas').get_json()['total_tarefas']
+        vista = cliente.get(f'/tarefas/{tarefas_criadas[-1]}').get_json()
+        print(f"{'✅' if depois == antes else '❌'} Escritas no ASGI refletidas no Flask: {antes} -> {depois}")
+        if depois != antes or vista['status'] != 'concluida':
+            divergencias.append('escritas')
+
+        # Categoria inexistente é erro do cliente nos dois modos, sem SQL nem exceção no corpo
+        obtido = await http.post('/tarefas', json={'titulo': 'Categoria inexistente', 'categoria_id': 999999999})
+        esperado = cliente.patch(f'/tarefas/{tarefas_criadas[1]}', json={'categoria_id': 999999999})
+        iguais = obtido.status_code == esperado.status_code == 400 and \
+            obtido.json() == esperado.get_json() == {'erro': 'Categoria 999999999 não encontrada'}
+        print(f"{'✅' if iguais else '❌'} categoria_id inexistente: {obtido.status_code} / {esperado.status_code}")
+        if not iguais:
+            divergencias.append('categoria inexistente')
+        return divergencias
+
+    async def executar():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi.app), base_url='http://asgi') as http:
+            try:
+                return await comparar(http)
+            finally:
+                await asgi.motor.dispose()
+
+    try:
+        divergencias = asyncio.run(executar())
+        assert not divergencias, f'Respostas diferentes no modo ASGI: {divergencias}'
+        print("\n🎉 Modo ASGI responde igual ao app Flask!")
+    finally:
+        aplicacao.SINCRONIZACAO_MARGEM = margem
+        for tarefa_id in tarefas_criadas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_metricas():
+    """Confere /metrics (requisições, SQL e bytes por endpoint) e o /health com o banco"""
+    print("🔬 TESTE DE MÉTRICAS E HEALTH CHECK")
+    from app import app, cache_leitura, metricas
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    response = cliente.post('/tarefas', json={'titulo': 'Tarefa de métricas'})
+    tarefa_id = response.get_json()['id']
+
+    def serie(texto, nome, endpoint, status=None):
+        rotulos = f'metodo="GET",endpoint="{endpoint}"' + (f',status="{status}"' if status else '')
+        for linha in texto.splitlines():
+            if linha.startswith(f'{nome}{{{rotulos}}} '):
+                return float(linha.rsplit(' ', 1)[1])
+        return 0.0
+
+    try:
+        antes = cliente.get('/metrics').get_data(as_text=True)
+        for url in [f'/tarefas/{tarefa_id}', f'/tarefas/{tarefa_id}', '/tarefas/999999999', '/tarefas?formato=ndjson']:
+            cliente.get(url).get_data()
+        response = cliente.get('/metrics')
+        depois = response.get_data(as_text=True)
+
+        verificacoes = {
+            'Content-Type do Prometheus': response.content_type.startswith('text/plain; version=0.0.4'),
+            'obter_tarefa 200 contado': serie(depois, 'tarefas_api_requisicoes_total', 'obter_tarefa', 200)
+                - serie(antes, 'tarefas_api_requisicoes_total', 'obter_tarefa', 200) == 2,
+            'obter_tarefa 404 contado': serie(depois, 'tarefas_api_requisicoes_total', 'obter_tarefa', 404)
+                - serie(antes, 'tarefas_api_requisicoes_total', 'obter_tarefa', 404) == 1,
+            'SQL contado': serie(depois, 'tarefas_api_consultas_sql_total', 'obter_tarefa')
+                > serie(antes, 'tarefas_api_consultas_sql_total', 'obter_tarefa'),
+            'bytes do fluxo NDJSON contados': serie(depois, 'tarefas_api_resposta_bytes_total', 'listar_tarefas')
+                > serie(antes, 'tarefas_api_resposta_bytes_total', 'listar_tarefas'),
+            'histograma fecha em +Inf': serie(depois, 'tarefas_api_requisicao_duracao_segundos_count', 'obter_tarefa')
+                == sum(float(linha.rsplit(' ', 1)[1]) for linha in depois.splitlines()
+                       if linha.startswith('tarefas_api_requisicoes_total{metodo="GET",endpoint="obter_tarefa",')),
+        }
+        response = cliente.get('/health')
+        saude = response.get_json()
+        verificacoes['/health mede o banco'] = response.status_code == 200 and saude['banco']['status'] == 'ok' \
+            and saude['banco']['latencia_ms'] >= 0
+
+        for nome, ok in verificacoes.items():
+            print(f"{'✅' if ok else '❌'} {nome}")
+        falhas = [nome for nome, ok in verificacoes.items() if not ok]
+        assert metricas.habilitado, 'Métricas desligadas (METRICAS_HABILITADAS=False)'
+        assert not falhas, f'Métricas incorretas: {falhas}'
+        print("\n🎉 Métricas e health check funcionando!")
+    finally:
+        cliente.delete(f'/tarefas/{tarefa_id}')
+
+def testar_diagnostico_sql():
+    """Rotas dentro do orçamento de consultas, sem N+1, e o detector acusando um N+1 real"""
+    print("🔬 TESTE DE DIAGNÓSTICO DE SQL (N+1 E ORÇAMENTO DE CONSULTAS)")
+    from app import (app, cache_leitura, diagnostico_sql, Categoria, MedicaoRequisicao,
+                     OrcamentoConsultasExcedido, medicao_atual)
+
+    cache_leitura.habilitado = False
+    cliente = app.test_client()
+    sufixo = datetime.now().strftime('%H%M%S%f')
+    categorias_criadas = [
+        cliente.post('/categorias', json={'nome': f'Diagnóstico {sufixo} {i}'}).get_json()['id']
+        for i in range(diagnostico_sql.repeticoes_n_mais_um + 1)
+    ]
+    tarefas_criadas = [
+        cliente.post('/tarefas', json={'titulo': 'Tarefa de diagnóstico', 'categoria_id': categoria_id}).get_json()['id']
+        for categoria_id in categorias_criadas
+    ]
+
+    # Consultas esperadas por rota, com folga de 1: versão dos dados + a(s) consulta(s) da rota
+    orcamentos = {
+        '/tarefas?limite=10': 3,
+        f'/tarefas?categoria_id={categorias_criadas[0]}': 3,
+        '/tarefas?stream=true': 3,
+        '/tarefas?desde=2025-01-01T00:00:00&limite=10': 3,
+        f'/tarefas/{tarefas_criadas[0]}': 3,
+        '/categorias': 3,
+        f'/categorias/{categorias_criadas[0]}': 4,
+        '/estatisticas': 5,
+    }
+    falhas = []
+
+    try:
+        for url, orcamento in orcamentos.items():
+            try:
+                with diagnostico_sql.verificar(orcamento=orcamento):
+                    cliente.get(url).get_data()
+                print(f"✅ GET {url}: até {orcamento} consultas, sem N+1")
+            except OrcamentoConsultasExcedido as e:
+                print(f"❌ {e}")
+                falhas.append(url)
+
+        # O detector precisa acusar o N+1 clássico: to_dict() sem o total já agregado
+        with app.test_request_context():
+            token = medicao_atual.set(MedicaoRequisicao(diagnostico=True))
+            try:
+                for categoria in Categoria.query.filter(Categoria.id.in_(categorias_criadas)):
+                    categoria.to_dict()
+                problemas = diagnostico_sql.avaliar_requisicao('N+1 proposital', medicao_atual.get())
+            finally:
+                medicao_atual.reset(token)
+        detectado = any('N+1' in problema for problema in problemas)
+        print(f"{'✅' if detectado else '❌'} N+1 proposital detectado")
+        if not detectado:
+            falhas.append('detector de N+1')
+
+        assert not falhas, f'Diagnóstico de SQL falhou: {falhas}'
+        print("\n🎉 Nenhuma rota com N+1 ou acima do orçamento!")
+    finally:
+        for tarefa_id in tarefas_criadas:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+        for categoria_id in categorias_criadas:
+            cliente.delete(f'/categorias/{categoria_id}')
+
+def testar_fabrica():
+    """Garante que importar o app não toca no banco e que o esquema vem de inicializar_banco()"""
+    print("🔬 TESTE DA FÁBRICA DE APLICAÇÃO (create_app)")
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    from app import create_app, inicializar_banco
+
+    banco = os.path.join(tempfile.mkdtemp(prefix='fabrica_'), 'fabrica.db')
+    url = f'sqlite:///{banco}'
+
+    # Processo novo, como um worker do gunicorn: import + create_app()
+    saida = subprocess.run(
+        [sys.executable, '-c', 'import app; app.create_app()'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env={**os.environ, 'DATABASE_URL': url},
+        capture_output=True, text=True, check=True
+    ).stdout
+    assert not os.path.exists(banco), 'importar o app criou o arquivo do banco'
+    assert not saida.strip(), f'importar o app imprimiu: {saida!r}'
+    print("✅ Import sem banco e sem saída")
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'CACHE_HABILITADO': False})
+    assert not os.path.exists(banco), 'create_app() criou o arquivo do banco'
+    assert 'migrar' in app.cli.commands, 'comando migrar não registrado'
+    with app.app_context():
+        inicializar_banco()
+        inicializar_banco()  # idempotente
+    cliente = app.test_client()
+    response = cliente.post('/tarefas', json={'titulo': 'Tarefa da fábrica'})
+    assert response.status_code == 201, f'POST /tarefas: {response.status_code}'
+    total = cliente.get('/estatisticas').get_json()['total_tarefas']
+    assert total == 1, f'banco do app criado pela fábrica com {total} tarefas'
+    print("✅ inicializar_banco() cria o esquema; o app usa o banco da configuração")
+
+    # Cache, métricas e admissão são de cada app: a configuração deste não muda o app padrão
+    import app as aplicacao
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateIndex
+    outro = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CACHE_TTL': 12345,
+                        'LIMITE_HABILITADO': True})
+    for nome in ('cache_leitura', 'metricas', 'compressao', 'limitador', 'teto_concorrencia', 'diagnostico_sql',
+                 'eventos_sse', 'corte_eventos', 'cache_vencidas', 'busca_textual'):
+        assert outro.extensions[nome] is not app.extensions[nome] is not aplicacao.app.extensions[nome], nome
+    assert outro.extensions['cache_leitura'].ttl == 12345 and aplicacao.cache_leitura.ttl != 12345
+    assert app.extensions['cache_leitura'].habilitado is False and aplicacao.cache_leitura is aplicacao.app.extensions['cache_leitura']
+    assert aplicacao.limitador.habilitado is False, 'create_app() religou o limitador do app padrão'
+    # Padrões: limite por cliente desligado (atrás de proxy seria um balde só) e teto = tamanho do pool
+    import os
+    if 'LIMITE_HABILITADO' not in os.environ:
+        assert aplicacao.LIMITE_HABILITADO is False
+    if 'CONCORRENCIA_MAXIMA' not in os.environ:
+        assert aplicacao.CONCORRENCIA_MAXIMA == aplicacao.DB_POOL_SIZE + aplicacao.DB_MAX_OVERFLOW
+    # O índice parcial é declarado para os dois bancos: nada no modelo muda conforme a URL
+    indice = next(i for i in aplicacao.Tarefa.__table__.indexes if i.name == 'ix_tarefa_vencimento_aberta')
+    assert "WHERE status != 'CONCLUIDA'" in str(CreateIndex(indice).compile(dialect=postgresql.dialect()))
+    print("✅ Cada app com o seu cache, métricas e limites; o modelo não muda com a URL")
+
+    # Estado que depende do banco também é de cada app: contagem de vencidas e leitor de eventos
+    vencida = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    padrao = aplicacao.app.test_client()
+    antes = padrao.get('/estatisticas').get_json()['tarefas_vencidas']
+    cliente.post('/tarefas', json={'titulo': 'Vencida da fábrica', 'data_vencimento': vencida})
+    assert cliente.get('/estatisticas').get_json()['tarefas_vencidas'] == 1
+    assert padrao.get('/estatisticas').get_json()['tarefas_vencidas'] == antes
+    fluxo = cliente.get('/eventos', buffered=False)
+    try:
+        next(iter(fluxo.response))
+        with app.app_context():
+            assert app.extensions['eventos_sse']._motor is aplicacao.db.engine
+        assert app.extensions['eventos_sse'].assinantes() == 1 and aplicacao.eventos_sse.assinantes() == 0
+    finally:
+        fluxo.close()
+    print("✅ Vencidas e assinantes de /eventos separados por app (cada leitor no banco do seu app)")
+
+    # CORS (antes só no main.py) agora vem da fábrica
+    from app import CORS
+    if CORS is not None:
+        response = cliente.get('/', headers={'Origin': 'http://localhost:3000'})
+        origem = response.headers.get('Access-Control-Allow-Origin')
+        assert origem == 'http://localhost:3000', f'CORS: {origem}'
+        print("✅ CORS liberado para CORS_ORIGINS")
+
+    print("\n🎉 Fábrica de aplicação sem efeitos colaterais!")
+
+def testar_migracao():
+    """Atualiza um banco com o esquema da primeira versão da API (inclusive com categoria_id órfão)"""
+    print("🔬 TESTE DE MIGRAÇÃO DE UM BANCO ANTIGO")
+    import os
+    import sqlite3
+    import tempfile
+    from app import create_app, db, inicializar_banco, MIGRACOES, VersaoEsquema
+
+    banco = os.path.join(tempfile.mkdtemp(prefix='migracao_'), 'antigo.db')
+    conexao = sqlite3.connect(banco)
+    # Esquema criado pelo db.create_all() da primeira versão, sem PRAGMA foreign_keys
+    conexao.executescript("""
+        CREATE TABLE categoria (
+            id INTEGER NOT NULL, nome VARCHAR(100) NOT NULL, descricao TEXT, cor VARCHAR(7),
+            data_criacao DATETIME, PRIMARY KEY (id), UNIQUE (nome)
+        );
+        CREATE TABLE tarefa (
+            id INTEGER NOT NULL, titulo VARCHAR(200) NOT NULL, descricao TEXT,
+            status VARCHAR(12) NOT NULL, prioridade VARCHAR(7) NOT NULL, data_criacao DATETIME NOT NULL,
+            data_vencimento DATETIME, data_conclusao DATETIME, responsavel VARCHAR(100), categoria_id INTEGER,
+            PRIMARY KEY (id), FOREIGN KEY(categoria_id) REFERENCES categoria (id)
+        );
+        INSERT INTO categoria VALUES (1, 'Trabalho', NULL, '#3366ff', '2024-01-01 09:00:00.000000');
+        INSERT INTO tarefa VALUES (1, 'Relatório mensal', 'Fechar números', 'PENDENTE', 'ALTA',
+            '2024-01-02 09:00:00.000000', '2024-01-10 18:00:00.000000', NULL, 'Ana', 1);
+        INSERT INTO tarefa VALUES (2, 'Categoria apagada', NULL, 'CONCLUIDA', 'MEDIA',
+            '2024-01-03 09:00:00.000000', NULL, '2024-01-04 09:00:00.000000', NULL, 999);
+        INSERT INTO tarefa VALUES (5, 'Sem categoria', NULL, 'EM_ANDAMENTO', 'BAIXA',
+            '2024-01-05 09:00:00.000000', NULL, NULL, NULL, NULL);
+    """)
+    conexao.close()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{banco}', 'CACHE_HABILITADO': False,
+                      'LIMITE_HABILITADO': False})
+    with app.app_context():
+        inicializar_banco()
+        aplicadas = [versao for (versao,) in db.session.query(VersaoEsquema.versao).order_by(VersaoEsquema.versao)]
+        assert aplicadas == [versao for versao, _, _ in MIGRACOES], aplicadas
+        violacoes = db.session.execute(db.text('PRAGMA foreign_key_check')).all()
+        assert not violacoes, f'chaves estrangeiras inválidas: {violacoes}'
+        esquema = db.session.execute(db.text("SELECT sql FROM sqlite_master WHERE name = 'tarefa'")).scalar()
+        assert 'AUTOINCREMENT' in esquema.upper(), esquema
+        categorias = dict(db.session.execute(db.text('SELECT id, categoria_id FROM tarefa')).all())
+        assert categorias == {1: 1, 2: None, 5: None}, categorias
+    print(f"✅ Migrações 1 a {aplicadas[-1]} aplicadas; nenhuma chave estrangeira inválida")
+
+    cliente = app.test_client()
+    tarefas = {tarefa['id']: tarefa for tarefa in cliente.get('/tarefas').get_json()}
+    assert sorted(tarefas) == [1, 2, 5], sorted(tarefas)
+    assert tarefas[1]['titulo'] == 'Relatório mensal' and tarefas[1]['versao'] == 1
+    assert cliente.get('/categorias/1').get_json()['total_tarefas'] == 1
+    estatisticas = cliente.get('/estatisticas').get_json()
+    assert estatisticas['total_tarefas'] == 3 and estatisticas['por_status']['concluida'] == 1, estatisticas
+    assert [t['id'] for t in cliente.get('/tarefas?q=relatorio').get_json()] == [1]
+    print("✅ Tarefas, categoria, contadores e busca preservados; a órfã ficou sem categoria")
+
+    response = cliente.patch('/tarefas/2', json={'categoria_id': 1}, headers={'If-Match': '"1"'})
+    assert response.status_code == 200 and response.headers['ETag'] == '"2"', (response.status_code, response.get_json())
+    nova = cliente.post('/tarefas', json={'titulo': 'Depois da migração'}).get_json()
+    assert nova['id'] == 6 and nova['versao'] == 1, nova
+    print("✅ A tarefa órfã aceita PATCH com If-Match; ids novos continuam depois do maior")
+
+    print("\n🎉 Banco antigo migrado!")
+
+def testar_eventos():
+    """Garante que /eventos entrega as escritas (inclusive de outro processo) e retoma pelo Last-Event-ID"""
+    print("🔬 TESTE DO FLUXO DE EVENTOS (SSE)")
+    import os
+    import subprocess
+    import sys
+    import app as aplicacao
+    from app import app, db, eventos_sse
+
+    intervalo, eventos_sse.intervalo = eventos_sse.intervalo, 0.05
+    cliente = app.test_client()
+    ids = []
+
+    def ler_eventos(fluxo, quantidade):
+        # Lê pedaços do fluxo até juntar a quantidade de eventos pedida (sem contar retry/ping)
+        eventos = []
+        while len(eventos) < quantidade:
+            for bloco in next(fluxo).decode().split('\n\n'):
+                campos = dict(linha.split(': ', 1) for linha in bloco.splitlines() if ': ' in linha)
+                if 'event' in campos:
+                    eventos.append(campos)
+        return eventos
+
+    def abrir(**cabecalhos):
+        response = cliente.get('/eventos', headers=cabecalhos, buffered=False)
+        assert response.status_code == 200, f'/eventos: {response.status_code}'
+        assert response.mimetype == 'text/event-stream', response.mimetype
+        return response, iter(response.response)
+
+    try:
+        response, fluxo = abrir()
+        assert next(fluxo).startswith(b'retry: '), 'fluxo sem retry inicial'
+        with app.app_context():
+            assert db.engine.pool.checkedout() == 0, 'assinante ocioso segurando conexão'
+        print("✅ Assinante ocioso não segura conexão do pool")
+
+        ids.append(cliente.post('/tarefas', json={'titulo': 'Evento'}).get_json()['id'])
+        cliente.put(f'/tarefas/{ids[0]}', json={'status': 'concluida'})
+        cliente.delete(f'/tarefas/{ids[0]}')
+        recebidos = ler_eventos(fluxo, 3)
+        acoes = [(evento['event'], json.loads(evento['data'])['acao'], json.loads(evento['data'])['id'])
+                 for evento in recebidos]
+        esperado = [('tarefa', 'criada', ids[0]), ('tarefa', 'atualizada', ids[0]), ('tarefa', 'removida', ids[0])]
+        assert acoes == esperado, f'eventos: {acoes}'
+        print(f"✅ Criação, alteração e remoção: {[acao for _, acao, _ in acoes]}")
+
+        # Outro processo (outro worker) grava; o leitor do log deste processo entrega
+        subprocess.run(
+            [sys.executable, '-c', "import app; app.app.test_client().post('/categorias', json={'nome': 'Evento externo'})"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        )
+        externo = ler_eventos(fluxo, 1)[0]
+        categoria_id = json.loads(externo['data'])['id']
+        assert externo['event'] == 'categoria', f'evento de outro processo: {externo}'
+        cliente.delete(f'/categorias/{categoria_id}')
+        ultimo = ler_eventos(fluxo, 1)[0]['id']
+        print("✅ Escrita de outro processo chega ao fluxo")
+        response.close()
+        assert eventos_sse.assinantes() == 0, 'assinante não removido ao fechar o fluxo'
+
+        # Reconexão: o que foi perdido sai do log, a partir do Last-Event-ID
+        response, fluxo = abrir(**{'Last-Event-ID': recebidos[0]['id']})
+        retomados = ler_eventos(fluxo, 4)
+        assert [evento['id'] for evento in retomados] == [recebidos[1]['id'], recebidos[2]['id'], externo['id'], ultimo], \
+            f'retomada: {[evento["id"] for evento in retomados]}'
+        response.close()
+        print("✅ Last-Event-ID retoma os eventos perdidos")
+
+        # Log cortado além do Last-Event-ID: evento reset
+        maximo, aplicacao.EVENTOS_MAXIMO = aplicacao.EVENTOS_MAXIMO, 1
+        try:
+            ids.append(cliente.post('/tarefas', json={'titulo': 'Evento cortado'}).get_json()['id'])
+        finally:
+            aplicacao.EVENTOS_MAXIMO = maximo
+        response, fluxo = abrir(**{'Last-Event-ID': recebidos[0]['id']})
+        assert ler_eventos(fluxo, 1)[0]['event'] == 'reset', 'log cortado sem evento reset'
+        response.close()
+        print("✅ Log cortado: evento reset")
+
+        assert cliente.get('/eventos', headers={'Last-Event-ID': 'x'}).status_code == 400
+        maximo, eventos_sse.max_assinantes = eventos_sse.max_assinantes, 0
+        try:
+            response = cliente.get('/eventos')
+            assert response.status_code == 503 and response.headers.get('Retry-After'), \
+                f'lotado: {response.status_code}'
+        finally:
+            eventos_sse.max_assinantes = maximo
+        print("✅ Last-Event-ID inválido: 400; limite de assinantes: 503 com Retry-After")
+
+        print("\n🎉 Fluxo de eventos funcionando!")
+    finally:
+        eventos_sse.intervalo = intervalo
+        for tarefa_id in ids[1:]:
+            cliente.delete(f'/tarefas/{tarefa_id}')
+
+TESTES = {
+    'completo': (testar_api_completa, 'todas as funcionalidades (servidor rodando em --url)'),
+    'rapido': (testar_crud_simples, 'CRUD básico (servidor rodando em --url)'),
+    'consultas': (testar_consultas_por_requisicao, 'consultas SQL por requisição (sem servidor)'),
+    'planos': (testar_planos_de_consulta, 'planos de consulta (sem servidor)'),
+    'sincronizacao': (testar_sincronizacao, 'sincronização incremental com ?desde= (sem servidor)'),
+    'arquivamento': (testar_arquivamento, 'arquivamento e ?incluir_arquivadas=true (sem servidor)'),
+    'eventos': (testar_eventos, 'fluxo SSE de /eventos e Last-Event-ID (sem servidor)'),
+    'cache': (testar_cache, 'acerto, falha e invalidação do cache de leitura, com dois workers (sem servidor)'),
+    'serializacao': (testar_serializacao, 'caminho rápido de leitura igual ao jsonify(to_dict()), byte a byte (sem servidor)'),
+    'paginacao': (testar_paginacao, 'paginação por cursor com filtros e cursor inválido (sem servidor)'),
+    'contadores': (testar_contadores, 'estatísticas iguais a uma recontagem depois de cada escrita (sem servidor)'),
+    'fluxo': (testar_fluxo, 'listagem em fluxo com ?stream=true e NDJSON (sem servidor)'),
+    'condicional': (testar_condicional, 'ETag, If-None-Match (304) e ETag novo depois de escritas (sem servidor)'),
+    'busca': (testar_busca, 'busca textual FTS5: relevância, sintaxe escapada e reconstrução do índice (sem servidor)'),
+    'campos': (testar_campos, 'projeção ?campos= na resposta e no SELECT (sem servidor)'),
+    'lote': (testar_lote, 'validação do corpo e lote atômico x parcial em /tarefas/lote (sem servidor)'),
+    'idempotencia': (testar_idempotencia, 'Idempotency-Key em POST /tarefas e /categorias (sem servidor)'),
+    'concorrencia': (testar_concorrencia_otimista, 'If-Match (412) e PATCH em tarefas e categorias (sem servidor)'),
+    'admissao': (testar_admissao, 'limite por cliente (429) e teto de concorrência (503) (sem servidor)'),
+    'compressao': (testar_compressao, 'compressão negociada por Accept-Encoding (sem servidor)'),
+    'exportacao': (testar_exportacao, 'exportação e importação em massa NDJSON/CSV (sem servidor)'),
+    'paridade': (testar_paridade_asgi, 'paridade Flask x ASGI (sem servidor)'),
+    'metricas': (testar_metricas, 'métricas e health check (sem servidor)'),
+    'diagnostico': (testar_diagnostico_sql, 'N+1 e orçamento de consultas por rota (sem servidor)'),
+    'fabrica': (testar_fabrica, 'create_app() sem efeitos colaterais e inicializar_banco() (sem servidor)'),
+    'migracao': (testar_migracao, 'Atualização de um banco com o esquema da primeira versão (sem servidor)'),
+}
+
+# Testes que rodam no processo, contra o banco de DATABASE_URL
+TESTES_LOCAIS = ['consultas', 'planos', 'sincronizacao', 'arquivamento', 'paginacao', 'contadores', 'fluxo', 'condicional', 'busca', 'campos', 'eventos', 'cache', 'serializacao', 'lote', 'idempotencia', 'concorrencia', 'compressao', 'exportacao', 'paridade', 'metricas', 'diagnostico', 'admissao', 'fabrica', 'migracao']
 
 if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description='Testes da API Gerenciador de Tarefas',
+        epilog='\n'.join(f'{nome}: {descricao}' for nome, (_, descricao) in TESTES.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('testes', nargs='*', metavar='TESTE',
+                        help='testes a executar (padrão: os que não precisam de servidor)')
+    parser.add_argument('--url', default=BASE_URL, help=f'URL do servidor (padrão: {BASE_URL})')
+    args = parser.parse_args()
+    desconhecidos = set(args.testes) - set(TESTES)
+    if desconhecidos:
+        parser.error(f"teste(s) desconhecido(s): {', '.join(sorted(desconhecidos))}")
+    BASE_URL = args.url.rstrip('/')
+
     print("📋 TESTES DA API GERENCIADOR DE TAREFAS")
     print("📡 URL Base:", BASE_URL)
-    print("\nEscolha o tipo de teste:")
-    print("1 - Teste Completo (todas as funcionalidades)")
-    print("2 - Teste Rápido (CRUD básico)")
-    
-    escolha = input("\nDigite sua escolha (1 ou 2): ").strip()
-    
-    if escolha == "1":
-        testar_api_completa()
-    elif escolha == "2":
-        testar_crud_simples()
-    else:
-        print("\n🚀 Executando teste completo por padrão...")
-        testar_api_completa()
-
+    testes = args.testes or TESTES_LOCAIS
+    if set(testes) & set(TESTES_LOCAIS):
+        # Importar o app não cria mais o esquema: o banco local é preparado aqui
+        from app import app, inicializar_banco, limitador
+        with app.app_context():
+            inicializar_banco()
+        # Os testes locais gravam em rajada, todos do mesmo cliente; o teste de admissão liga o limite
+        limitador.habilitado = False
+    falhas = []
+    for nome in testes:
+        print()
+        try:
+            TESTES[nome][0]()
+        except AssertionError as e:
+            print(f"❌ {e}")
+            falhas.append(nome)
+        except SystemExit:
+            falhas.append(nome)
+    if falhas:
+        print(f"\n❌ Testes com falha: {', '.join(falhas)}")
+        sys.exit(1)